@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import script
+from generate_survey import generate_survey
+
+# --- 定数定義 ---
+
+DEFAULT_SIZES = [10**2, 10**3, 10**4, 10**5]
+# 合成データの保存先（同じ件数・シードのデータは再利用する）
+BENCH_DATA_DIR = '.bench_data'
+BASELINE_PATH = os.path.join('benchmarks', 'baseline.json')
+
+# ベースラインに対してこの倍率を超えたら性能低下とみなす（短すぎる計測は誤差が大きいので下限を設ける）
+DEFAULT_TOLERANCE = 1.25
+MIN_SECONDS = 0.05
+MIN_BYTES = 1 << 20
+
+
+def measure(func, repeat=1):
+    """
+    funcを実行し、(戻り値, 経過時間の最小値[秒], tracemallocによるピークメモリ[バイト]) を返す
+    tracemallocは割り当てごとに時間がかかるため、時間はトレースを止めてrepeat回計測し、ピークメモリは別に1回だけ
+    トレースして計測する（funcは同じ入力で繰り返し実行できること）
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, best, peak
+
+
+def synthetic_data(n_rows, seed=0, data_dir=BENCH_DATA_DIR):
+    """
+    ベンチマーク用の合成データのパスを返す（未生成なら生成する）
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'synthetic_{n_rows}_seed{seed}.csv')
+    if not os.path.exists(path):
+        print(f"ℹ️ 合成データを生成中: {path}")
+        generate_survey(n_rows, path, missing_rate=0.01, invalid_rate=0.01, seed=seed)
+    return path
+
+
+def synthetic_archive(n_rows, seed=0, data_dir=BENCH_DATA_DIR):
+    """
+    合成データを1回分として追記した列指向アーカイブのパスを返す（未作成なら作成する）
+    """
+    path = os.path.join(data_dir, f'synthetic_{n_rows}_seed{seed}.archive')
+    if not script.is_archive(path):
+        script.append_wave(path, synthetic_data(n_rows, seed, data_dir))
+    return path
+
+
+def _fit_regression(df_clean):
+    """
+    analyze_and_visualizeと同じ手順（ダミー変数化 → 欠損除去 → OLS）で回帰モデルを求める
+    """
+    return script.fit_ols_from_state(script.dummy_crossproducts(script.build_dummy_frame(df_clean).dropna()))
+
+
+def _figure_stages(specs, out_dir):
+    """
+    図の描画仕様を1枚ずつの段階にする（出力先はout_dirに置き換える）
+    """
+    for name, func, kwargs in specs:
+        kwargs = dict(kwargs, output_path=os.path.join(out_dir, os.path.basename(kwargs['output_path'])))
+        yield f'figure:{name}', lambda func=func, kwargs=kwargs: func(**kwargs)
+
+
+def _stages_in_memory(file_path, out_dir=None, aggregate=False):
+    """
+    インメモリモードの各段階を (段階名, 関数) として順に返す（前の段階の結果はstateで受け渡す）
+    out_dirを指定すると、続けて各図の描画を1枚ずつの段階として返す（aggregate=Trueなら度数表から描画する）
+    file_pathが列指向アーカイブの場合は、読み込み（メモリマップのビューを開くだけ）と前処理を1段階にする
+    """
+    state = {}
+
+    def load():
+        state['df'] = pd.read_csv(file_path, encoding='utf-8-sig')
+
+    def preprocess():
+        state['df_clean'] = script.preprocess_survey(state['df'])
+
+    def open_archive():
+        state['df_clean'] = script.open_archive(file_path)
+
+    def correlation():
+        state['corr'] = script.spearman_matrix(state['df_clean'], script.ANALYSIS_COLS)
+
+    def regression():
+        state['model'] = _fit_regression(state['df_clean'])
+
+    if script.is_archive(file_path):
+        yield 'open_archive', open_archive
+    else:
+        yield 'load', load
+        yield 'preprocess', preprocess
+    yield 'correlation', correlation
+    yield 'regression', regression
+    if out_dir:
+        coef_df = script.build_coefficient_table(state['model'], script.REGRESSION_VARS)
+        if aggregate:
+            def figure_counts():
+                state['df_freq'] = script.frequency_table(state['df_clean'])
+
+            yield 'figure_counts', figure_counts
+            specs = script.build_figure_specs_from_counts(state['df_freq'], state['corr'], coef_df)
+        else:
+            specs = script.build_figure_specs(state['df_clean'], state['corr'], coef_df)
+        yield from _figure_stages(specs, out_dir)
+
+
+def _stages_streaming(file_path, chunksize, out_dir=None):
+    """
+    ストリーミングモードの各段階（読み込みと前処理はチャンク単位で一体）
+    """
+    state = {}
+
+    def load_preprocess():
+        state['df_freq'] = script.load_survey_streaming(file_path, chunksize)
+
+    def correlation():
+        df_freq = state['df_freq']
+        state['corr'] = script.spearman_matrix(df_freq, script.ANALYSIS_COLS, df_freq['Count'].values)
+
+    def regression():
+        state['model'] = script.fit_ols_from_state(script.regression_crossproducts(state['df_freq']))
+
+    yield 'load+preprocess', load_preprocess
+    yield 'correlation', correlation
+    yield 'regression', regression
+    if out_dir:
+        coef_df = script.build_coefficient_table(state['model'], script.REGRESSION_VARS)
+        specs = script.build_figure_specs_from_counts(state['df_freq'], state['corr'], coef_df)
+        yield from _figure_stages(specs, out_dir)
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, mode='memory', figures=True, repeat=1, seed=0,
+                  chunksize=script.DEFAULT_CHUNKSIZE, data_dir=BENCH_DATA_DIR, aggregate=False):
+    """
+    件数ごとに合成データを用意し、各段階の経過時間とピークメモリを計測する
+    戻り値: {件数(str): {段階名: {'seconds': ..., 'peak_bytes': ...}}}
+    図は一時ディレクトリに1枚ずつ現在のプロセスで描画する（並列描画の影響を除くため）
+    aggregate: インメモリモードでも散布図・箱ひげ図を度数表から描画する（集計描画モード）
+    mode='archive' はインメモリモードの各段階を、CSVの代わりに列指向アーカイブ（メモリマップ）から計測する
+    """
+    results = {}
+    # 図は現在のプロセスで描画するが、Aggバックエンドとスタイルは計測の間だけ使う
+    with script.render_context():
+        for n_rows in sizes:
+            if mode == 'archive':
+                file_path = synthetic_archive(n_rows, seed, data_dir)
+            else:
+                file_path = synthetic_data(n_rows, seed, data_dir)
+            print(f"\n⏱️ --- {n_rows} 件 ({mode}) ---")
+            results[str(n_rows)] = {}
+            with tempfile.TemporaryDirectory() as out_dir:
+                fig_dir = out_dir if figures else None
+                if mode == 'streaming':
+                    stages = _stages_streaming(file_path, chunksize, fig_dir)
+                else:
+                    stages = _stages_in_memory(file_path, fig_dir, aggregate)
+                for stage, func in stages:
+                    _, seconds, peak = measure(func, repeat)
+                    results[str(n_rows)][stage] = {'seconds': seconds, 'peak_bytes': peak}
+                    print(f"{stage:<24}: {seconds:10.4f} s  {peak / 2**20:10.2f} MiB")
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment_info():
+    """
+    ベースラインと比較する際の前提となる実行環境の情報
+    """
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'cpu_count': os.cpu_count(),
+            'git_revision': _git_revision()}
+
+
+def save_baseline(results, mode, path=BASELINE_PATH):
+    """
+    計測結果をベースラインとして保存する（モードごとに上書き、他のモードの結果は残す）
+    """
+    baseline = load_baseline(path)
+    baseline[mode] = {'environment': environment_info(), 'results': results}
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ ベースラインを保存: {path}")
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_with_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    ベースラインと比較し、時間またはメモリが tolerance 倍を超えた段階の一覧を返す
+    """
+    regressions = []
+    print("\n📊 --- ベースラインとの比較（今回 / ベースライン） ---")
+    for size, stages in results.items():
+        for stage, current in stages.items():
+            base = baseline.get(size, {}).get(stage)
+            if base is None:
+                continue
+            time_ratio = current['seconds'] / max(base['seconds'], 1e-9)
+            mem_ratio = current['peak_bytes'] / max(base['peak_bytes'], 1)
+            slower = time_ratio > tolerance and current['seconds'] - base['seconds'] > MIN_SECONDS
+            larger = mem_ratio > tolerance and current['peak_bytes'] - base['peak_bytes'] > MIN_BYTES
+            marker = '⚠️' if slower or larger else '  '
+            print(f"{marker} {size:>9} {stage:<24}: 時間 x{time_ratio:6.2f}  メモリ x{mem_ratio:6.2f}")
+            if slower or larger:
+                regressions.append((size, stage, time_ratio, mem_ratio))
+    return regressions
+
+
+# --- 実行 ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='script.pyの各段階の実行時間・メモリを件数ごとに計測する')
+    parser.add_argument('--sizes', type=lambda s: [int(float(v)) for v in s.split(',')], default=DEFAULT_SIZES,
+                        help='計測する件数（カンマ区切り、例: 1e2,1e4,1e7）')
+    parser.add_argument('--mode', choices=['memory', 'streaming', 'archive'], default='memory')
+    parser.add_argument('--chunksize', type=int, default=script.DEFAULT_CHUNKSIZE, help='ストリーミング時のチャンク行数')
+    parser.add_argument('--no-figures', action='store_true', help='図の描画を計測しない')
+    parser.add_argument('--aggregate-figures', action='store_true', help='インメモリモードでも図を度数表から描画する')
+    parser.add_argument('--repeat', type=int, default=1, help='各段階の繰り返し回数（時間は最小値を採用）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='ベースラインのJSONファイル')
+    parser.add_argument('--save-baseline', action='store_true', help='今回の結果をベースラインとして保存する')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    mode = f'{args.mode}-aggregated' if args.mode != 'streaming' and args.aggregate_figures else args.mode
+    results = run_benchmark(args.sizes, args.mode, not args.no_figures, args.repeat, args.seed, args.chunksize,
+                            aggregate=args.aggregate_figures)
+    baseline = load_baseline(args.baseline).get(mode)
+    if args.save_baseline:
+        save_baseline(results, mode, args.baseline)
+    elif baseline:
+        regressions = compare_with_baseline(results, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"\n⚠️ {len(regressions)} 段階でベースラインより遅く（または大きく）なりました")
+            raise SystemExit(1)
+        print("\n✨ ベースラインからの性能低下はありません。")
+    else:
+        print(f"\nℹ️ ベースラインがありません（--save-baseline で保存できます）: {args.baseline}")
@@ -0,0 +1,145 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from script import SURVEY_SCHEMA, REGRESSION_VARS, TIMESTAMP_COL
+
+# --- 定数定義 ---
+
+# 回帰係数（虫嫌いスコアの差、参照カテゴリとの比較）の既定値: 論文草稿（N=50）の推定値
+DEFAULT_EFFECTS = {
+    'Nature_Sometimes': -0.06, 'Nature_Frequent': -0.16,
+    'Reading_Sometimes': -13.68, 'Reading_Frequent': -12.76,
+    'InsectBook_Sometimes': -8.77, 'InsectBook_Frequent': -19.33,
+    'Area_Regional': 9.63, 'Area_Suburban': 14.78, 'Area_Urban': 7.97,
+}
+
+# 参照カテゴリ（全ダミー=0）の虫嫌いスコアの平均と、回答者ごとのばらつき（標準偏差）
+DEFAULT_INTERCEPT = 45.0
+DEFAULT_NOISE_SD = 8.0
+
+# Q1-Q11の回答の範囲（スコアの範囲は11-66）と設問ごとのばらつき
+N_ITEMS = 11
+ITEM_MIN, ITEM_MAX = 1, 6
+ITEM_NOISE_SD = 0.8
+
+# 元の調査票の列順（タイムスタンプ、性別、居住地域、自然接触、読書、虫本、Q1-Q11）
+ANSWER_ORDER = ['Gender', 'Residence_Area', 'Nature_Contact', 'Reading_Habit', 'Insect_Book_Reading']
+
+DEFAULT_CHUNKSIZE = 1_000_000
+
+# タイムスタンプ: 回答者ごとに異なる時刻（開始時刻から行ごとに一定の間隔、品質チェックで別の回答者として扱われる）
+TIMESTAMP_START = np.datetime64('2024-01-01T09:00:00')
+TIMESTAMP_INTERVAL_SECONDS = 7
+
+
+def survey_header():
+    """
+    script.pyが読み込む元のCSVと同じ日本語のカラム名（Q1-Q11は「1. 質問1」の形式）を返す
+    """
+    return ([TIMESTAMP_COL] + [SURVEY_SCHEMA[name]['column'] for name in ANSWER_ORDER]
+            + [f'{i}. 質問{i}' for i in range(1, N_ITEMS + 1)])
+
+
+def _effect_lookup(effects):
+    """
+    設問ごとに「水準の位置 → スコアへの効果」の配列を作る（参照カテゴリとダミーのない水準は0）
+    """
+    unknown = set(effects) - set(REGRESSION_VARS)
+    if unknown:
+        raise ValueError(f"未知のダミー変数です: {sorted(unknown)}")
+    lookup = {}
+    for name, question in SURVEY_SCHEMA.items():
+        lookup[name] = np.array([effects.get(question['dummies'].get(code), 0.0) for code in question['codes']])
+    return lookup
+
+
+def _timestamps(first_row, n_rows):
+    """
+    first_row行目からn_rows行分のタイムスタンプ（元のCSVと同じ「YYYY/MM/DD HH:MM:SS」形式）
+    """
+    seconds = (first_row + np.arange(n_rows)) * TIMESTAMP_INTERVAL_SECONDS
+    stamps = np.datetime_as_string(TIMESTAMP_START + seconds.astype('timedelta64[s]'), unit='s')
+    return np.char.replace(np.char.replace(stamps, '-', '/'), 'T', ' ').astype(object)
+
+
+def generate_chunk(n_rows, rng, effects=None, intercept=DEFAULT_INTERCEPT, noise_sd=DEFAULT_NOISE_SD,
+                   missing_rate=0.0, invalid_rate=0.0, first_row=0):
+    """
+    n_rows件の合成回答を元のCSVと同じ列構成のDataFrameとして生成する
+    回答は各水準から一様に抽出し、虫嫌いスコアの平均は intercept + Σ効果（ダミー変数の回帰モデル）とする。
+    missing_rate: Q1-Q11の各回答が欠損する確率、invalid_rate: 選択肢が調査票にない回答（例: 性別「その他」）の確率
+    first_row: このチャンクの先頭の行番号（タイムスタンプを行ごとに変えるため）
+    """
+    lookup = _effect_lookup(DEFAULT_EFFECTS if effects is None else effects)
+    columns = {TIMESTAMP_COL: _timestamps(first_row, n_rows)}
+    mean_score = np.full(n_rows, float(intercept))
+    for name in ANSWER_ORDER:
+        question = SURVEY_SCHEMA[name]
+        pos = rng.integers(0, len(question['levels']), n_rows)
+        mean_score += lookup[name][pos]
+        answers = np.asarray(question['levels'], dtype=object)[pos]
+        if invalid_rate > 0:
+            answers[rng.random(n_rows) < invalid_rate] = 'その他'
+        columns[question['column']] = answers
+
+    # 回答者ごとのスコアを11問に均等に割り振り、設問ごとの揺らぎを加えて1-6に丸める
+    # （1-6で打ち切るため、平均が範囲の端に近い組み合わせでは効果がやや小さく推定される）
+    latent = (mean_score + rng.normal(0, noise_sd, n_rows)) / N_ITEMS
+    items = latent[:, None] + rng.normal(0, ITEM_NOISE_SD, (n_rows, N_ITEMS))
+    items = np.clip(np.rint(items), ITEM_MIN, ITEM_MAX)
+    if missing_rate > 0:
+        items[rng.random(items.shape) < missing_rate] = np.nan
+    for i in range(N_ITEMS):
+        columns[f'{i + 1}. 質問{i + 1}'] = items[:, i]
+    return pd.DataFrame(columns, columns=survey_header())
+
+
+def generate_survey(n_rows, output_path, effects=None, intercept=DEFAULT_INTERCEPT, noise_sd=DEFAULT_NOISE_SD,
+                    missing_rate=0.0, invalid_rate=0.0, seed=0, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    合成アンケートデータをCSV（utf-8-sig）に書き出す
+    chunksize行ずつ生成して追記するため、10^7件でもメモリ使用量はchunksizeで頭打ちになる
+    """
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_rows, chunksize) or [0]:
+        chunk = generate_chunk(min(chunksize, n_rows - start), rng, effects, intercept, noise_sd,
+                               missing_rate, invalid_rate, start)
+        if start == 0:
+            chunk.to_csv(output_path, index=False, encoding='utf-8-sig')
+        else:
+            chunk.to_csv(output_path, index=False, header=False, mode='a', encoding='utf-8')
+    return output_path
+
+
+def parse_effects(items, scale=1.0):
+    """
+    ["InsectBook_Frequent=-10", ...] を既定値に上書きし、全体をscale倍した効果の辞書を返す（scale=0で効果なし）
+    """
+    effects = dict(DEFAULT_EFFECTS)
+    for item in items or []:
+        name, _, value = item.partition('=')
+        effects[name.strip()] = float(value)
+    return {name: value * scale for name, value in effects.items()}
+
+
+# --- 実行 ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='script.pyと同じ形式の合成アンケートデータを生成する')
+    parser.add_argument('n_rows', type=lambda s: int(float(s)), help='回答数（1e6 のような指数表記も可）')
+    parser.add_argument('-o', '--output', default=None, help='出力CSV（既定: synthetic_<n_rows>.csv）')
+    parser.add_argument('--effect', action='append', metavar='NAME=VALUE',
+                        help='ダミー変数の効果（スコア差）を上書きする（複数指定可）')
+    parser.add_argument('--effect-scale', type=float, default=1.0, help='全ての効果に掛ける倍率（0で効果なし）')
+    parser.add_argument('--intercept', type=float, default=DEFAULT_INTERCEPT)
+    parser.add_argument('--noise-sd', type=float, default=DEFAULT_NOISE_SD)
+    parser.add_argument('--missing-rate', type=float, default=0.0)
+    parser.add_argument('--invalid-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    output_path = args.output or f'synthetic_{args.n_rows}.csv'
+    generate_survey(args.n_rows, output_path, parse_effects(args.effect, args.effect_scale), args.intercept,
+                    args.noise_sd, args.missing_rate, args.invalid_rate, args.seed)
+    print(f"✅ {args.n_rows} 件の合成データを出力しました: {output_path}")
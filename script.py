@@ -1,494 +1,3412 @@
 import pandas as pd
 import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-import statsmodels.api as sm
+from types import SimpleNamespace
+from contextlib import contextmanager
+from datetime import datetime
+import hashlib
+import io
+import inspect
+import json
+import glob
 import re
 import os
+import sys
+import time
 
-def analyze_and_visualize(file_path):
+# --- 定数定義 ---
+
+# 調査票スキーマ: 各設問の列名（日本語の設問文）、回答の水準（数値コードの昇順）、数値コード、
+# 英語ラベル、回帰の参照カテゴリとダミー変数名（{コード: 変数名}）を一か所で定義する
+SURVEY_SCHEMA = {
+    'Nature_Contact': {
+        'column': '幼少期、屋外で遊ぶ際、よく山や川、海、田んぼなど、自然に近接した空間で遊んでいましたか？',
+        'levels': ['ほとんど遊ばなかった', 'たまに遊んでいた', 'よく遊んでいた'],
+        'codes': [1, 2, 3],
+        'labels': ['Rarely', 'Occasionaly', 'Frequently'],
+        'reference': 1,
+        'dummies': {2: 'Nature_Sometimes', 3: 'Nature_Frequent'},
+    },
+    'Reading_Habit': {
+        'column': '幼少期によく本を読んでいましたか？',
+        'levels': ['ほとんど読まなかった', 'たまに読んでいた', 'よく読んでいた'],
+        'codes': [1, 2, 3],
+        'labels': ['Rarely', 'Occasionaly', 'Frequently'],
+        'reference': 1,
+        'dummies': {2: 'Reading_Sometimes', 3: 'Reading_Frequent'},
+    },
+    'Insect_Book_Reading': {
+        'column': '幼少期によく虫に関する本（図鑑等も含む）を読んでいましたか？',
+        'levels': ['ほとんど読まなかった', 'たまに読んでいた', 'よく読んでいた'],
+        'codes': [1, 2, 3],
+        'labels': ['Rarely', 'Occasionaly', 'Frequently'],
+        'reference': 1,
+        'dummies': {2: 'InsectBook_Sometimes', 3: 'InsectBook_Frequent'},
+    },
+    # 居住地域 (都市化度: 農村=1 → 都心=4)
+    'Residence_Area': {
+        'column': '幼少期に最も長く住んでいた居住地域の種類を選択してください。',
+        'levels': ['農村・漁村', '地方中心市街地', '郊外住宅地・団地', '都心・都市部'],
+        'codes': [1, 2, 3, 4],
+        'labels': ['Rural', 'Regional City', 'Suburban', 'Urban'],
+        'reference': 1,
+        'dummies': {2: 'Area_Regional', 3: 'Area_Suburban', 4: 'Area_Urban'},
+    },
+    # 性別 (男性=0, 女性=1)、回帰には含めない
+    'Gender': {
+        'column': '性別を選択してください。',
+        'levels': ['男性', '女性'],
+        'codes': [0, 1],
+        'labels': ['Male', 'Female'],
+        'reference': 0,
+        'dummies': {},
+    },
+}
+
+# カラム名の対応表（Q1-Q11は読み込み時に自動抽出）
+RENAME_DICT = {question['column']: name for name, question in SURVEY_SCHEMA.items()}
+
+Q_COLS = [f'Q{i}' for i in range(1, 12)]
+# Q1-Q11の回答の範囲（6件法）
+Q_RANGE = (1, 6)
+
+TIMESTAMP_COL = 'タイムスタンプ'
+
+FACTORS = {
+    '自然接触頻度': 'Nature_Contact_Num',
+    '読書習慣': 'Reading_Habit_Num',
+    '虫本読書頻度': 'Insect_Book_Reading_Num',
+    '性別(女性=1)': 'Gender_Num',
+    '居住地域(都市化度)': 'Residence_Area_Num'
+}
+
+# 相関・回帰・可視化で使用する数値カラム（ストリーミング時はこの組み合わせの度数のみ保持）
+ANALYSIS_COLS = ['Insect_Dislike_Score', 'Nature_Contact_Num', 'Reading_Habit_Num',
+                 'Insect_Book_Reading_Num', 'Gender_Num', 'Residence_Area_Num']
+
+# ダミー変数の定義: (変数名, 元カラム, 値)  スキーマの参照カテゴリ以外の水準
+DUMMY_SPECS = [(dummy, f'{name}_Num', code)
+               for name, question in SURVEY_SCHEMA.items()
+               for code, dummy in question['dummies'].items()]
+REGRESSION_VARS = [name for name, _, _ in DUMMY_SPECS]
+
+DEFAULT_CHUNKSIZE = 100_000
+
+# スピアマン相関エンジン: ユニーク値がこの数以下の列は同時度数表（高速経路）、超える列は順位の積和（順位経路）で扱う
+SPEARMAN_MAX_COLUMN_LEVELS = 64
+# 高速経路で扱う水準数（列のユニーク値）の合計の上限（超える分は水準の多い列から順位経路に回す）
+SPEARMAN_MAX_LEVELS = 4096
+# 行をチャンクに分けて積を求める際の、1チャンクの作業行列の大きさの上限（バイト）
+SPEARMAN_BLOCK_BYTES = 64 << 20
+
+# 前処理キャッシュの保存先
+CACHE_DIR = '.survey_cache'
+
+# 実行ログ（段階ごとの時間・メモリ、欠損除去の行数）の保存先
+RUN_LOG_PATH = 'run_log.json'
+
+
+def _level_index(values, question):
+    """
+    数値コードを水準の位置（0始まり、欠損・スキーマにない値は-1）に変換する
+    """
+    codes = np.asarray(question['codes'], dtype=float)
+    values = pd.Series(values).to_numpy(dtype=float, na_value=np.nan)
+    pos = np.clip(np.searchsorted(codes, values), 0, len(codes) - 1)
+    return np.where(codes[pos] == values, pos, -1)
+
+
+def _compact_items(items):
+    """
+    Q1-Q11の回答を、整数かつint8に収まる列はnullableなInt8に変換する（それ以外はそのまま）
+    """
+    for col in items.columns:
+        values = items[col].dropna()
+        if ((values == values.round()) & values.between(-128, 127)).all():
+            items[col] = items[col].astype('Int8')
+    return items
+
+
+def preprocess_survey(df):
+    """
+    カラム名の整理・虫嫌いスコアの算出・順序尺度の数値化を行う（チャンク単位でも使用可能）
+    回答はSURVEY_SCHEMAの水準を持つCategorical、数値コード（*_Num）とQ1-Q11はInt8で保持する
+    """
+    rename_dict = dict(RENAME_DICT)
+    # Q1-Q11の自動抽出
+    for col in df.columns:
+        match = re.match(r'(\d+)\.', col)
+        if match:
+            rename_dict[col] = f'Q{match.group(1)}'
+
+    df_clean = df.rename(columns=rename_dict)
+
+    # 虫嫌いスコアの算出 (Q1-Q11の合計)
+    items = df_clean[Q_COLS].apply(pd.to_numeric, errors='coerce')
+    df_clean['Insect_Dislike_Score'] = items.sum(axis=1)
+    df_clean[Q_COLS] = _compact_items(items)
+
+    # 数値化（分析用）: 回答をCategoricalにし、その符号から数値コードを引く（スキーマにない回答は欠損）
+    for name, question in SURVEY_SCHEMA.items():
+        pos = pd.Index(question['levels']).get_indexer(df_clean[name])
+        codes = np.asarray(question['codes'], dtype=np.int8)
+        df_clean[name] = pd.Categorical.from_codes(pos, categories=question['levels'])
+        df_clean[f'{name}_Num'] = pd.arrays.IntegerArray(codes[np.maximum(pos, 0)], pos < 0)
+    return df_clean
+
+
+def frequency_table(df_clean, cols=ANALYSIS_COLS):
+    """
+    colsの値の組み合わせごとの度数表（Countカラム付き、欠損も1つの値として数える）を作る
+    """
+    return df_clean.groupby(cols, dropna=False, observed=True).size().rename('Count').reset_index()
+
+
+def read_survey_chunks(file_path, chunksize=DEFAULT_CHUNKSIZE, cols=None):
+    """
+    入力をchunksize行ずつ前処理したフレームとして返す
+    列指向アーカイブの場合はcols（既定: 全ての列）だけをメモリマップのビューとして切り出す（CSVの解析・前処理なし）
+    """
+    if is_archive(file_path):
+        yield from iter_archive_chunks(file_path, chunksize, cols)
+        return
+    for chunk in pd.read_csv(file_path, encoding='utf-8-sig', chunksize=chunksize):
+        yield preprocess_survey(chunk)
+
+
+def load_survey_streaming(file_path, chunksize=DEFAULT_CHUNKSIZE, cols=ANALYSIS_COLS, quality=None):
+    """
+    CSVをチャンク単位で読み込み、cols（既定: ANALYSIS_COLS）の組み合わせごとの度数表（十分統計量）だけを保持する。
+    度数表の行数は回答の組み合わせ数で頭打ちになるため、ファイルサイズに関係なくメモリ使用量は一定。
+    quality: 品質チェックの状態（new_quality_check）。指定すると除外する行を度数表に含めない
+    """
+    df_freq = None
+    for chunk_clean in read_survey_chunks(file_path, chunksize, None if quality else cols):
+        if quality is not None:
+            chunk_clean = apply_quality_check(chunk_clean, quality)
+        counts = frequency_table(chunk_clean, cols)
+        if df_freq is not None:
+            counts = pd.concat([df_freq, counts])
+        df_freq = counts.groupby(cols, dropna=False, observed=True, as_index=False)['Count'].sum()
+    return df_freq
+
+
+def survey_columns(file_path):
+    """
+    前処理後のフレーム（df_clean）の列名（CSVはヘッダだけを前処理して求め、アーカイブは保存している列）
+    """
+    if is_archive(file_path):
+        return list(ARCHIVE_COLUMNS)
+    return list(preprocess_survey(pd.read_csv(file_path, encoding='utf-8-sig', nrows=0)).columns)
+
+
+def load_survey_frequencies(file_path, chunksize=DEFAULT_CHUNKSIZE, cache_dir=CACHE_DIR, group_by=None,
+                            quality=None):
+    """
+    ストリーミングモードの度数表をキャッシュ経由で取得する（group_byを指定するとグループ列も度数表に含める）
+    quality（品質チェックの状態）を指定した場合、除外する行は他の入力の登録状況にも依存するためキャッシュを使わない
+    """
+    keys = _group_keys(group_by)
+    if quality is not None:
+        return load_survey_streaming(file_path, chunksize, _stratified_cols(keys), quality)
+    if not keys:
+        return cached_frame(file_path, 'freq', lambda: load_survey_streaming(file_path, chunksize), cache_dir)
+    # グループ列ごとに別のキャッシュにする（種類名に列名のハッシュを付ける）
+    kind = 'freq_by' + hashlib.blake2b('\0'.join(keys).encode('utf-8'), digest_size=4).hexdigest()
+    return cached_frame(file_path, kind,
+                        lambda: load_survey_streaming(file_path, chunksize, _stratified_cols(keys)), cache_dir)
+
+
+# --- 実行ログ（段階ごとの時間・メモリ計測） ---
+# 各段階・各図の保存について経過時間・CPU時間・RSS・確保ブロック数の増減と、欠損除去の前後の行数を記録し、
+# 出力と同じ場所に実行ログ（JSON/CSV）として書き出す。指定した1段階だけcProfile/tracemallocで詳しく計測できる。
+
+def _rss_mb():
+    """
+    現在の常駐メモリとプロセス開始以降のピーク（いずれもMB）を返す（取得できない環境ではNone）
+    """
+    rss = peak = None
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak / 2**20 if sys.platform == 'darwin' else peak / 2**10  # macOSはバイト、Linuxはキロバイト
+    except ImportError:
+        pass
+    return rss, peak
+
+
+def _start_measure():
+    return time.perf_counter(), time.process_time(), _rss_mb()[0], sys.getallocatedblocks()
+
+
+def _finish_measure(start):
+    wall, cpu, rss_before, blocks = start
+    rss, peak = _rss_mb()
+    return {
+        'wall_s': round(time.perf_counter() - wall, 6),
+        'cpu_s': round(time.process_time() - cpu, 6),
+        'rss_mb': rss and round(rss, 2),
+        'rss_delta_mb': rss and rss_before and round(rss - rss_before, 2),
+        'peak_rss_mb': peak and round(peak, 2),
+        'alloc_blocks_delta': sys.getallocatedblocks() - blocks,
+    }
+
+
+def new_run_log(file_path, output_path=RUN_LOG_PATH, profile_stage=None, profile_mode='cprofile'):
+    """
+    実行ログを作る（output_path=Noneなら記録しない）
+    profile_stage: 詳しく計測する段階名（例: 'correlation', 'figure:図S1'）
+    profile_mode: 'cprofile'（関数ごとの時間、.profも保存）または 'tracemalloc'（行ごとのメモリ確保）
+    """
+    if not output_path:
+        return None
+    if profile_mode not in ('cprofile', 'tracemalloc'):
+        raise ValueError(f"profile_modeは 'cprofile' か 'tracemalloc' です: {profile_mode}")
+    return {'input': file_path, 'output_path': output_path, 'started_at': datetime.now().isoformat(timespec='seconds'),
+            'profile_stage': profile_stage, 'profile_mode': profile_mode, 'start': _start_measure(), 'records': []}
+
+
+def _profile_path(run_log, stage, ext):
+    stem = re.sub(r'[^\w.-]+', '_', stage).strip('_')
+    return os.path.join(os.path.dirname(run_log['output_path']), f"profile_{stem}.{ext}")
+
+
+@contextmanager
+def log_stage(run_log, stage, **info):
+    """
+    with内の処理を1つの段階として計測し、実行ログに追加する（run_log=Noneなら何もしない）
+    """
+    if run_log is None:
+        yield
+        return
+
+    profile = run_log['profile_stage'] == stage and run_log['profile_mode']
+    if profile == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif profile == 'tracemalloc':
+        import tracemalloc
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+    start = _start_measure()
+    try:
+        yield
+    except BaseException:
+        if profile == 'cprofile':
+            profiler.disable()
+        elif profile == 'tracemalloc':
+            tracemalloc.stop()
+        raise
+    record = {'kind': 'stage', 'stage': stage, **_finish_measure(start), **info}
+
+    if profile == 'cprofile':
+        import pstats
+        profiler.disable()
+        path = _profile_path(run_log, stage, 'prof')
+        profiler.dump_stats(path)
+        buf = io.StringIO()
+        pstats.Stats(profiler, stream=buf).sort_stats('cumulative').print_stats(20)
+        record.update(profile_path=path, profile_top=buf.getvalue())
+    elif profile == 'tracemalloc':
+        diff = tracemalloc.take_snapshot().compare_to(before, 'lineno')
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        record.update(tracemalloc_peak_mb=round(peak / 2**20, 2),
+                      alloc_count=sum(stat.count_diff for stat in diff if stat.count_diff > 0),
+                      profile_top='\n'.join(str(stat) for stat in diff[:20]))
+    run_log['records'].append(record)
+
+
+def log_rows(run_log, stage, rows_in, rows_out):
+    """
+    欠損除去などの前後の行数を実行ログに追加する
+    """
+    if run_log is not None:
+        run_log['records'].append({'kind': 'rows', 'stage': stage, 'rows_in': int(rows_in),
+                                   'rows_out': int(rows_out), 'rows_dropped': int(rows_in - rows_out)})
+
+
+def write_run_log(run_log):
+    """
+    実行ログを書き出す（拡張子が.csvなら1記録1行のCSV、それ以外はJSON）
+    """
+    if run_log is None:
+        return
+    output_path = run_log['output_path']
+    total = {'kind': 'total', 'stage': 'total', **_finish_measure(run_log['start'])}
+    records = run_log['records'] + [total]
+    if output_path.endswith('.csv'):
+        df_log = pd.DataFrame(records)
+        df_log.insert(0, 'input', run_log['input'])
+        df_log.insert(1, 'started_at', run_log['started_at'])
+        df_log.to_csv(output_path, index=False, encoding='utf-8-sig')
+    else:
+        header = {key: run_log[key] for key in ('input', 'started_at', 'profile_stage', 'profile_mode')}
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump({**header, 'records': records}, f, ensure_ascii=False, indent=2)
+    print(f"📝 実行ログを保存: {output_path}")
+
+
+# --- 前処理キャッシュ ---
+# 入力ファイルの内容と前処理の定義（対応表・前処理コード）のハッシュをキーとして、
+# 前処理済みのフレームを列指向バイナリ（Feather/Arrow IPC、pyarrowが無い場合はpickle）で保存する
+
+def _file_digest(file_path):
+    """
+    入力ファイルの内容ハッシュ（列指向アーカイブの場合は目録に記録した各回の内容ハッシュから求める）
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if is_archive(file_path):
+        manifest = load_archive_manifest(file_path)
+        h.update(json.dumps([manifest['fingerprint'], manifest['waves']], sort_keys=True).encode('utf-8'))
+        return h.hexdigest()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _preprocess_fingerprint():
+    """
+    前処理の定義のハッシュ（対応表や前処理コードを変更するとキャッシュは自動的に無効になる）
+    """
+    h = hashlib.blake2b(digest_size=16)
+    tables = [SURVEY_SCHEMA, Q_COLS, ANALYSIS_COLS]
+    h.update(json.dumps(tables, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+    for func in (preprocess_survey, _compact_items, load_survey_streaming):
+        h.update(inspect.getsource(func).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow.feather  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _read_cache(path):
+    """
+    キャッシュを読み込む（Featherはメモリマップで開き、CSVの解析を行わない）
+    """
+    if path.endswith('.feather'):
+        import pyarrow.feather as feather
+        return feather.read_table(path, memory_map=True).to_pandas()
+    return pd.read_pickle(path)
+
+
+def _write_cache(df, path):
+    """
+    キャッシュを書き込む（一時ファイルに書いてから置き換える）
+    """
+    tmp_path = path + '.tmp'
+    if path.endswith('.feather'):
+        df.reset_index(drop=True).to_feather(tmp_path, compression='uncompressed')
+    else:
+        df.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def cached_frame(file_path, kind, builder, cache_dir=CACHE_DIR):
+    """
+    file_pathから作るフレームをキャッシュ経由で取得する。
+    kind: キャッシュの種類（'clean' / 'freq'）、builder: キャッシュが無い場合にフレームを作る関数
+    """
+    if not cache_dir:
+        return builder()
+
+    key = hashlib.blake2b(f"{kind}:{_file_digest(file_path)}:{_preprocess_fingerprint()}".encode('utf-8'),
+                          digest_size=8).hexdigest()
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    ext = 'feather' if _has_pyarrow() else 'pkl'
+    path = os.path.join(cache_dir, f"{stem}.{kind}-{key}.{ext}")
+
+    if os.path.exists(path):
+        try:
+            df = _read_cache(path)
+            print(f"⚡ キャッシュから読み込み: {path}")
+            return df
+        except Exception as e:
+            print(f"⚠️ キャッシュを読み込めないため再作成します: {e}")
+
+    df = builder()
+    os.makedirs(cache_dir, exist_ok=True)
+    # 同じ入力・種類の古いキャッシュを削除
+    for old in glob.glob(os.path.join(cache_dir, f"{glob.escape(stem)}.{kind}-*")):
+        os.remove(old)
+    _write_cache(df, path)
+    print(f"💾 前処理結果をキャッシュに保存: {path}")
+    return df
+
+
+def load_survey(file_path, cache_dir=CACHE_DIR):
+    """
+    CSVを読み込んで前処理したフレーム（df_clean）を返す（キャッシュがあればCSVの解析を省略）
+    列指向アーカイブの場合は、全ての回の列をメモリマップのビューとして返す（キャッシュは使わない）
+    """
+    if is_archive(file_path):
+        return open_archive(file_path)
+    return cached_frame(file_path, 'clean',
+                        lambda: preprocess_survey(pd.read_csv(file_path, encoding='utf-8-sig')),
+                        cache_dir)
+
+
+def build_dummy_frame(df_clean, groups=None):
+    """
+    回帰分析用のダミー変数フレームを作成する（度数表の場合はCountカラムも引き継ぐ）
+    設問ごとに「水準の位置 → ダミー変数の行」の表を引くだけで作る（欠損は参照カテゴリと同じく全て0）
+    groups: 設問名 → {コード: ダミー変数名}（既定: スキーマのdummies）
+    """
+    columns = {'Insect_Dislike_Score': df_clean['Insect_Dislike_Score'].to_numpy()}
+    for name, question in SURVEY_SCHEMA.items():
+        dummies = question['dummies'] if groups is None else groups.get(name, {})
+        if not dummies:
+            continue
+        lookup = np.zeros((len(question['codes']) + 1, len(dummies)), dtype=np.int8)
+        for j, code in enumerate(dummies):
+            lookup[question['codes'].index(code), j] = 1
+        block = lookup[_level_index(df_clean[f'{name}_Num'], question)]  # 位置-1は最後の行（全て0）
+        columns.update(zip(dummies.values(), block.T))
+    if 'Count' in df_clean.columns:
+        columns['Count'] = df_clean['Count'].to_numpy()
+    return pd.DataFrame(columns, index=df_clean.index)
+
+
+def significance_marker(p_value):
+    """
+    p値を有意性の記号に変換する
+    """
+    return '***' if p_value < 0.001 else '**' if p_value < 0.01 else '*' if p_value < 0.05 else 'n.s.'
+
+
+def _segment_sum(values, offsets, axis):
+    """
+    offsetsで区切られたブロックごとの和（np.add.reduceat）
+    """
+    return np.add.reduceat(values, offsets, axis=axis)
+
+
+def _weighted_midranks(code, n_levels, weights):
+    """
+    水準の位置（欠損は-1）から、水準ごとの平均順位（同順位は平均、weightsは度数として数える）を求める
+    重みが全て1ならscipy.stats.rankdata(method='average')と同じ順位になる。
+    桁落ちを避けるため、有効な行全体の平均順位を引いた値を返す（定数列は全て0）
+    """
+    valid = code >= 0
+    counts = np.bincount(code[valid], weights=weights[valid], minlength=n_levels)
+    return np.cumsum(counts) - counts + (counts + 1) / 2 - (counts.sum() + 1) / 2
+
+
+def _pair_rank_crossproducts(code_i, code_j, n_levels_i, n_levels_j, weights):
+    """
+    1ペアの共通有効行だけで2列の平均順位を付け直し、(交差積和, 列iの平方和, 列jの平方和, 有効N) を求める
+    """
+    both = (code_i >= 0) & (code_j >= 0)
+    rank_i = _weighted_midranks(np.where(both, code_i, -1), n_levels_i, weights)[code_i[both]]
+    rank_j = _weighted_midranks(np.where(both, code_j, -1), n_levels_j, weights)[code_j[both]]
+    w = weights[both]
+    return np.sum(w * rank_i * rank_j), np.sum(w * rank_i ** 2), np.sum(w * rank_j ** 2), np.sum(w)
+
+
+def _rank_crossproducts(codes, n_levels_by_col, weights, chunksize, skip=()):
+    """
+    順位経路: 各列を一度だけ平均順位にし、欠損マスクとの行列積からペアごとの共通有効行での積和を求める。
+    欠損する行が2列で異なるペアは、共通有効行だけで順位を付け直して求め直す（skipの列どうしのペアは除く）
+    戻り値: (交差積和, 平方和 ss[j, i]（列iとの共通行での列jの平方和）, 有効N)
+    """
+    k = len(codes)
+    n_rows = len(weights)
+    level_ranks = [_weighted_midranks(code, n_levels, weights) for code, n_levels in zip(codes, n_levels_by_col)]
+    shared = np.zeros((k, k))                # shared[i, j]: 列iと列jがともに有効な行数（重みなし）
+    sums = np.zeros((k, k))                  # sums[i, j]: 列jが有効な行での列iの順位の和
+    squares = np.zeros((k, k))
+    products = np.zeros((k, k))
+    n_pair = np.zeros((k, k))
+    step = max(1, min(chunksize, SPEARMAN_BLOCK_BYTES // (8 * 4 * k)))
+    for start in range(0, n_rows, step):
+        stop = min(start + step, n_rows)
+        valid = np.column_stack([code[start:stop] >= 0 for code in codes]).astype(float)
+        ranks = np.column_stack([np.where(code[start:stop] >= 0, level_rank[np.maximum(code[start:stop], 0)], 0.0)
+                                 for code, level_rank in zip(codes, level_ranks)])
+        w = weights[start:stop, None]
+        weighted = ranks * w
+        shared += valid.T @ valid
+        n_pair += (valid * w).T @ valid
+        sums += weighted.T @ valid
+        squares += (weighted * ranks).T @ valid
+        products += weighted.T @ ranks
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cross = products - sums * sums.T / n_pair
+        ss = (squares - sums ** 2 / n_pair).T
+
+    # 欠損マスクが異なるペア（どちらか一方だけ有効な行がある）は、共通有効行での順位で求め直す
+    valid_rows = np.diag(shared)
+    differs = np.triu(valid_rows[:, None] + valid_rows[None, :] - 2 * shared > 0, k=1)
+    for i, j in zip(*np.nonzero(differs)):
+        if i in skip and j in skip:
+            continue
+        c, ss_i, ss_j, n = _pair_rank_crossproducts(codes[i], codes[j], n_levels_by_col[i], n_levels_by_col[j],
+                                                    weights)
+        cross[i, j] = cross[j, i] = c
+        ss[i, j], ss[j, i] = ss_i, ss_j
+        n_pair[i, j] = n_pair[j, i] = n
+    return cross, ss, n_pair
+
+
+def _contingency_crossproducts(codes, n_levels_by_col, weights, chunksize):
+    """
+    高速経路: 全列の水準のone-hot行列Oから同時度数表 N = O'WO を作り、ペアごとの交差積和・平方和・有効Nを求める
+    """
+    n_rows = len(weights)
+    offsets = np.concatenate([[0], np.cumsum(n_levels_by_col)[:-1]]).astype(int)
+    n_levels = int(np.sum(n_levels_by_col))
+
+    # 1. 全列の同時度数表 N = O'WO（行をチャンクに分けて累積、one-hotブロックはSPEARMAN_BLOCK_BYTES以下）
+    N = np.zeros((n_levels, n_levels))
+    step = max(1, min(chunksize, SPEARMAN_BLOCK_BYTES // (8 * 2 * max(n_levels, 1))))
+    for start in range(0, n_rows, step):
+        stop = min(start + step, n_rows)
+        onehot = np.zeros((stop - start, n_levels))
+        rows = np.arange(stop - start)
+        for code, offset in zip(codes, offsets):
+            chunk_code = code[start:stop]
+            valid = chunk_code >= 0
+            onehot[rows[valid], offset + chunk_code[valid]] = 1.0
+        N += onehot.T @ (onehot * weights[start:stop, None])
+
+    # 2. ペアごとの水準別度数 → 平均順位（列jの水準hについて、列iが欠損でない行だけで数える）
+    col_of_level = np.repeat(np.arange(len(codes)), n_levels_by_col)
+    counts = _segment_sum(N, offsets, axis=1)                      # (水準, 列): 列iとの共通有効行での度数
+    cum = np.cumsum(counts, axis=0)
+    cum_before = cum - counts - (cum - counts)[offsets][col_of_level]
+    ranks = cum_before + (counts + 1) / 2
+    n_pair = _segment_sum(counts, offsets, axis=0)                 # (列j, 列i)
+    centered = ranks - (n_pair[col_of_level] + 1) / 2
+
+    # 3. 平方和と交差積和（全ペア分をまとめて計算）
+    ss = _segment_sum(counts * centered ** 2, offsets, axis=0)     # ss[j, i]: 列iとの共通行での列jの平方和
+    expanded = centered[:, col_of_level]                           # expanded[g, h] = 水準gの列の、水準hの列との順位
+    cross = _segment_sum(_segment_sum(expanded * N * expanded.T, offsets, axis=0), offsets, axis=1)
+    return cross, ss, n_pair
+
+
+def spearman_matrix(df, cols, weights=None, chunksize=65536):
+    """
+    colsの全ペアのスピアマン順位相関係数・p値・有効N（ペアごとに欠損を除外）を一括で求める。
+
+    各列は一度だけ水準（昇順のユニーク値）に符号化する。水準数がSPEARMAN_MAX_COLUMN_LEVELS以下の列どうしは
+    全列の水準のone-hot行列Oから同時度数表 N = O'WO を1回の行列積で作り、ペアごとの欠損除外後の平均順位・分散・
+    共分散をNのブロックから計算する（高速経路、列ごとに再順位付けする必要がない）。水準の多い列（連続的な共変量など）
+    を含むペアは、各列を一度だけ平均順位にし、欠損マスクとの行列積で共通有効行の積和を求める（順位経路。
+    2列で欠損する行が異なるペアだけは、共通有効行で順位を付け直すため、どちらの経路もペアごとに欠損を除外した
+    スピアマン相関と一致する）。同順位は平均順位、p値はscipy.stats.spearmanrと同じt分布近似。
+    weightsを指定すると度数表としても扱える。
+    戻り値: SimpleNamespace(r=DataFrame, p=DataFrame, n=DataFrame)
+    """
+    from scipy import special
+    n_rows = len(df)
+    if weights is None:
+        weights = np.ones(n_rows)
+    weights = np.asarray(weights, dtype=float)
+
+    # 1. 各列を一度だけ水準に符号化（欠損は-1）
+    codes = []
+    n_levels_by_col = []
+    for col in cols:
+        values = df[col].to_numpy(dtype=float, na_value=np.nan)
+        valid = ~np.isnan(values)
+        levels, code = np.unique(values[valid], return_inverse=True)
+        full_code = np.full(n_rows, -1, dtype=np.int32)
+        full_code[valid] = code
+        codes.append(full_code)
+        n_levels_by_col.append(len(levels))
+
+    # 2. 水準の少ない列を高速経路に割り当てる（水準数の合計が上限を超える分は、水準の多い列から順位経路に回す）
+    fast = [i for i in np.argsort(n_levels_by_col, kind='stable') if n_levels_by_col[i] <= SPEARMAN_MAX_COLUMN_LEVELS]
+    while fast and sum(n_levels_by_col[i] for i in fast) > SPEARMAN_MAX_LEVELS:
+        fast.pop()
+    fast = sorted(fast)
+
+    # 3. 交差積和・平方和・有効N（順位経路の列があれば全ペアを順位経路で求め、高速経路の列どうしは上書きする）
+    k = len(cols)
+    cross, ss, n_pair = np.zeros((k, k)), np.zeros((k, k)), np.zeros((k, k))
+    if len(fast) < k:
+        cross, ss, n_pair = _rank_crossproducts(codes, n_levels_by_col, weights, chunksize, set(fast))
+    if fast:
+        block = np.ix_(fast, fast)
+        cross[block], ss[block], n_pair[block] = _contingency_crossproducts(
+            [codes[i] for i in fast], [n_levels_by_col[i] for i in fast], weights, chunksize)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = cross / np.sqrt(ss * ss.T)
+        r = np.clip(r, -1.0, 1.0)
+        dof = n_pair - 2
+        t = r * np.sqrt(dof / ((1.0 - r) * (1.0 + r)))
+        p = 2 * special.stdtr(dof, -np.abs(t))
+    np.fill_diagonal(r, np.where(np.diag(ss) > 0, 1.0, np.nan))
+    np.fill_diagonal(p, np.where(np.diag(ss) > 0, 0.0, np.nan))
+
+    return SimpleNamespace(
+        r=pd.DataFrame(r, index=cols, columns=cols),
+        p=pd.DataFrame(p, index=cols, columns=cols),
+        n=pd.DataFrame(n_pair, index=cols, columns=cols),
+    )
+
+
+def correlation_results_from_matrix(corr):
+    """
+    相関行列から相関分析結果 [(ラベル, r, p), ...]（各要因 vs 虫嫌いスコア）を取り出す
+    """
+    corr_results = []
+    for label, col in FACTORS.items():
+        if corr.n.loc['Insect_Dislike_Score', col] > 0:
+            corr_results.append((label, corr.r.loc['Insect_Dislike_Score', col],
+                                 corr.p.loc['Insect_Dislike_Score', col]))
+    return corr_results
+
+
+def fit_ols_from_crossproducts(XtX, Xty, yty, n, names):
+    """
+    X'X, X'y, y'y, n からOLSの係数・標準誤差・p値・R²・F検定を求める。
+    statsmodelsの結果オブジェクトと同じ属性名（params, bse, pvalues, rsquared, ...）で返す。
+    """
+    from scipy import special
+    k = len(names)
+    XtX_inv = np.linalg.inv(XtX)
+    params = XtX_inv @ Xty
+    ssr = yty - params @ Xty
+    df_resid = n - k
+    scale = ssr / df_resid
+    bse = np.sqrt(np.diag(XtX_inv) * scale)
+    pvalues = 2 * special.stdtr(df_resid, -np.abs(params / bse))
+    y_mean = Xty[0] / n  # 先頭列は定数項
+    centered_tss = yty - n * y_mean ** 2
+    rsquared = 1 - ssr / centered_tss
+    df_model = k - 1
+    fvalue = ((centered_tss - ssr) / df_model) / scale
+    return SimpleNamespace(
+        params=pd.Series(params, index=names),
+        bse=pd.Series(bse, index=names),
+        pvalues=pd.Series(pvalues, index=names),
+        rsquared=rsquared,
+        rsquared_adj=1 - (1 - rsquared) * (n - 1) / df_resid,
+        fvalue=fvalue,
+        f_pvalue=special.fdtrc(df_model, df_resid, fvalue),
+        nobs=n,
+    )
+
+
+def regression_crossproducts(df_clean):
+    """
+    ダミー変数デザイン（定数項付き）のクロス積 X'X, X'y, y'y と件数nを求める（Countカラムがあれば度数で重み付け）
+    """
+    return dummy_crossproducts(build_dummy_frame(df_clean).dropna())
+
+
+def dummy_crossproducts(df_reg, var_names=REGRESSION_VARS):
+    """
+    欠損除去済みのダミー変数フレーム（build_dummy_frameの形式）からクロス積を求める（列は定数項＋var_names）
+    """
+    w = df_reg['Count'].to_numpy(dtype=float) if 'Count' in df_reg.columns else np.ones(len(df_reg))
+    y = df_reg['Insect_Dislike_Score'].to_numpy(dtype=float)
+    X = np.column_stack([np.ones(len(df_reg)), df_reg[var_names].to_numpy(dtype=float)])
+    return {'XtX': X.T @ (X * w[:, None]), 'Xty': X.T @ (w * y), 'yty': float(w @ (y * y)), 'n': float(w.sum())}
+
+
+def fit_ols_from_state(state):
+    """
+    クロス積（regression_crossproductsの形式）からダミー変数回帰を求める
+    """
+    return fit_ols_from_crossproducts(state['XtX'], state['Xty'], state['yty'], state['n'],
+                                      ['const'] + REGRESSION_VARS)
+
+
+# --- 列指向アーカイブ（調査の回ごとに追記） ---
+# 全ての回の回答を、前処理済みの列ごとの生バイナリ（<列>.<部分>.bin）と目録（ARCHIVE_MANIFEST）として保存する。
+# 新しい回は各列のファイルの末尾に追記するだけで、既存の回のデータは書き換えない。
+# 読み込みは列ごとのメモリマップ（np.memmap）をそのままpandasの配列にする（コピーなし）ため、
+# 各段階が参照した列・ページだけがディスクから読まれ、全ての回がメモリに収まらなくても分析できる。
+
+ARCHIVE_MANIFEST = 'archive.json'
+# 回の列（目録の回のリスト waves での位置、--group-by wave で回ごとに層別できる）
+WAVE_COL = 'wave'
+
+# アーカイブに保存する列と形式（category: 水準の位置、Int8: 値と欠損マスク、float64・uint64・int16: 値）
+ARCHIVE_COLUMNS = {
+    **{name: 'category' for name in SURVEY_SCHEMA},
+    **{f'{name}_Num': 'Int8' for name in SURVEY_SCHEMA},
+    **{col: 'Int8' for col in Q_COLS},
+    'Insect_Dislike_Score': 'float64',
+    # 品質チェック用のハッシュ（タイムスタンプはアーカイブに保存しないため追記時に求める）
+    # Response_Hash: タイムスタンプ＋回答内容（重複の判定）、Content_Hash: 回答内容のみ（同じ内容の回答の報告）
+    'Response_Hash': 'uint64',
+    'Content_Hash': 'uint64',
+    WAVE_COL: 'int16',
+}
+
+# 形式ごとのファイル（部分名, dtype）
+ARCHIVE_PARTS = {
+    'category': [('codes', np.int8)],
+    'Int8': [('data', np.int8), ('mask', np.bool_)],
+    'float64': [('data', np.float64)],
+    'uint64': [('data', np.uint64)],
+    'int16': [('data', np.int16)],
+}
+
+
+def is_archive(path):
+    """
+    pathが列指向アーカイブ（目録のあるディレクトリ）か
+    """
+    return os.path.isfile(os.path.join(path, ARCHIVE_MANIFEST))
+
+
+def _archive_fingerprint():
+    """
+    アーカイブの符号化の定義のハッシュ（スキーマ・保存する列・前処理コード）
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([SURVEY_SCHEMA, ARCHIVE_COLUMNS], ensure_ascii=False, sort_keys=True).encode('utf-8'))
+    for func in (preprocess_survey, _compact_items, _archive_column_parts, response_hashes, content_hashes):
+        h.update(inspect.getsource(func).encode('utf-8'))
+    return h.hexdigest()
+
+
+def load_archive_manifest(archive_dir):
+    with open(os.path.join(archive_dir, ARCHIVE_MANIFEST), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_archive_manifest(manifest, archive_dir):
+    path = os.path.join(archive_dir, ARCHIVE_MANIFEST)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _archive_part_path(archive_dir, col, part):
+    return os.path.join(archive_dir, f"{col}.{part}.bin")
+
+
+def _archive_column_parts(df_clean, col, kind, dropped=None):
+    """
+    前処理済みのチャンクの1列を、アーカイブの形式の配列 [(部分名, 配列), ...] にする
+    Int8の列でint8の整数で表せない値は、preprocess_surveyがスキーマにない回答を扱うのと同じく欠損にする
+    （droppedを渡すと、欠損にした値の数を列ごとに加算する）
+    """
+    values = df_clean[col]
+    if kind == 'category':
+        return [('codes', values.array.codes.astype(np.int8, copy=False))]
+    if kind == 'float64':
+        return [('data', values.to_numpy(dtype=np.float64, na_value=np.nan))]
+    if kind in ('uint64', 'int16'):
+        return [('data', values.to_numpy(dtype=ARCHIVE_PARTS[kind][0][1]))]
+    data = values.to_numpy(dtype=float, na_value=np.nan)
+    valid = (data == np.round(data)) & (data >= -128) & (data <= 127)
+    if dropped is not None:
+        dropped[col] = dropped.get(col, 0) + int((~np.isnan(data) & ~valid).sum())
+    return [('data', np.where(valid, data, 0).astype(np.int8)), ('mask', ~valid)]
+
+
+def append_wave(archive_dir, file_path, chunksize=DEFAULT_CHUNKSIZE, wave=None):
+    """
+    CSV（1回分の調査）をチャンク単位で前処理し、アーカイブの各列のファイルの末尾に追記する
+    アーカイブが無ければ作る。同じ内容のファイルは2回追記しない。目録は全ての列を書き終えてから置き換えるため、
+    途中で失敗した追記は次回の追記の前に切り捨てられる（目録の行数が正）。
+    wave: 回の名前（既定: ファイル名の語幹）。各行には、目録の回のリストでのこの回の位置をWAVE_COL列に保存する
+    """
+    if is_archive(archive_dir):
+        manifest = load_archive_manifest(archive_dir)
+        if manifest['fingerprint'] != _archive_fingerprint():
+            raise ValueError(f"アーカイブの符号化の定義が現在の前処理と異なります。作り直してください: {archive_dir}")
+    else:
+        manifest = {'fingerprint': _archive_fingerprint(), 'columns': ARCHIVE_COLUMNS, 'rows': 0, 'waves': []}
+    digest = _file_digest(file_path)
+    if any(entry['digest'] == digest for entry in manifest['waves']):
+        print(f"⚡ 追記済みのためスキップ: {file_path}")
+        return manifest
+    wave_index = len(manifest['waves'])
+    if wave_index > np.iinfo(np.int16).max:
+        raise ValueError(f"アーカイブに追記できる回の数の上限に達しました: {archive_dir}")
+
+    os.makedirs(archive_dir, exist_ok=True)
+    start = manifest['rows']
+    files = {}
+    dropped = {}
+    try:
+        for col, kind in manifest['columns'].items():
+            for part, dtype in ARCHIVE_PARTS[kind]:
+                f = open(_archive_part_path(archive_dir, col, part), 'ab')
+                f.truncate(start * np.dtype(dtype).itemsize)
+                files[col, part] = f
+        rows = 0
+        for chunk in pd.read_csv(file_path, encoding='utf-8-sig', chunksize=chunksize):
+            chunk_clean = preprocess_survey(chunk)
+            chunk_clean['Response_Hash'] = response_hashes(chunk_clean)
+            chunk_clean['Content_Hash'] = content_hashes(chunk_clean)
+            chunk_clean[WAVE_COL] = np.int16(wave_index)
+            for col, kind in manifest['columns'].items():
+                for part, values in _archive_column_parts(chunk_clean, col, kind, dropped):
+                    np.ascontiguousarray(values).tofile(files[col, part])
+            rows += len(chunk_clean)
+    finally:
+        for f in files.values():
+            f.close()
+
+    manifest['waves'].append({'wave': wave or os.path.splitext(os.path.basename(file_path))[0],
+                              'source': file_path, 'digest': digest, 'start': start, 'rows': rows,
+                              'appended_at': datetime.now().isoformat(timespec='seconds')})
+    manifest['rows'] = start + rows
+    _save_archive_manifest(manifest, archive_dir)
+    for col, count in dropped.items():
+        if count:
+            print(f"⚠️ {col}: int8の整数で表せない回答 {count} 件を欠損として保存しました")
+    print(f"💾 アーカイブに追記: {file_path} → {archive_dir}（{rows} 件、累計 {manifest['rows']} 件）")
+    return manifest
+
+
+def open_archive(archive_dir, cols=None, start=0, stop=None):
+    """
+    アーカイブのcols（既定: 全ての列）の start〜stop 行目を、メモリマップのビューからなるフレームとして返す
+    データはコピーせず、列の値は参照されたときにディスクから読まれる（読み取り専用）
+    """
+    manifest = load_archive_manifest(archive_dir)
+    columns = manifest['columns']
+    cols = list(columns) if cols is None else list(cols)
+    unknown = [col for col in cols if col not in columns]
+    if unknown:
+        raise ValueError(f"アーカイブにない列です: {', '.join(unknown)}")
+    rows = manifest['rows']
+    stop = rows if stop is None else min(stop, rows)
+
+    def view(col, part, dtype):
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(_archive_part_path(archive_dir, col, part), dtype=dtype, mode='r', shape=(rows,))[start:stop]
+
+    data = {}
+    for col in cols:
+        kind = columns[col]
+        parts = {part: view(col, part, dtype) for part, dtype in ARCHIVE_PARTS[kind]}
+        if kind == 'category':
+            data[col] = pd.Categorical.from_codes(parts['codes'], categories=SURVEY_SCHEMA[col]['levels'],
+                                                  validate=False)
+        elif kind == 'Int8':
+            data[col] = pd.arrays.IntegerArray(parts['data'], parts['mask'])
+        else:
+            data[col] = parts['data']
+    return pd.DataFrame(data, columns=cols, copy=False)
+
+
+def iter_archive_chunks(archive_dir, chunksize=DEFAULT_CHUNKSIZE, cols=None, start=0):
+    """
+    アーカイブのcolsの列を、start行目からchunksize行ずつのビューとして返す
+    """
+    frame = open_archive(archive_dir, cols)
+    for offset in range(start, len(frame), chunksize):
+        yield frame.iloc[offset:offset + chunksize]
+
+
+# --- データ品質チェック（重複・ストレートライン・範囲外の回答） ---
+# 回答者を識別するキー（タイムスタンプ＋正規化した回答内容）のハッシュを、入力元（ファイル・アーカイブ）と行番号とともに
+# 永続的なハッシュ表（開番地法）に登録し、以前の回・同じ入力の前の行と同じ回答者を1行あたりO(1)の探索で検出して除外する。
+# 回答内容だけが同じ行は別の回答者でも起こりうるため、もう1つのハッシュ表で検出して報告に記録するだけで除外しない。
+# Q1-Q11の行列からはストレートライン（全項目が同じ回答）と範囲外の回答をまとめて判定し、該当する行も相関・回帰・描画の前に除外する。
+
+QUALITY_REPORT_PATH = 'quality_report.txt'
+# 回答者のハッシュ表の保存先（前処理キャッシュのディレクトリ内、全ての入力で共有）
+QUALITY_INDEX_PATH = 'respondent_index.npz'
+# ハッシュ表のキーの定義（変えた場合、以前のハッシュ表は使わずに作り直す）
+QUALITY_INDEX_KEYS = 'timestamp+content'
+# ハッシュ表の使用率の上限（超えたら大きさを2倍以上にして作り直す）と最小の大きさ
+QUALITY_INDEX_MAX_LOAD = 0.5
+QUALITY_INDEX_MIN_CAPACITY = 1 << 16
+# この数以上の項目に回答し、その全てが同じ値の行をストレートラインとみなす
+STRAIGHT_LINE_MIN_ITEMS = len(Q_COLS)
+
+
+def _row_hashes(columns):
+    """
+    列の辞書の行ごとのハッシュ（uint64、0は空きスロットを表すため使わない）
+    """
+    hashes = pd.util.hash_pandas_object(pd.DataFrame(columns), index=False).to_numpy()
+    return np.where(hashes == 0, np.uint64(1), hashes)
+
+
+def _content_columns(df_clean):
+    columns = {name: df_clean[name].array.codes for name in SURVEY_SCHEMA}
+    columns.update({col: df_clean[col].to_numpy(dtype=float, na_value=np.nan) for col in Q_COLS})
+    return columns
+
+
+def content_hashes(df_clean):
+    """
+    正規化した回答内容（各設問の水準・Q1-Q11の値）のハッシュ（列指向アーカイブでは追記時に求めたContent_Hash）
+    """
+    if 'Content_Hash' in df_clean.columns:
+        return df_clean['Content_Hash'].to_numpy(dtype=np.uint64)
+    return _row_hashes(_content_columns(df_clean))
+
+
+def response_hashes(df_clean):
+    """
+    回答者を識別するキー（タイムスタンプ＋正規化した回答内容）のハッシュ（列指向アーカイブでは追記時に求めたResponse_Hash）
+    タイムスタンプの列が無い場合は回答者を識別できないためNone（重複による除外は行わない）
+    """
+    if 'Response_Hash' in df_clean.columns:
+        return df_clean['Response_Hash'].to_numpy(dtype=np.uint64)
+    if TIMESTAMP_COL not in df_clean.columns:
+        return None
+    columns = {TIMESTAMP_COL: df_clean[TIMESTAMP_COL].astype(str).str.strip().to_numpy()}
+    columns.update(_content_columns(df_clean))
+    return _row_hashes(columns)
+
+
+def _hash_table(keys=None, sources=None, rows=None):
+    """
+    ハッシュ表（開番地法）: keys: ハッシュ（0=空き）、sources: 入力元の番号、rows: 入力元での行番号
+    """
+    if keys is None:
+        keys = np.zeros(QUALITY_INDEX_MIN_CAPACITY, dtype=np.uint64)
+        sources = np.full(len(keys), -1, dtype=np.int32)
+        rows = np.full(len(keys), -1, dtype=np.int64)
+    return SimpleNamespace(keys=keys, sources=sources, rows=rows, count=int(np.count_nonzero(keys)))
+
+
+def load_respondent_index(path):
+    """
+    回答者のハッシュ表（タイムスタンプ＋回答内容）と、回答内容だけのハッシュ表（content）を読み込む（無ければ空の表）
+    names: 入力元（絶対パス、2つの表で共通の番号）
+    """
+    index, content, names = _hash_table(), _hash_table(), []
+    if os.path.exists(path):
+        with np.load(path) as saved:
+            if 'key_columns' in saved.files and str(saved['key_columns']) == QUALITY_INDEX_KEYS:
+                index = _hash_table(saved['keys'], saved['sources'], saved['rows'])
+                content = _hash_table(saved['content_keys'], saved['content_sources'], saved['content_rows'])
+                names = [str(name) for name in saved['names']]
+            else:
+                print(f"⚠️ ハッシュ表のキーの定義が異なるため、新しく作り直します: {path}")
+    index.path = path
+    index.names = names
+    index.content = content
+    return index
+
+
+def save_respondent_index(index):
+    os.makedirs(os.path.dirname(index.path) or '.', exist_ok=True)
+    tmp_path = index.path + '.tmp.npz'
+    content = index.content
+    np.savez(tmp_path, keys=index.keys, sources=index.sources, rows=index.rows,
+             content_keys=content.keys, content_sources=content.sources, content_rows=content.rows,
+             names=np.array(index.names, dtype=str), key_columns=QUALITY_INDEX_KEYS)
+    os.replace(tmp_path, index.path)
+
+
+def _index_source(index, source):
+    """
+    入力元の番号（未登録なら追加する）
+    """
+    if source not in index.names:
+        index.names.append(source)
+    return index.names.index(source)
+
+
+def _probe(keys, hashes):
+    """
+    線形探索で、各ハッシュが登録されているスロット（未登録なら最初の空きスロット）を求める（全ての行を同時に1つずつ進める）
+    """
+    mask = len(keys) - 1
+    slots = (hashes & np.uint64(mask)).astype(np.int64)
+    pending = np.arange(len(hashes))
+    while len(pending):
+        found = keys[slots[pending]]
+        pending = pending[(found != 0) & (found != hashes[pending])]
+        slots[pending] = (slots[pending] + 1) & mask
+    return slots
+
+
+def index_lookup(index, hashes):
+    """
+    各ハッシュの登録先 (入力元の番号, 行番号) を返す（未登録は -1）
+    """
+    slots = _probe(index.keys, hashes)
+    present = index.keys[slots] == hashes
+    return np.where(present, index.sources[slots], -1), np.where(present, index.rows[slots], -1)
+
+
+def index_insert(index, hashes, sources, rows):
+    """
+    未登録で互いに異なるハッシュを登録する（使用率が上限を超える場合は先に大きな表に作り直す）
+    """
+    needed = index.count + len(hashes)
+    if needed > QUALITY_INDEX_MAX_LOAD * len(index.keys):
+        capacity = max(QUALITY_INDEX_MIN_CAPACITY, 1 << int(np.ceil(np.log2(needed / QUALITY_INDEX_MAX_LOAD))))
+        used = np.flatnonzero(index.keys)
+        old = (index.keys[used], index.sources[used], index.rows[used])
+        index.keys = np.zeros(capacity, dtype=np.uint64)
+        index.sources = np.full(capacity, -1, dtype=np.int32)
+        index.rows = np.full(capacity, -1, dtype=np.int64)
+        index.count = 0
+        index_insert(index, *old)
+    pending = np.arange(len(hashes))
+    while len(pending):
+        slots = _probe(index.keys, hashes[pending])
+        # 同じ空きスロットに複数の行が当たった場合は最初の行だけを入れ、残りは次の回で探し直す
+        _, first = np.unique(slots, return_index=True)
+        chosen = pending[first]
+        index.keys[slots[first]] = hashes[chosen]
+        index.sources[slots[first]] = sources[chosen]
+        index.rows[slots[first]] = rows[chosen]
+        pending = np.delete(pending, first)
+    index.count += len(hashes)
+
+
+def duplicate_sources(hashes, positions, index, source_id, insert=True):
+    """
+    各行が重複している入力元の番号（重複でなければ-1）を返す
+    同じチャンク内で2回目以降のハッシュ、別の入力元で登録済みのハッシュ、同じ入力元の前の行で登録済みのハッシュを重複とする
+    （同じ行番号で登録済みなら同じ行の再分析なので重複としない）。insert=Trueなら初出のハッシュを登録する
+    """
+    within = pd.Index(hashes).duplicated(keep='first')
+    first = np.flatnonzero(~within)
+    found_source, found_row = index_lookup(index, hashes[first])
+    duplicate = (found_source >= 0) & ((found_source != source_id) | (found_row < positions[first]))
+    result = np.where(within, source_id, -1).astype(np.int32)
+    result[first[duplicate]] = found_source[duplicate]
+    if insert:
+        new = first[found_source < 0]
+        index_insert(index, hashes[new], np.full(len(new), source_id, dtype=np.int32), positions[new])
+    return result
+
+
+def item_flags(df_clean):
+    """
+    Q1-Q11の行列から、範囲外の回答（Q_RANGEの整数以外、(行, 項目)）とストレートラインの行をまとめて判定する
+    """
+    items = df_clean[Q_COLS].to_numpy(dtype=float, na_value=np.nan)
+    answered = ~np.isnan(items)
+    low, high = Q_RANGE
+    invalid = answered & ((items < low) | (items > high) | (items != np.round(items)))
+    highest = np.where(answered, items, -np.inf).max(axis=1)
+    lowest = np.where(answered, items, np.inf).min(axis=1)
+    straight = (answered.sum(axis=1) >= STRAIGHT_LINE_MIN_ITEMS) & (highest == lowest)
+    return invalid, straight
+
+
+def new_quality_check(file_path, index, insert=True):
+    """
+    1つの入力の品質チェックの状態（ハッシュ表と、チャンクごとに加算する件数）を作る
+    """
+    return SimpleNamespace(index=index, source_id=_index_source(index, os.path.abspath(file_path)), insert=insert,
+                           rows=0, rejected=0, straight_line=0, out_of_range=0,
+                           invalid_items=np.zeros(len(Q_COLS), dtype=np.int64), duplicates={}, same_content={},
+                           identified=True, timestamps=None)
+
+
+def _timestamp_range(current, values):
+    """
+    タイムスタンプの範囲 (最初, 最後) をvaluesで広げる（解釈できない値は無視する）
+    """
+    values = pd.to_datetime(pd.Series(values), errors='coerce').dropna()
+    if values.empty:
+        return current
+    low, high = values.min(), values.max()
+    if current is not None:
+        low, high = min(low, current[0]), max(high, current[1])
+    return low, high
+
+
+def apply_quality_check(df_clean, check):
+    """
+    df_clean（またはそのチャンク、インデックスは入力元での行番号）の品質フラグを求めてcheckに加算し、
+    除外しない行だけを返す（除外する行が無ければコピーしない）
+    """
+    positions = df_clean.index.to_numpy()
+    hashes = response_hashes(df_clean)
+    if hashes is None:
+        check.identified = False
+        duplicate_of = np.full(len(df_clean), -1, dtype=np.int32)
+    else:
+        duplicate_of = duplicate_sources(hashes, positions, check.index, check.source_id, check.insert)
+    # 回答内容だけが同じ行（同じ回答者とは限らない）は数えるだけで除外しない
+    same_as = duplicate_sources(content_hashes(df_clean), positions, check.index.content, check.source_id,
+                                check.insert)
+    same_as[duplicate_of >= 0] = -1
+    invalid, straight = item_flags(df_clean)
+    out_of_range = invalid.any(axis=1)
+    rejected = (duplicate_of >= 0) | straight | out_of_range
+
+    check.rows += len(df_clean)
+    check.rejected += int(rejected.sum())
+    check.straight_line += int(straight.sum())
+    check.out_of_range += int(out_of_range.sum())
+    check.invalid_items += invalid.sum(axis=0)
+    for found, table in ((duplicate_of, check.duplicates), (same_as, check.same_content)):
+        sources, counts = np.unique(found[found >= 0], return_counts=True)
+        for source, count in zip(sources.tolist(), counts.tolist()):
+            table[source] = table.get(source, 0) + count
+    # 回答の日時の範囲を報告に残す（アーカイブには無い）
+    if TIMESTAMP_COL in df_clean.columns:
+        check.timestamps = _timestamp_range(check.timestamps, df_clean[TIMESTAMP_COL].to_numpy())
+    if not rejected.any():
+        return df_clean
+    return df_clean[~rejected]
+
+
+def write_quality_report(check, output_path=QUALITY_REPORT_PATH):
+    """
+    品質チェックの結果（除外の理由ごとの件数、回答内容だけが同じ行の件数（除外しない）、重複元の入力、
+    範囲外の回答の項目ごとの件数）を書き出す
+    """
+    names = check.index.names
+    own = check.duplicates.get(check.source_id, 0)
+    own_content = check.same_content.get(check.source_id, 0)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write("=" * 90 + "\n")
+        f.write("データ品質チェック（重複・ストレートライン・範囲外の回答）\n")
+        f.write("=" * 90 + "\n\n")
+        f.write(f"入力: {names[check.source_id]}\n")
+        f.write(f"回答数: {check.rows} 件\n")
+        if check.identified:
+            f.write(f"重複（以前の回・他の入力と同じ回答者）: {sum(check.duplicates.values()) - own} 件\n")
+            f.write(f"重複（同じ入力内）: {own} 件\n")
+        else:
+            f.write(f"重複: 判定しない（{TIMESTAMP_COL}の列が無く、回答者を識別できないため）\n")
+        f.write(f"ストレートライン（{STRAIGHT_LINE_MIN_ITEMS} 項目以上に回答し全て同じ値）: {check.straight_line} 件\n")
+        f.write(f"範囲外（Q1-Q11が {Q_RANGE[0]}-{Q_RANGE[1]} の整数以外）: {check.out_of_range} 件\n")
+        f.write(f"除外（重なりを除く）: {check.rejected} 件 → 分析対象: {check.rows - check.rejected} 件\n")
+        f.write(f"参考: 回答内容だけが同じ行（同じ回答者とは限らないため除外しない）: "
+                f"他の入力 {sum(check.same_content.values()) - own_content} 件 / 同じ入力内 {own_content} 件\n")
+        if check.timestamps is not None:
+            f.write(f"回答のタイムスタンプ: {check.timestamps[0]} 〜 {check.timestamps[1]}\n")
+        f.write(f"回答者のハッシュ表: {check.index.path}（{check.index.count} 件、入力元 {len(names)} 件）\n\n")
+
+        sources = sorted((set(check.duplicates) | set(check.same_content)) - {check.source_id},
+                         key=lambda source: (-check.duplicates.get(source, 0), -check.same_content.get(source, 0)))
+        if sources:
+            f.write("-" * 90 + "\n")
+            f.write(f"{'他の入力':<60}{'重複（除外）':>12}{'同じ内容':>10}\n")
+            f.write("-" * 90 + "\n")
+            for source in sources:
+                f.write(f"{names[source]:<60}{check.duplicates.get(source, 0):>12}"
+                        f"{check.same_content.get(source, 0):>10}\n")
+            f.write("\n")
+
+        f.write("-" * 90 + "\n")
+        f.write(f"{'項目':<10}{'範囲外の回答':>12}\n")
+        f.write("-" * 90 + "\n")
+        for col, count in zip(Q_COLS, check.invalid_items):
+            f.write(f"{col:<10}{int(count):>12}\n")
+        f.write("-" * 90 + "\n")
+    print(f"✅ 品質チェックの結果を保存: {output_path}（除外 {check.rejected} / {check.rows} 件）")
+
+
+def quality_index_path(file_path, cache_dir, quality_index=None):
+    """
+    回答者のハッシュ表の保存先（既定: 前処理キャッシュのディレクトリ内、キャッシュを使わない場合も CACHE_DIR）
+    列指向アーカイブはそれ自体が全ての回を含むため、既定ではアーカイブのディレクトリ内に別のハッシュ表を持つ
+    """
+    if quality_index:
+        return quality_index
+    if is_archive(file_path):
+        return os.path.join(file_path, QUALITY_INDEX_PATH)
+    return os.path.join(cache_dir or CACHE_DIR, QUALITY_INDEX_PATH)
+
+
+# --- インクリメンタル回帰 ---
+# 回答は追記されていく前提で、処理済みのバイト位置までのクロス積を保存しておき、
+# 次回は追記された行だけを読み込んでクロス積に加える（既存の行は読み直さない）
+# 列指向アーカイブの場合は、バイト位置の代わりに処理済みの行数を保存する
+
+def _source_size(file_path):
+    """
+    入力の大きさ（CSVはバイト数、列指向アーカイブは行数）
+    """
+    if is_archive(file_path):
+        return load_archive_manifest(file_path)['rows']
+    return os.path.getsize(file_path)
+
+
+def _tail_digest(file_path, offset, size=4096):
+    """
+    先頭行（ヘッダ）と、offset直前のsizeバイトのハッシュ（追記のみで書き換えられていないことの確認用）
+    列指向アーカイブの場合は、offset行目までに含まれる回の目録のハッシュ
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if is_archive(file_path):
+        manifest = load_archive_manifest(file_path)
+        waves = [entry for entry in manifest['waves'] if entry['start'] < offset]
+        h.update(json.dumps([manifest['fingerprint'], waves], sort_keys=True).encode('utf-8'))
+        return h.hexdigest()
+    with open(file_path, 'rb') as f:
+        h.update(f.readline())
+        f.seek(max(offset - size, 0))
+        h.update(f.read(min(offset, size)))
+    return h.hexdigest()
+
+
+def _load_regression_state(state_path, file_path):
+    """
+    保存済みのクロス積を読み込む。前処理の定義が変わった・ファイルが追記以外で変更された場合はNone
+    """
+    if not os.path.exists(state_path):
+        return None
+    with np.load(state_path) as saved:
+        state = {key: saved[key] for key in saved.files}
+    offset = int(state['offset'])
+    if (str(state['fingerprint']) != _preprocess_fingerprint()
+            or _source_size(file_path) < offset
+            or str(state['tail_digest']) != _tail_digest(file_path, offset)):
+        return None
+    state['yty'] = float(state['yty'])
+    state['n'] = float(state['n'])
+    return state
+
+
+def _save_regression_state(state, state_path, file_path):
+    tmp_path = state_path + '.tmp.npz'
+    np.savez(tmp_path, XtX=state['XtX'], Xty=state['Xty'], yty=state['yty'], n=state['n'],
+             offset=state['offset'], fingerprint=_preprocess_fingerprint(),
+             tail_digest=_tail_digest(file_path, int(state['offset'])))
+    os.replace(tmp_path, state_path)
+
+
+def _read_rows_from(file_path, offset, end, chunksize):
+    """
+    file_pathのoffset〜endバイトの行をチャンク単位で読み込む（offset=0の場合はヘッダから）
+    """
+    if offset == 0:
+        yield from pd.read_csv(file_path, encoding='utf-8-sig', chunksize=chunksize)
+        return
+    if offset >= end:
+        return
+    with open(file_path, 'rb') as f:
+        columns = pd.read_csv(io.BytesIO(f.readline()), encoding='utf-8-sig', nrows=0).columns
+        f.seek(offset)
+        new_bytes = f.read(end - offset)
+    yield from pd.read_csv(io.BytesIO(new_bytes), header=None, names=columns, encoding='utf-8',
+                           chunksize=chunksize)
+
+
+def update_regression_state(file_path, state_dir=CACHE_DIR, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    前回保存したクロス積に、それ以降に追記された行のクロス積だけを加えて保存し、更新後のクロス積を返す。
+    保存がない・前処理の定義が変わった・ファイルが追記以外で変更された場合は最初から作り直す。
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    state_path = os.path.join(state_dir, f"{stem}.ols-state.npz")
+    end = _source_size(file_path)
+
+    state = _load_regression_state(state_path, file_path)
+    if state is None:
+        k = len(REGRESSION_VARS) + 1
+        state = {'XtX': np.zeros((k, k)), 'Xty': np.zeros(k), 'yty': 0.0, 'n': 0.0, 'offset': 0}
+        print("ℹ️ 保存済みのクロス積が無い（または無効な）ため、全行から作成します")
+
+    n_before = state['n']
+    if is_archive(file_path):
+        chunks = iter_archive_chunks(file_path, chunksize, REGRESSION_COLS, int(state['offset']))
+    else:
+        chunks = (preprocess_survey(chunk)
+                  for chunk in _read_rows_from(file_path, int(state['offset']), end, chunksize))
+    for chunk_clean in chunks:
+        cross = regression_crossproducts(chunk_clean)
+        for key in ('XtX', 'Xty', 'yty', 'n'):
+            state[key] = state[key] + cross[key]
+    state['offset'] = end
+    print(f"🔄 追加された回答: {int(state['n'] - n_before)} 件（累計 {int(state['n'])} 件）")
+
+    os.makedirs(state_dir, exist_ok=True)
+    _save_regression_state(state, state_path, file_path)
+    return state
+
+
+def update_regression(file_path, state_dir=CACHE_DIR, chunksize=DEFAULT_CHUNKSIZE,
+                      output_path='regression_results.txt'):
+    """
+    インクリメンタル回帰モード: 追記された行だけでクロス積を更新し、regression_results.txtを書き出す
+    （入力全体の読み込み・前処理・ダミー変数化は行わず、前回のバイトオフセット以降の行だけを読む）
+    """
+    print(f"🚀 回帰分析を更新します（インクリメンタル）: {file_path}")
+    print("\n📊 --- 重回帰分析結果（ダミー変数化） ---")
+    state = update_regression_state(file_path, state_dir, chunksize)
+    model = fit_ols_from_state(state)
+    write_regression_results(model, REGRESSION_VARS, int(state['n']), output_path)
+    return model
+
+
+# --- 再標本化による推論（ブートストラップ信頼区間・並べ替え検定） ---
+# 回答は少数の水準しか取らないため、再標本は行インデックスではなく度数表のセル度数として生成する。
+# ブートストラップ: 観測セル度数に比例した多項分布、並べ替え: 周辺度数を固定した分割表（多変量超幾何分布）。
+# 回帰の並べ替え検定はyを丸ごと並べ替えるため、各係数のp値は「全ての係数が0」という全体の帰無仮説の下でのp値
+# （個々の係数の検定ではない。係数ごとのFreedman–Lane法は残差の並べ替えが度数表のセル単位にならないため行わない）。
+# どちらも回答数nではなくセル数に比例する計算量で、多数の再標本をまとめて行列演算で処理する。
+
+def _spearman_from_tables(tables):
+    """
+    分割表の束 (B, xの水準, yの水準) からスピアマンの順位相関係数 (B,) を求める
+    """
+    tables = np.asarray(tables, dtype=float)
+    cx = tables.sum(axis=2)
+    cy = tables.sum(axis=1)
+    n = cx.sum(axis=1)
+    ax = np.cumsum(cx, axis=1) - (cx - 1) / 2 - ((n + 1) / 2)[:, None]
+    ay = np.cumsum(cy, axis=1) - (cy - 1) / 2 - ((n + 1) / 2)[:, None]
+    sxy = np.einsum('bg,bgh,bh->b', ax, tables, ay)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return sxy / np.sqrt((cx * ax ** 2).sum(axis=1) * (cy * ay ** 2).sum(axis=1))
+
+
+def _random_tables(row_margins, col_margins, size, rng):
+    """
+    周辺度数を固定した分割表を、行の一様な並べ替えと同じ分布でsize個生成する
+    （多変量超幾何分布を1変量の超幾何分布の逐次抽出で生成し、各抽出はsize個分まとめて行う）
+    """
+    row_margins = np.asarray(row_margins, dtype=np.int64)
+    col_margins = np.asarray(col_margins, dtype=np.int64)
+    tables = np.zeros((size, len(row_margins), len(col_margins)), dtype=np.int64)
+    remaining = np.tile(col_margins, (size, 1))
+    for i, row_total in enumerate(row_margins[:-1]):
+        if row_total == 0:
+            continue
+        left = np.full(size, row_total)
+        rest = remaining.sum(axis=1)
+        for j in range(len(col_margins) - 1):
+            rest = rest - remaining[:, j]
+            drawn = rng.hypergeometric(remaining[:, j], rest, left)
+            tables[:, i, j] = drawn
+            left = left - drawn
+        tables[:, i, -1] = left
+        remaining -= tables[:, i]
+    tables[:, -1] = remaining
+    return tables
+
+
+def _ols_from_tables(tables, X, y_levels):
+    """
+    (Xのパターン, yの水準) の度数表の束 (B, K, G) から係数とt値 (B, p) を求める（非正則な再標本はNaN）
+    """
+    tables = np.asarray(tables, dtype=float)
+    row_counts = tables.sum(axis=2)
+    n = row_counts.sum(axis=1)
+    XtX = np.einsum('bk,ki,kj->bij', row_counts, X, X)
+    Xty = np.einsum('bkh,ki,h->bi', tables, X, y_levels)
+    yty = np.einsum('bkh,h->b', tables, y_levels ** 2)
+
+    params = np.full(Xty.shape, np.nan)
+    tvalues = np.full(Xty.shape, np.nan)
+    full_rank = np.linalg.matrix_rank(XtX) == X.shape[1]
+    if full_rank.any():
+        XtX_inv = np.linalg.inv(XtX[full_rank])
+        beta = np.einsum('bij,bj->bi', XtX_inv, Xty[full_rank])
+        scale = (yty[full_rank] - (beta * Xty[full_rank]).sum(axis=1)) / (n[full_rank] - X.shape[1])
+        params[full_rank] = beta
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tvalues[full_rank] = beta / np.sqrt(np.diagonal(XtX_inv, axis1=1, axis2=2) * scale[:, None])
+    return params, tvalues
+
+
+def build_resampling_problem(df_freq, var_names):
+    """
+    再標本化に必要な最小限の度数表を作る
+    - corr_tables: 各要因について (要因の水準, 虫嫌いスコアの水準) の分割表（ペアごとに欠損除外）
+    - reg_table: 回帰の (ダミー変数のパターン, 虫嫌いスコアの水準) の度数表と、そのデザイン行列
+    """
+    corr_tables = {}
+    for label, col in FACTORS.items():
+        pair = df_freq.dropna(subset=[col, 'Insect_Dislike_Score'])
+        corr_tables[label] = pair.pivot_table(index=col, columns='Insect_Dislike_Score', values='Count',
+                                              aggfunc='sum', fill_value=0).to_numpy(dtype=np.int64)
+
+    df_reg = build_dummy_frame(df_freq).dropna()
+    cells = df_reg.groupby(list(var_names) + ['Insect_Dislike_Score'], as_index=False)['Count'].sum()
+    x_patterns, x_code = np.unique(cells[list(var_names)].to_numpy(dtype=float), axis=0, return_inverse=True)
+    y_levels, y_code = np.unique(cells['Insect_Dislike_Score'].to_numpy(dtype=float), return_inverse=True)
+    reg_table = np.zeros((len(x_patterns), len(y_levels)), dtype=np.int64)
+    np.add.at(reg_table, (x_code.ravel(), y_code.ravel()), cells['Count'].to_numpy(dtype=np.int64))
+
+    return {
+        'corr_tables': corr_tables,
+        'reg_table': reg_table,
+        'X': np.column_stack([np.ones(len(x_patterns)), x_patterns]),
+        'y_levels': y_levels,
+        'var_names': ['const'] + list(var_names),
+    }
+
+
+def _resampling_batch(problem, n_draws, seed):
+    """
+    n_draws個分のブートストラップ・並べ替え再標本の統計量をまとめて計算する（プロセスプールの1タスク）
+    """
+    rng = np.random.default_rng(seed)
+    result = {'corr_boot': [], 'corr_perm': []}
+    for table in problem['corr_tables'].values():
+        n = table.sum()
+        boot = rng.multinomial(n, table.ravel() / n, size=n_draws).reshape((n_draws,) + table.shape)
+        result['corr_boot'].append(_spearman_from_tables(boot))
+        perm = _random_tables(table.sum(axis=1), table.sum(axis=0), n_draws, rng)
+        result['corr_perm'].append(_spearman_from_tables(perm))
+    result['corr_boot'] = np.column_stack(result['corr_boot'])
+    result['corr_perm'] = np.column_stack(result['corr_perm'])
+
+    table = problem['reg_table']
+    n = table.sum()
+    boot = rng.multinomial(n, table.ravel() / n, size=n_draws).reshape((n_draws,) + table.shape)
+    result['coef_boot'] = _ols_from_tables(boot, problem['X'], problem['y_levels'])[0]
+    perm = _random_tables(table.sum(axis=1), table.sum(axis=0), n_draws, rng)
+    result['coef_perm_t'] = _ols_from_tables(perm, problem['X'], problem['y_levels'])[1]
+    return result
+
+
+def resampling_inference(df_freq, var_names, n_resamples=10000, seed=0, batch_size=500, workers=None):
+    """
+    相関係数と回帰係数のブートストラップ95%信頼区間（パーセンタイル法）と並べ替え検定のp値を求める。
+    回帰係数のp値（coefのp_perm_global）はyを丸ごと並べ替えた、全体の帰無仮説の下でのp値。
+    再標本はbatch_size個ずつのバッチに分けてプロセスプールで並列に計算する。
+    バッチごとの乱数はseedから派生させるため、並列数に関係なく結果は再現可能。
+    戻り値: SimpleNamespace(corr=DataFrame[ラベル], coef=DataFrame[変数名], n_resamples, seed)
+    """
+    problem = build_resampling_problem(df_freq, var_names)
+    sizes = [min(batch_size, n_resamples - start) for start in range(0, n_resamples, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if workers is None:
+        workers = min(len(sizes), os.cpu_count() or 1)
+
+    if workers <= 1:
+        batches = [_resampling_batch(problem, size, s) for size, s in zip(sizes, seeds)]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            batches = list(executor.map(_resampling_batch, [problem] * len(sizes), sizes, seeds))
+    draws = {key: np.concatenate([b[key] for b in batches]) for key in batches[0]}
+
+    # 観測値（並べ替え検定の基準）
+    labels = list(problem['corr_tables'])
+    corr_obs = np.array([_spearman_from_tables(t[None])[0] for t in problem['corr_tables'].values()])
+    _, t_obs = _ols_from_tables(problem['reg_table'][None], problem['X'], problem['y_levels'])
+
+    def perm_pvalue(perm, observed):
+        # (|T*| >= |T| の再標本数 + 1) / (有効な再標本数 + 1)
+        valid = ~np.isnan(perm)
+        exceed = (np.abs(perm) >= np.abs(observed) - 1e-12) & valid
+        return (exceed.sum(axis=0) + 1) / (valid.sum(axis=0) + 1)
+
+    corr_ci = np.nanpercentile(draws['corr_boot'], [2.5, 97.5], axis=0)
+    coef_ci = np.nanpercentile(draws['coef_boot'], [2.5, 97.5], axis=0)
+    return SimpleNamespace(
+        corr=pd.DataFrame({'ci_low': corr_ci[0], 'ci_high': corr_ci[1],
+                           'p_perm': perm_pvalue(draws['corr_perm'], corr_obs)}, index=labels),
+        coef=pd.DataFrame({'ci_low': coef_ci[0], 'ci_high': coef_ci[1],
+                           'p_perm_global': perm_pvalue(draws['coef_perm_t'], t_obs[0])},
+                          index=problem['var_names']),
+        n_resamples=n_resamples,
+        seed=seed,
+    )
+
+
+def run_resampling(df_freq, n_resamples, seed, workers=None):
+    """
+    n_resamples > 0 の場合に resampling_inference を実行する（0の場合はNone）
+    """
+    if not n_resamples:
+        return None
+    print(f"🔁 ブートストラップ・並べ替え検定を実行中（B={n_resamples}, seed={seed}）")
+    return resampling_inference(df_freq, REGRESSION_VARS, n_resamples, seed, workers=workers)
+
+
+def write_correlation_results(corr_results, n_total, output_path='correlation_results.txt', resampling=None):
+    """
+    相関分析結果 [(ラベル, r, p), ...] をファイルに出力する
+    resampling: resampling_inferenceの結果（指定するとブートストラップ信頼区間と並べ替え検定のp値を併記）
+    """
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write("=" * 60 + "\n")
+        f.write("各環境要因と虫嫌いスコアの相関分析結果\n")
+        f.write("=" * 60 + "\n\n")
+        f.write("分析方法: スピアマンの順位相関係数\n")
+        f.write(f"サンプルサイズ: N={n_total}\n")
+        if resampling is not None:
+            f.write(f"信頼区間: ブートストラップ95%CI（パーセンタイル法, B={resampling.n_resamples}, seed={resampling.seed}）\n")
+            f.write(f"p_perm: 並べ替え検定のp値（B={resampling.n_resamples}）\n")
+        f.write("\n")
+        f.write("-" * 60 + "\n")
+
+        for label, corr, p_value in corr_results:
+            sig = significance_marker(p_value)
+            result_line = f"{label:20s}: r={corr:6.3f}, p={p_value:.4f} {sig}"
+            if resampling is not None:
+                ci_low, ci_high, p_perm = resampling.corr.loc[label, ['ci_low', 'ci_high', 'p_perm']]
+                result_line += f"{'':{5 - len(sig)}s}95%CI=[{ci_low:6.3f}, {ci_high:6.3f}], p_perm={p_perm:.4f}"
+            result_line += "\n"
+            print(result_line.strip())
+            f.write(result_line)
+
+        f.write("-" * 60 + "\n\n")
+        f.write("【有意水準】\n")
+        f.write("  *** : p < 0.001 (非常に有意)\n")
+        f.write("  **  : p < 0.01  (有意)\n")
+        f.write("  *   : p < 0.05  (やや有意)\n")
+        f.write("  n.s.: p >= 0.05 (有意でない)\n\n")
+        f.write("【解釈】\n")
+        f.write("  負の相関(r < 0): その要因が強いほど虫嫌いが減る傾向\n")
+        f.write("  正の相関(r > 0): その要因が強いほど虫嫌いが増える傾向\n")
+        f.write("  |r| > 0.5: 強い相関\n")
+        f.write("  0.3 < |r| <= 0.5: 中程度の相関\n")
+        f.write("  0.1 < |r| <= 0.3: 弱い相関\n")
+        f.write("  |r| <= 0.1: ほぼ相関なし\n")
+
+    print("\n有意水準: *** p<0.001, ** p<0.01, * p<0.05, n.s. 有意でない")
+    print("負の相関 → その要因が強いほど虫嫌いが減る")
+    print("正の相関 → その要因が強いほど虫嫌いが増える")
+    print(f"✅ 相関分析結果を保存: {output_path}")
+
+
+def write_regression_results(model, var_names, n_obs, output_path='regression_results.txt', resampling=None):
+    """
+    回帰分析結果をファイルに出力する（statsmodelsの結果・fit_ols_from_crossproductsの結果の両方に対応）
+    resampling: resampling_inferenceの結果（指定するとブートストラップ信頼区間と並べ替え検定のp値を併記）
+    """
+    width = 70 if resampling is None else 104
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write("=" * width + "\n")
+        f.write("重回帰分析結果（ダミー変数化）\n")
+        f.write("=" * width + "\n\n")
+        f.write(f"サンプルサイズ: N={n_obs}\n")
+        f.write(f"決定係数 R²: {model.rsquared:.4f}\n")
+        f.write(f"調整済みR²: {model.rsquared_adj:.4f}\n")
+        f.write(f"F統計量: {model.fvalue:.4f}, p値: {model.f_pvalue:.4f}\n")
+        if resampling is not None:
+            f.write(f"信頼区間: ブートストラップ95%CI（パーセンタイル法, B={resampling.n_resamples}, seed={resampling.seed}）\n")
+            f.write(f"p(全体並べ替え): yを並べ替えた並べ替え検定のp値（t値に基づく, B={resampling.n_resamples}）。\n")
+            f.write("  全ての係数が0という全体の帰無仮説の下でのp値で、他の変数を調整した個々の係数の検定ではない\n")
+        f.write("\n")
+        f.write("-" * width + "\n")
+        f.write("回帰係数（非標準化）\n")
+        f.write("-" * width + "\n")
+        header = f"{'変数名':<30s} {'係数':>10s} {'標準誤差':>10s} {'p値':>10s} {'有意性':>8s}"
+        if resampling is not None:
+            header += f" {'95%CI下限':>10s} {'95%CI上限':>10s} {'p(全体並べ替え)':>10s}"
+        f.write(header + "\n")
+        f.write("-" * width + "\n")
+
+        for var in var_names:
+            coef = model.params[var]
+            se = model.bse[var]
+            pval = model.pvalues[var]
+            sig = significance_marker(pval)
+            row = f"{var:<30s} {coef:>10.3f} {se:>10.3f} {pval:>10.4f} {sig:>8s}"
+            if resampling is not None:
+                ci_low, ci_high, p_perm = resampling.coef.loc[var, ['ci_low', 'ci_high', 'p_perm_global']]
+                row += f" {ci_low:>10.3f} {ci_high:>10.3f} {p_perm:>10.4f}"
+            f.write(row + "\n")
+            print(f"{var:<30s}: coef={coef:7.3f}, p={pval:.4f} {sig}")
+
+        f.write("-" * width + "\n\n")
+        f.write("【解釈ガイド】\n")
+        f.write("- 参照カテゴリ: 自然接触=Rarely, 読書=Rarely, 虫本=Rarely, 地域=Rural\n")
+        f.write("- 係数が負 → 虫嫌いスコアが減少\n")
+        f.write("- 係数が正 → 虫嫌いスコアが増加\n")
+        f.write("- 例: InsectBook_Frequent = -15.0 の場合、\n")
+        f.write("  「虫本をよく読んだ人は、ほとんど読まなかった人より\n")
+        f.write("   虫嫌いスコアが15点低い（他の条件が同じ場合）」\n")
+
+    print(f"\n✅ 回帰分析結果を保存: {output_path}")
+
+
+# --- 可視化 ---
+# 各図は「描画関数 + 描画に必要な最小限のデータ」の仕様として組み立て、render_figuresで描画する
+
+# 箱ひげ図（図1-1〜1-5）: questionはSURVEY_SCHEMAの設問、orderは表示する数値コードの順序
+BOXPLOT_FIGURES = [
+    {'name': '図1-1', 'question': 'Nature_Contact', 'order': [3, 2, 1],
+     'xlabel': 'Outdoor Play Frequency in Childhood', 'output_path': '1-1_boxplot_nature_vs_score.png'},
+    {'name': '図1-2', 'question': 'Reading_Habit', 'order': [3, 2, 1],
+     'xlabel': 'Reading Frequency', 'output_path': '1-2_boxplot_reading_vs_score.png'},
+    {'name': '図1-3', 'question': 'Insect_Book_Reading', 'order': [3, 2, 1],
+     'xlabel': 'Insect-Related Book Reading Frequency', 'output_path': '1-3_boxplot_insect_book_vs_score.png'},
+    {'name': '図1-4', 'question': 'Gender', 'order': [0, 1],
+     'xlabel': 'Gender', 'output_path': '1-4_boxplot_gender_vs_score.png'},
+    {'name': '図1-5', 'question': 'Residence_Area', 'order': [1, 2, 3, 4],
+     'xlabel': 'Residence Area Type', 'output_path': '1-5_boxplot_residence_vs_score.png',
+     'figsize': (12, 6), 'rotation': 15},
+]
+
+# 散布図（図S1〜S5）
+SCATTER_FIGURES = [
+    {'name': '図S1', 'col': 'Nature_Contact_Num',
+     'xlabel': 'Nature Contact Frequency (1=Rarely, 3=Frequent)',
+     'xticks': [1, 2, 3], 'xticklabels': ['Rarely', 'Sometimes', 'Frequent'],
+     'output_path': 'S1_scatter_nature_vs_score.png'},
+    {'name': '図S2', 'col': 'Reading_Habit_Num',
+     'xlabel': 'Reading Habit Frequency (1=Rarely, 3=Frequent)',
+     'xticks': [1, 2, 3], 'xticklabels': ['Rarely', 'Sometimes', 'Frequent'],
+     'output_path': 'S2_scatter_reading_vs_score.png'},
+    {'name': '図S3', 'col': 'Insect_Book_Reading_Num',
+     'xlabel': 'Insect Book Reading Frequency (1=Rarely, 3=Frequent)',
+     'xticks': [1, 2, 3], 'xticklabels': ['Rarely', 'Sometimes', 'Frequent'],
+     'output_path': 'S3_scatter_insect_book_vs_score.png'},
+    {'name': '図S4', 'col': 'Gender_Num',
+     'xlabel': 'Gender (0=Male, 1=Female)',
+     'xticks': [0, 1], 'xticklabels': ['Male', 'Female'],
+     'output_path': 'S4_scatter_gender_vs_score.png'},
+    {'name': '図S5', 'col': 'Residence_Area_Num',
+     'xlabel': 'Residence Area (1=Rural, 4=Urban)',
+     'xticks': [1, 2, 3, 4], 'xticklabels': ['Rural', 'Regional', 'Suburban', 'Urban'],
+     'output_path': 'S5_scatter_residence_vs_score.png'},
+]
+
+# 回答数がこれ以上なら、散布図・箱ひげ図を度数表から描画する（集計描画モード、analyze_and_visualizeのaggregate_figures）
+AGGREGATE_FIGURES_MIN_ROWS = 100_000
+
+# 相関行列のヒートマップ（図2）のラベル（ANALYSIS_COLSと同じ順序）
+CORR_LABELS = ['Insect Dislike', 'Nature Contact', 'Reading Habit', 'Insect Book', 'Gender (F=1)', 'Urban Residence']
+
+# 全ての図番号（コマンドラインの --figures で指定できる図）
+FIGURE_NAMES = ([fig['name'] for fig in SCATTER_FIGURES] + ['図3']
+                + [fig['name'] for fig in BOXPLOT_FIGURES] + ['図2'])
+
+
+def _render_style():
+    """
+    描画のフォント・スタイルの設定
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    # フォント設定（Times New Romanに固定）
+    plt.rcParams['font.family'] = 'Times New Roman'
+    sns.set(style="whitegrid", font='Times New Roman')
+
+
+def _init_render_worker():
+    """
+    描画プロセスの初期化（ProcessPoolExecutorのinitializer専用）: Aggバックエンドとフォント・スタイルの設定
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    _render_style()
+
+
+@contextmanager
+def render_context():
+    """
+    現在のプロセスで描画する間だけAggバックエンドと描画のスタイルを使い、終了後に呼び出し元の設定に戻す
+    """
+    import matplotlib
+    import matplotlib.pyplot as plt
+    backend = matplotlib.get_backend()
+    with plt.rc_context():
+        plt.switch_backend('Agg')
+        _render_style()
+        try:
+            yield
+        finally:
+            plt.switch_backend(backend)
+
+
+def _timed_render(func, kwargs):
+    """
+    描画プロセス内で1枚の図を描画・保存し、その計測値を返す
+    """
+    start = _start_measure()
+    func(**kwargs)
+    return _finish_measure(start)
+
+
+def render_figures(specs, workers=None, run_log=None):
+    """
+    図の仕様 [(図番号, 描画関数, 引数dict), ...] を描画する。
+    workersが2以上ならプロセスプール（Aggバックエンド）で並列に描画し、1以下なら現在のプロセスで順に描画する。
+    run_logを渡すと図ごとの計測値（'figure:図番号'）を記録する（詳しく計測する図は現在のプロセスで描画）。
+    """
+    if workers is None:
+        workers = min(len(specs), os.cpu_count() or 1)
+
+    profiled = run_log['profile_stage'] if run_log is not None else None
+    pooled = [spec for spec in specs if f'figure:{spec[0]}' != profiled] if workers > 1 else []
+    if pooled:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker) as executor:
+            futures = {executor.submit(_timed_render, func, kwargs): (name, kwargs['output_path'])
+                       for name, func, kwargs in pooled}
+            for future in as_completed(futures):
+                name, output_path = futures[future]
+                metrics = future.result()
+                if run_log is not None:
+                    run_log['records'].append({'kind': 'stage', 'stage': f'figure:{name}', **metrics,
+                                               'worker': 'process', 'output': output_path})
+                print(f"✅ {name} 保存完了: {output_path}")
+
+    serial = [spec for spec in specs if workers <= 1 or f'figure:{spec[0]}' == profiled]
+    if serial:
+        with render_context():
+            for name, func, kwargs in serial:
+                with log_stage(run_log, f'figure:{name}', output=kwargs['output_path']):
+                    func(**kwargs)
+                print(f"✅ {name} 保存完了: {kwargs['output_path']}")
+
+
+def render_boxplot(data, col, order, xlabel, output_path, figsize=(10, 6), rotation=0):
+    """
+    箱ひげ図を描画する（data: 英語ラベルのcolと虫嫌いスコアの2列のみ、order: 表示するラベルの順序）
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    fig = plt.figure(figsize=figsize)
+    sns.boxplot(x=col, y='Insect_Dislike_Score', data=data, order=order, palette='viridis')
+    plt.ylabel('Insect Dislike Score', fontsize=12, fontname='Times New Roman')
+    plt.xlabel(xlabel, fontsize=12, fontname='Times New Roman')
+    plt.xticks(rotation=rotation, fontname='Times New Roman')
+    plt.yticks(fontname='Times New Roman')
+    plt.tight_layout()
+    fig.savefig(output_path)
+    plt.close(fig)
+
+
+def render_boxplot_from_stats(box_stats, xlabel, output_path, figsize=(10, 6), rotation=0):
+    """
+    事前に計算した箱ひげ図の統計量（bxp形式のdictのリスト）から箱ひげ図を描画する
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    fig = plt.figure(figsize=figsize)
+    ax = plt.gca()
+    ax.bxp(box_stats, patch_artist=True, medianprops={'color': 'black'})
+    for patch, color in zip(ax.patches, sns.color_palette('viridis', len(box_stats))):
+        patch.set_facecolor(color)
+    plt.ylabel('Insect Dislike Score', fontsize=12, fontname='Times New Roman')
+    plt.xlabel(xlabel, fontsize=12, fontname='Times New Roman')
+    plt.xticks(rotation=rotation, fontname='Times New Roman')
+    plt.yticks(fontname='Times New Roman')
+    plt.tight_layout()
+    fig.savefig(output_path)
+    plt.close(fig)
+
+
+def _add_correlation_annotation(corr, p_val):
+    """
+    散布図の左上に相関係数とp値を表示する
+    """
+    import matplotlib.pyplot as plt
+    plt.text(0.05, 0.95, f'r = {corr:.3f}, p = {p_val:.4f}',
+             transform=plt.gca().transAxes, fontsize=12, verticalalignment='top',
+             bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5),
+             fontname='Times New Roman')
+
+
+def render_regplot(data, col, corr, p_val, xlabel, xticks, xticklabels, output_path):
+    """
+    散布図と回帰直線を描画する（data: colと虫嫌いスコアの2列のみ、欠損除去済み）
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    fig = plt.figure(figsize=(10, 6))
+    sns.regplot(x=col, y='Insect_Dislike_Score', data=data,
+                scatter_kws={'alpha':0.6, 's':50}, line_kws={'color':'red'})
+    _add_correlation_annotation(corr, p_val)
+    plt.ylabel('Insect Dislike Score', fontsize=12, fontname='Times New Roman')
+    plt.xlabel(xlabel, fontsize=12, fontname='Times New Roman')
+    plt.xticks(xticks, xticklabels, fontname='Times New Roman')
+    plt.yticks(fontname='Times New Roman')
+    plt.tight_layout()
+    fig.savefig(output_path, dpi=300)
+    plt.close(fig)
+
+
+def _weighted_line(x, y, w):
+    """
+    度数で重み付けした回帰直線の (切片, 傾き) を和 Σw, Σwx, Σwy, Σwx², Σwxy だけから求める
+    （全回答で求めたOLSの直線と同じ）
+    """
+    sw, sx, sy = w.sum(), w @ x, w @ y
+    slope = (sw * (w @ (x * y)) - sx * sy) / (sw * (w @ (x * x)) - sx * sx)
+    return (sy - slope * sx) / sw, slope
+
+
+def render_scatter_from_counts(data, col, corr, p_val, xlabel, xticks, xticklabels, output_path,
+                               line, level_counts):
+    """
+    度数表から散布図を描画する（点=水準とスコアの組み合わせ、点の大きさ=回答数）
+    line: 回帰直線の (切片, 傾き)、level_counts: 水準 → 回答数（目盛りのラベルに表示）
+    描画する点の数は組み合わせの数で頭打ちになるため、描画時間と画像サイズは回答数によらない
+    """
+    import matplotlib.pyplot as plt
+    x = data[col].values
+    y = data['Insect_Dislike_Score'].values
+    w = data['Count'].values
+
+    fig = plt.figure(figsize=(10, 6))
+    plt.scatter(x, y, s=200 * np.sqrt(w / w.max()), alpha=0.6)
+    intercept, slope = line
+    x_line = np.linspace(x.min(), x.max(), 100)
+    plt.plot(x_line, intercept + slope * x_line, color='red')
+    _add_correlation_annotation(corr, p_val)
+    plt.ylabel('Insect Dislike Score', fontsize=12, fontname='Times New Roman')
+    plt.xlabel(xlabel, fontsize=12, fontname='Times New Roman')
+    plt.xticks(xticks, [f"{label}\n(n={int(level_counts.get(tick, 0)):,})" for tick, label in zip(xticks, xticklabels)],
+               fontname='Times New Roman')
+    plt.yticks(fontname='Times New Roman')
+    plt.tight_layout()
+    fig.savefig(output_path, dpi=300)
+    plt.close(fig)
+
+
+def render_heatmap(corr_mat, output_path):
+    """
+    図2: 相関行列のヒートマップ
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    fig = plt.figure(figsize=(11, 9))
+    sns.heatmap(corr_mat, annot=True, cmap='coolwarm', vmin=-1, vmax=1, fmt='.2f', square=True,
+                cbar_kws={'label': 'Spearman Correlation'}, annot_kws={'fontname': 'Times New Roman'})
+    # plt.title('Correlation Matrix (Spearman Rank Correlation)', fontsize=14, fontname='Times New Roman')
+    plt.xticks(fontname='Times New Roman')
+    plt.yticks(fontname='Times New Roman')
+    plt.tight_layout()
+    fig.savefig(output_path)
+    plt.close(fig)
+
+
+# 図3の回帰係数の表示順（グループごとに整理）と表示ラベル
+COEFFICIENT_ORDER = [
+    'Nature_Sometimes', 'Nature_Frequent',
+    'Reading_Sometimes', 'Reading_Frequent',
+    'InsectBook_Sometimes', 'InsectBook_Frequent',
+    'Area_Regional', 'Area_Suburban', 'Area_Urban'
+]
+
+COEFFICIENT_LABELS = {
+    'Nature_Sometimes': 'Nature Contact\n(Sometimes)',
+    'Nature_Frequent': 'Nature Contact\n(Frequent)',
+    'Reading_Sometimes': 'Reading Habit\n(Sometimes)',
+    'Reading_Frequent': 'Reading Habit\n(Frequent)',
+    'InsectBook_Sometimes': 'Insect Book\n(Sometimes)',
+    'InsectBook_Frequent': 'Insect Book\n(Frequent)',
+    'Area_Regional': 'Residence\n(Regional City)',
+    'Area_Suburban': 'Residence\n(Suburban)',
+    'Area_Urban': 'Residence\n(Urban)'
+}
+
+
+def build_coefficient_table(model, var_names):
+    """
+    図3用に回帰係数を表示順に並べた表を作成する
+    """
+    # 順序に従ってデータを整理
+    coef_data = []
+    for var in COEFFICIENT_ORDER:
+        if var in var_names:
+            coef_data.append({
+                'variable': COEFFICIENT_LABELS.get(var, var),
+                'coefficient': model.params[var],
+                'pvalue': model.pvalues[var],
+                'significant': model.pvalues[var] < 0.05
+            })
+
+    return pd.DataFrame(coef_data)
+
+
+def render_regression_coefficients(coef_df, output_path):
+    """
+    図3: 回帰係数の棒グラフ（影響度の可視化）
+    """
+    import matplotlib.pyplot as plt
+    fig = plt.figure(figsize=(12, 8))
+
+    # 色付け：有意なものと有意でないものを区別
+    colors = ['#440154' if sig else '#CCCCCC' for sig in coef_df['significant']]
+
+    # 横棒グラフ（下から上へ表示するため、順序を反転）
+    y_positions = range(len(coef_df))
+    plt.barh(y_positions, coef_df['coefficient'], color=colors)
+    plt.yticks(y_positions, coef_df['variable'], fontname='Times New Roman', fontsize=10)
+    plt.axvline(0, color='black', linewidth=1.2)
+
+    # 有意性のマーカーを追加
+    for i, (idx, row) in enumerate(coef_df.iterrows()):
+        if row['pvalue'] < 0.001:
+            marker = '***'
+        elif row['pvalue'] < 0.01:
+            marker = '**'
+        elif row['pvalue'] < 0.05:
+            marker = '*'
+        else:
+            marker = ''
+
+        if marker:
+            x_pos = row['coefficient'] + (1.5 if row['coefficient'] > 0 else -1.5)
+            plt.text(x_pos, i, marker, ha='center', va='center',
+                    fontsize=12, fontweight='bold')
+
+    plt.xlabel('Coefficient (negative = reduces insect dislike)', fontsize=12, fontname='Times New Roman')
+    plt.xticks(fontname='Times New Roman')
+
+    # 凡例を追加
+    from matplotlib.patches import Patch
+    legend_elements = [
+        Patch(facecolor='#440154', label='Significant (p < 0.05)'),
+        Patch(facecolor='#CCCCCC', label='Not significant')
+    ]
+    plt.legend(handles=legend_elements, loc='lower right', prop={'family': 'Times New Roman'})
+
+    plt.tight_layout()
+    fig.savefig(output_path, dpi=300)
+    plt.close(fig)
+
+
+def _boxplot_stats_from_counts(values, counts):
+    """
+    度数付きデータからmatplotlibのbxp用の統計量を求める
+    （四分位点はnp.percentileの線形補間、ひげは1.5×IQRでmatplotlibのboxplotと同じ定義）
+    """
+    order = np.argsort(values)
+    values = np.asarray(values, dtype=float)[order]
+    counts = np.asarray(counts)[order]
+    cum = np.cumsum(counts)
+    n = cum[-1]
+
+    def value_at(pos):
+        return values[np.searchsorted(cum, pos, side='right')]
+
+    def percentile(q):
+        pos = q * (n - 1)
+        lo, hi = int(np.floor(pos)), int(np.ceil(pos))
+        return value_at(lo) + (value_at(hi) - value_at(lo)) * (pos - lo)
+
+    q1, med, q3 = percentile(0.25), percentile(0.5), percentile(0.75)
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    return {
+        'med': med, 'q1': q1, 'q3': q3,
+        'whislo': inside.min(), 'whishi': inside.max(),
+        'mean': (values * counts).sum() / n,
+        'fliers': values[(values < inside.min()) | (values > inside.max())],
+    }
+
+
+def heatmap_matrix(corr):
+    """
+    図2用に相関行列のラベルを英語表記に置き換える
+    """
+    return corr.r.set_axis(CORR_LABELS, axis=0).set_axis(CORR_LABELS, axis=1)
+
+
+def _selected(name, figures):
+    """
+    図番号nameを描画するか（figures=Noneなら全て）
+    """
+    return figures is None or name in figures
+
+
+def build_figure_specs(df_clean, corr, coef_df, run_log=None, figures=None, output_dir='.'):
+    """
+    生データ（df_clean）から各図の描画仕様を作成する。各図には必要な列だけを切り出して渡す。
+    run_logを渡すと散布図の欠損除去の前後の行数を記録する。figuresを指定するとその図番号の図だけを作る。
+    図はoutput_dirに保存する。
+    """
+    specs = []
+    # 描画に時間のかかる高解像度（dpi=300）の図から投入する
+    for fig in SCATTER_FIGURES:
+        if not _selected(fig['name'], figures):
+            continue
+        col = fig['col']
+        r, p_val = corr.r.loc[col, 'Insect_Dislike_Score'], corr.p.loc[col, 'Insect_Dislike_Score']
+        data = df_clean[[col, 'Insect_Dislike_Score']].dropna().astype(float)
+        log_rows(run_log, f"figure:{fig['name']}.dropna", len(df_clean), len(data))
+        specs.append((fig['name'], render_regplot, {
+            'data': data, 'col': col,
+            'corr': r, 'p_val': p_val, 'xlabel': fig['xlabel'],
+            'xticks': fig['xticks'], 'xticklabels': fig['xticklabels'], 'output_path': os.path.join(output_dir, fig['output_path'])}))
+    if _selected('図3', figures):
+        specs.append(('図3', render_regression_coefficients,
+                      {'coef_df': coef_df,
+                       'output_path': os.path.join(output_dir, '3_regression_coefficients.png')}))
+    for fig in BOXPLOT_FIGURES:
+        if not _selected(fig['name'], figures):
+            continue
+        name = fig['question']
+        question = SURVEY_SCHEMA[name]
+        # 数値コード → 英語ラベルはCategoricalの符号として一括で変換
+        data = pd.DataFrame({
+            name: pd.Categorical.from_codes(_level_index(df_clean[f'{name}_Num'], question),
+                                            categories=question['labels']),
+            'Insect_Dislike_Score': df_clean['Insect_Dislike_Score'].to_numpy(dtype=float),
+        })
+        order = [question['labels'][question['codes'].index(code)] for code in fig['order']]
+        specs.append((fig['name'], render_boxplot, {
+            'data': data, 'col': name, 'order': order,
+            'xlabel': fig['xlabel'], 'output_path': os.path.join(output_dir, fig['output_path']),
+            'figsize': fig.get('figsize', (10, 6)), 'rotation': fig.get('rotation', 0)}))
+    if _selected('図2', figures):
+        specs.append(('図2', render_heatmap,
+                      {'corr_mat': heatmap_matrix(corr),
+                       'output_path': os.path.join(output_dir, '2_heatmap_correlation.png')}))
+    return specs
+
+
+def build_figure_specs_from_counts(df_freq, corr, coef_df, figures=None, output_dir='.'):
+    """
+    度数表（df_freq）から各図の描画仕様を作成する（ストリーミングモード・集計描画モード用、
+    figures・output_dirはbuild_figure_specsと同じ）。散布図には水準×スコアごとの度数・水準ごとの回答数・回帰直線を、
+    箱ひげ図には四分位点などの統計量だけを渡すため、描画の手間は回答数ではなく水準の数で決まる。
+    """
+    specs = []
+    for fig in SCATTER_FIGURES:
+        if not _selected(fig['name'], figures):
+            continue
+        col = fig['col']
+        r, p_val = corr.r.loc[col, 'Insect_Dislike_Score'], corr.p.loc[col, 'Insect_Dislike_Score']
+        data = (df_freq.dropna(subset=[col, 'Insect_Dislike_Score'])
+                .groupby([col, 'Insect_Dislike_Score'], as_index=False)['Count'].sum().astype(float))
+        line = _weighted_line(data[col].to_numpy(), data['Insect_Dislike_Score'].to_numpy(), data['Count'].to_numpy())
+        specs.append((fig['name'], render_scatter_from_counts, {
+            'data': data, 'col': col, 'corr': r, 'p_val': p_val, 'xlabel': fig['xlabel'],
+            'xticks': fig['xticks'], 'xticklabels': fig['xticklabels'], 'output_path': os.path.join(output_dir, fig['output_path']),
+            'line': line, 'level_counts': data.groupby(col)['Count'].sum().to_dict()}))
+    if _selected('図3', figures):
+        specs.append(('図3', render_regression_coefficients,
+                      {'coef_df': coef_df,
+                       'output_path': os.path.join(output_dir, '3_regression_coefficients.png')}))
+    for fig in BOXPLOT_FIGURES:
+        if not _selected(fig['name'], figures):
+            continue
+        question = SURVEY_SCHEMA[fig['question']]
+        col = f"{fig['question']}_Num"
+        counts = df_freq.groupby([col, 'Insect_Dislike_Score'])['Count'].sum()
+        box_stats = []
+        for code in fig['order']:
+            if code not in counts.index.get_level_values(0):
+                continue
+            sub = counts.loc[code]
+            if sub.sum() == 0:
+                continue
+            box = _boxplot_stats_from_counts(sub.index.to_numpy(dtype=float), sub.to_numpy())
+            box['label'] = question['labels'][question['codes'].index(code)]
+            box_stats.append(box)
+        specs.append((fig['name'], render_boxplot_from_stats, {
+            'box_stats': box_stats, 'xlabel': fig['xlabel'], 'output_path': os.path.join(output_dir, fig['output_path']),
+            'figsize': fig.get('figsize', (10, 6)), 'rotation': fig.get('rotation', 0)}))
+    if _selected('図2', figures):
+        specs.append(('図2', render_heatmap,
+                      {'corr_mat': heatmap_matrix(corr),
+                       'output_path': os.path.join(output_dir, '2_heatmap_correlation.png')}))
+    return specs
+
+
+# --- 層別分析（グループごとの相関・回帰） ---
+# group_byの列（性別・居住地域・調査の回など）の組み合わせごとに相関係数と回帰係数を求める。
+# データ全体を1回だけgroupbyして「グループ列＋分析列」の度数表を作り、以降はその度数表だけで計算するため、
+# グループ数が増えてもデータ全体の走査は1回のまま（回帰のクロス積も全グループ分を一括で求める）。
+
+STRATIFIED_RESULTS_PATH = 'stratified_results.csv'
+
+STRATIFIED_FIGURES = [
+    {'name': '図G1', 'analysis': 'correlation', 'xlabel': "Spearman's r with Insect Dislike",
+     'output_path': 'G1_stratified_correlation.png'},
+    {'name': '図G2', 'analysis': 'regression', 'xlabel': 'Coefficient (negative = reduces insect dislike)',
+     'output_path': 'G2_stratified_coefficients.png'},
+]
+STRATIFIED_FIGURE_NAMES = [fig['name'] for fig in STRATIFIED_FIGURES]
+STRATIFIED_ARTIFACTS = ['stratified'] + STRATIFIED_FIGURE_NAMES
+
+
+def _group_keys(group_by):
+    """
+    group_by（列名またはそのリスト、None）を列名のリストにする
+    """
+    if not group_by:
+        return []
+    return [group_by] if isinstance(group_by, str) else list(group_by)
+
+
+def _stratified_cols(keys):
+    """
+    層別分析の度数表の列（グループ列＋ANALYSIS_COLS、重複は除く）
+    """
+    return keys + [col for col in ANALYSIS_COLS if col not in keys]
+
+
+def stratified_frequency_table(df, keys):
+    """
+    グループ列とANALYSIS_COLSの組み合わせごとの度数表を作る（dfが度数表ならCountを合算、グループ列が欠損の行は除く）
+    """
+    cols = _stratified_cols(keys)
+    if 'Count' in df.columns:
+        table = df.groupby(cols, dropna=False, observed=True)['Count'].sum().reset_index()
+    else:
+        table = frequency_table(df, cols)
+    return table.dropna(subset=keys).reset_index(drop=True)
+
+
+def grouped_crossproducts(df_freq, codes, n_groups):
+    """
+    度数表の各行のグループ番号codesごとに、ダミー変数デザインのクロス積 X'X, X'y, y'y, n を一括で求める
+    （dummy_crossproductsのグループ版: 各配列の先頭の次元がグループ）
+    """
+    df_dummy = build_dummy_frame(df_freq)
+    valid = df_dummy['Insect_Dislike_Score'].notna().to_numpy()
+    w = df_dummy['Count'].to_numpy(dtype=float)[valid]
+    y = df_dummy['Insect_Dislike_Score'].to_numpy(dtype=float)[valid]
+    X = np.column_stack([np.ones(valid.sum()), df_dummy.loc[valid, REGRESSION_VARS].to_numpy(dtype=float)])
+    g = codes[valid]
+    k = X.shape[1]
+    wX = X * w[:, None]
+    XtX = np.zeros((n_groups, k, k))
+    np.add.at(XtX, g, wX[:, :, None] * X[:, None, :])
+    Xty = np.zeros((n_groups, k))
+    np.add.at(Xty, g, wX * y[:, None])
+    return {'XtX': XtX, 'Xty': Xty, 'yty': np.bincount(g, w * y * y, minlength=n_groups),
+            'n': np.bincount(g, w, minlength=n_groups)}
+
+
+def fit_group_ols(XtX, Xty, yty, n, names):
+    """
+    1グループ分のクロス積からOLSを求める。グループ内で変動のないダミー変数（全て0、または全て1で定数項と重なる。
+    例: 居住地域で層別した場合の居住地域ダミー）はモデルから除く（除いた変数の係数は結果に含まれない）。
+    自由度が残らない・X'Xが特異な場合はNoneを返す。
+    """
+    totals = XtX[0, 1:]  # 各ダミー変数が1の件数
+    keep = np.concatenate([[True], (totals > 0) & (totals < n)])
+    if n <= keep.sum():
+        return None
+    try:
+        return fit_ols_from_crossproducts(XtX[np.ix_(keep, keep)], Xty[keep], yty, n,
+                                          [name for name, kept in zip(names, keep) if kept])
+    except np.linalg.LinAlgError:
+        return None
+
+
+def stratified_analysis(df, group_by):
+    """
+    group_byの列の組み合わせ（グループ）ごとに相関係数と回帰係数を求め、縦持ちの表にする
+    df: df_clean または度数表（Count付き）。列はグループ列＋summarize_surveyと同じ列（推定できない値は欠損）
+    """
+    keys = _group_keys(group_by)
+    df_freq = stratified_frequency_table(df, keys)
+    grouped = df_freq.groupby(keys, observed=True, sort=True)
+    state = grouped_crossproducts(df_freq, grouped.ngroup().to_numpy(), grouped.ngroups)
+    names = ['const'] + REGRESSION_VARS
+    rows = []
+    for g, (values, group) in enumerate(grouped):
+        corr = spearman_matrix(group, ANALYSIS_COLS, group['Count'].to_numpy(dtype=float))
+        model = fit_group_ols(state['XtX'][g], state['Xty'][g], state['yty'][g], state['n'][g], names)
+        rows += [dict(zip(keys, values), **row) for row in _summary_rows(corr, model, state['n'][g])]
+    return pd.DataFrame(rows, columns=keys + SUMMARY_COLUMNS)
+
+
+def _key_label(key, value):
+    """
+    グループ列の値を図のタイトル用の英語表記にする（スキーマの設問は英語ラベル、それ以外は値そのもの）
+    """
+    name = key[:-len('_Num')] if key.endswith('_Num') else key
+    question = SURVEY_SCHEMA.get(name)
+    if question is not None:
+        candidates = question['codes'] if key.endswith('_Num') else question['levels']
+        if value in candidates:
+            return question['labels'][candidates.index(value)]
+    return f"{key}={value}"
+
+
+def render_stratified_facets(data, xlabel, output_path):
+    """
+    図G1・G2: グループごとのパネルに係数の横棒グラフを並べたファセット図（図3と同じ配色・有意性の区別）
+    data: 'group', 'label', 'estimate', 'p', 'n' の縦持ちの表（ラベルの並びは全グループ共通）
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Patch
+    groups = list(dict.fromkeys(data['group']))
+    labels = list(dict.fromkeys(data['label']))
+    ncols = min(len(groups), 3)
+    nrows = -(-len(groups) // ncols)
+    fig, axes = plt.subplots(nrows, ncols, figsize=(4.5 * ncols, 0.45 * len(labels) * nrows + 1.5),
+                             sharex=True, sharey=True, squeeze=False)
+
+    y_positions = np.arange(len(labels))
+    for ax, group in zip(axes.flat, groups):
+        panel = data[data['group'] == group].set_index('label').reindex(labels)
+        colors = ['#440154' if p < 0.05 else '#CCCCCC' for p in panel['p']]
+        ax.barh(y_positions, panel['estimate'].fillna(0), color=colors)
+        ax.axvline(0, color='black', linewidth=1.2)
+        ax.set_title(f"{group} (n={int(panel['n'].max())})", fontsize=11, fontname='Times New Roman')
+    for ax in axes[:, 0]:
+        ax.set_yticks(y_positions, labels, fontname='Times New Roman', fontsize=9)
+    # 最下段の空きパネルは隠し、その上のパネルに目盛りのラベルを表示する
+    for i in range(len(groups), nrows * ncols):
+        axes.flat[i].set_visible(False)
+        axes.flat[i - ncols].tick_params(labelbottom=True)
+
+    fig.supxlabel(xlabel, fontsize=12, fontname='Times New Roman')
+    legend_elements = [
+        Patch(facecolor='#440154', label='Significant (p < 0.05)'),
+        Patch(facecolor='#CCCCCC', label='Not significant')
+    ]
+    fig.legend(handles=legend_elements, loc='upper center', ncol=2, prop={'family': 'Times New Roman'})
+    fig.tight_layout(rect=(0, 0, 1, 0.93))
+    fig.savefig(output_path, dpi=300)
+    plt.close(fig)
+
+
+def build_stratified_figure_specs(table, group_by, figures=None, output_dir='.'):
+    """
+    層別分析の表（stratified_analysis）から図G1（相関係数）・図G2（回帰係数）の描画仕様を作成する
+    """
+    keys = _group_keys(group_by)
+    groups = [' / '.join(_key_label(key, value) for key, value in zip(keys, values))
+              for values in table[keys].itertuples(index=False)]
+    table = table.assign(group=groups)
+    display = {
+        'correlation': (list(FACTORS.values()), dict(zip(ANALYSIS_COLS, CORR_LABELS))),
+        'regression': (COEFFICIENT_ORDER, COEFFICIENT_LABELS),
+    }
+    specs = []
+    for fig in STRATIFIED_FIGURES:
+        if not _selected(fig['name'], figures):
+            continue
+        order, labels = display[fig['analysis']]
+        rows = table[(table['analysis'] == fig['analysis']) & table['variable'].isin(order)]
+        # 変数の表示順に並べ替え（グループの順序は保つ）
+        rows = rows.assign(rank=rows['variable'].map(order.index)).sort_values(['rank'], kind='stable')
+        data = rows.assign(label=rows['variable'].map(labels))[['group', 'label', 'estimate', 'p', 'n']]
+        specs.append((fig['name'], render_stratified_facets,
+                      {'data': data, 'xlabel': fig['xlabel'],
+                       'output_path': os.path.join(output_dir, fig['output_path'])}))
+    return specs
+
+
+# --- 仕様曲線（説明変数の全組み合わせの回帰） ---
+# 説明変数のグループ（設問ごとのダミー変数）の全ての組み合わせについて回帰を求め、注目する係数の分布を示す。
+# クロス積 X'X, X'y は全変数について1回だけ求め、各モデルはその部分行列を解くだけで得る。
+# 同じ変数数のモデルはまとめて一括で解く（行列の逆行列をバッチで計算）。
+
+# 組み合わせる説明変数のグループ（設問名 → {コード: ダミー変数名}）。主分析に含めない性別も女性ダミーとして加える
+SPECIFICATION_GROUPS = {name: dict(question['dummies']) for name, question in SURVEY_SCHEMA.items()
+                        if question['dummies']}
+SPECIFICATION_GROUPS['Gender'] = {1: 'Gender_Female'}
+SPECIFICATION_VARS = [var for dummies in SPECIFICATION_GROUPS.values() for var in dummies.values()]
+SPECIFICATION_COLS = ['Insect_Dislike_Score'] + [f'{name}_Num' for name in SPECIFICATION_GROUPS]
+SPECIFICATION_GROUP_LABELS = {'Nature_Contact': 'Nature Contact', 'Reading_Habit': 'Reading Habit',
+                              'Insect_Book_Reading': 'Insect Book', 'Residence_Area': 'Residence',
+                              'Gender': 'Gender (Female)'}
+
+# 仕様曲線で注目する係数の既定値
+SPECIFICATION_FOCAL = 'InsectBook_Frequent'
+SPECIFICATION_RESULTS_PATH = 'specification_results.csv'
+SPECIFICATION_FIGURE = {'name': '図4', 'output_path': '4_specification_curve.png'}
+SPECIFICATION_ARTIFACTS = ['specification', SPECIFICATION_FIGURE['name']]
+
+
+def specification_crossproducts(df):
+    """
+    全ての説明変数（SPECIFICATION_VARS、定数項付き）のクロス積を求める（度数表の場合はCountで重み付け）
+    """
+    return dummy_crossproducts(build_dummy_frame(df, SPECIFICATION_GROUPS).dropna(), SPECIFICATION_VARS)
+
+
+def specification_subsets():
+    """
+    説明変数のグループの空でない全ての組み合わせ（グループ数の少ない順）
+    """
+    from itertools import combinations
+    names = list(SPECIFICATION_GROUPS)
+    return [subset for size in range(1, len(names) + 1) for subset in combinations(names, size)]
+
+
+def fit_ols_batch(XtX, Xty, yty, n):
+    """
+    同じ変数数の複数のモデルのOLSを一括で求める（XtX: (モデル, k, k), Xty: (モデル, k)、先頭列は定数項）
+    戻り値: (係数, 標準誤差, p値, R², 自由度調整済みR²)。X'Xが特異なモデルの値は欠損
+    """
+    from scipy import special
+    m, k = Xty.shape
+    XtX_inv = np.full((m, k, k), np.nan)
+    singular = np.linalg.matrix_rank(XtX) < k
+    if (~singular).any():
+        XtX_inv[~singular] = np.linalg.inv(XtX[~singular])
+    params = np.einsum('mij,mj->mi', XtX_inv, Xty)
+    ssr = yty - np.einsum('mi,mi->m', params, Xty)
+    df_resid = n - k
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bse = np.sqrt(np.diagonal(XtX_inv, axis1=1, axis2=2) * (ssr / df_resid)[:, None])
+        pvalues = 2 * special.stdtr(df_resid, -np.abs(params / bse))
+        centered_tss = yty - Xty[:, 0] ** 2 / n
+        rsquared = 1 - ssr / centered_tss
+    return params, bse, pvalues, rsquared, 1 - (1 - rsquared) * (n - 1) / df_resid
+
+
+def specification_analysis(df):
+    """
+    説明変数のグループの全ての組み合わせについて回帰を求め、縦持ちの表（モデル×係数）にする
+    列: specification（グループ名を'+'で連結）, groups, baseline（主分析と同じ組み合わせか）, variable, estimate, se, p,
+        rsquared, rsquared_adj, n
+    """
+    state = specification_crossproducts(df)
+    columns = {name: [1 + SPECIFICATION_VARS.index(var) for var in dummies.values()]
+               for name, dummies in SPECIFICATION_GROUPS.items()}
+    baseline = {name for name, question in SURVEY_SCHEMA.items() if question['dummies']}
+
+    # 列の添字（定数項＋選んだグループの列）の数ごとにモデルをまとめる
+    batches = {}
+    for subset in specification_subsets():
+        index = [0] + [col for name in subset for col in columns[name]]
+        batches.setdefault(len(index), []).append((subset, index))
+
+    rows = []
+    for k, models in batches.items():
+        index = np.array([index for _, index in models])
+        fits = fit_ols_batch(state['XtX'][index[:, :, None], index[:, None, :]], state['Xty'][index],
+                             state['yty'], state['n'])
+        for i, (subset, model_index) in enumerate(models):
+            params, bse, pvalues, rsquared, rsquared_adj = (values[i] for values in fits)
+            for j, col in enumerate(model_index[1:], start=1):
+                rows.append({'specification': '+'.join(subset), 'groups': len(subset),
+                             'baseline': set(subset) == baseline, 'variable': SPECIFICATION_VARS[col - 1],
+                             'estimate': params[j], 'se': bse[j], 'p': pvalues[j],
+                             'rsquared': rsquared, 'rsquared_adj': rsquared_adj, 'n': state['n']})
+    return pd.DataFrame(rows)
+
+
+def render_specification_curve(data, groups, ylabel, output_path):
+    """
+    図4: 仕様曲線（上段: 注目する係数を小さい順に並べ95%信頼区間を付けたもの、下段: 各モデルに含めたグループ）
+    data: モデルごとの 'estimate', 'se', 'p', 'baseline' と、グループ名ごとの含めたか（bool）の列
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Patch
+    fig, (ax_top, ax_bottom) = plt.subplots(2, 1, figsize=(12, 8), sharex=True,
+                                            gridspec_kw={'height_ratios': [3, 2]})
+    x = np.arange(len(data))
+    colors = ['#440154' if p < 0.05 else '#CCCCCC' for p in data['p']]
+
+    # 上段: 係数と95%信頼区間（主分析と同じモデルは赤枠で示す）
+    ax_top.vlines(x, data['estimate'] - 1.96 * data['se'], data['estimate'] + 1.96 * data['se'],
+                  color='gray', linewidth=1)
+    ax_top.scatter(x, data['estimate'], c=colors, s=40, zorder=3,
+                   edgecolors=['red' if base else 'none' for base in data['baseline']], linewidths=1.5)
+    lower, upper = (data['estimate'] - 1.96 * data['se']).min(), (data['estimate'] + 1.96 * data['se']).max()
+    if lower < 0 < upper:
+        ax_top.axhline(0, color='black', linewidth=1.2)
+    ax_top.set_ylabel(ylabel, fontsize=12, fontname='Times New Roman')
+
+    # 下段: 各モデルに含めた説明変数のグループ
+    for i, name in enumerate(groups):
+        included = data[name].to_numpy(dtype=bool)
+        ax_bottom.scatter(x[included], np.full(included.sum(), i), marker='s', s=25, color='#440154')
+    ax_bottom.set_yticks(range(len(groups)), [SPECIFICATION_GROUP_LABELS.get(name, name) for name in groups],
+                         fontname='Times New Roman', fontsize=10)
+    ax_bottom.set_ylim(-0.5, len(groups) - 0.5)
+    ax_bottom.set_xlabel('Specification (sorted by coefficient)', fontsize=12, fontname='Times New Roman')
+    ax_bottom.set_xticks([])
+
+    legend_elements = [
+        Patch(facecolor='#440154', label='Significant (p < 0.05)'),
+        Patch(facecolor='#CCCCCC', label='Not significant'),
+        Patch(facecolor='white', edgecolor='red', label='Main model'),
+    ]
+    ax_top.legend(handles=legend_elements, loc='best', prop={'family': 'Times New Roman'})
+    plt.tight_layout()
+    fig.savefig(output_path, dpi=300)
+    plt.close(fig)
+
+
+def build_specification_figure_specs(table, focal=SPECIFICATION_FOCAL, figures=None, output_dir='.'):
+    """
+    仕様曲線の表（specification_analysis）から図4の描画仕様を作成する（focal: 注目する係数）
+    """
+    if not _selected(SPECIFICATION_FIGURE['name'], figures):
+        return []
+    data = table[table['variable'] == focal].sort_values('estimate', kind='stable').reset_index(drop=True)
+    groups = list(SPECIFICATION_GROUPS)
+    included = data['specification'].str.split('+')
+    for name in groups:
+        data[name] = included.map(lambda subset: name in subset)
+    ylabel = f"Coefficient: {COEFFICIENT_LABELS.get(focal, focal).replace(chr(10), ' ')}"
+    return [(SPECIFICATION_FIGURE['name'], render_specification_curve,
+             {'data': data[['estimate', 'se', 'p', 'baseline'] + groups], 'groups': groups, 'ylabel': ylabel,
+              'output_path': os.path.join(output_dir, SPECIFICATION_FIGURE['output_path'])})]
+
+
+# --- 尺度の項目分析（Q1-Q11） ---
+# 虫嫌いスコア（Q1-Q11の合計）の信頼性と因子構造を確認する。項目の和 Σx と交差積 X'X（k×k）だけを
+# 回答のチャンクごとに累積し、項目間相関・α係数・項目削除時のα・項目-合計相関・主因子法は全てそこから求める。
+# 項目を1つ除いた統計量も共通の和の差し引きで求めるため、項目ごとに再計算しない。
+
+ITEM_ANALYSIS_PATH = 'item_analysis_results.txt'
+
+
+def item_crossproducts(df, cols=Q_COLS, chunksize=65536, state=None):
+    """
+    全項目に回答した行（リストワイズ除外）の件数n、項目の和S、交差積C = X'X を求める
+    state（前回の戻り値）を渡すとそれに加算する（ストリーミングモードでチャンクごとに累積する場合）
+    """
+    items = df[cols]
+    complete = items.notna().all(axis=1).to_numpy()
+    # 整数の回答はint8の行列のまま保持し、チャンクごとにfloatに変換して積を求める
+    dtype = np.int8 if all(str(items[col].dtype) == 'Int8' for col in cols) else float
+    X = items[complete].to_numpy(dtype=dtype)
+    k = len(cols)
+    if state is None:
+        state = {'n': 0.0, 'S': np.zeros(k), 'C': np.zeros((k, k))}
+    for start in range(0, len(X), chunksize):
+        block = X[start:start + chunksize].astype(float)
+        state['S'] += block.sum(axis=0)
+        state['C'] += block.T @ block
+    state['n'] += float(len(X))
+    return state
+
+
+def item_crossproducts_streaming(file_path, chunksize=DEFAULT_CHUNKSIZE, cols=Q_COLS, quality=None):
+    """
+    CSVをチャンク単位で前処理し、項目のクロス積を累積する（メモリ使用量はchunksizeで頭打ち）
+    quality: 品質チェックの状態（登録済みのハッシュ表を参照するだけの insert=False のもの）。除外する行を含めない
+    """
+    state = None
+    for chunk_clean in read_survey_chunks(file_path, chunksize, None if quality else cols):
+        if quality is not None:
+            chunk_clean = apply_quality_check(chunk_clean, quality)
+        state = item_crossproducts(chunk_clean, cols, state=state)
+    return state
+
+
+def principal_axis_factoring(R, n_factors=1, max_iter=200, tol=1e-6):
+    """
+    相関行列Rから主因子法で因子負荷量を求める（共通性の初期値は重相関係数の2乗、回転なし）
+    戻り値: (因子負荷量 (項目, 因子), 共通性, 反復回数, 収束したか)
+    """
+    try:
+        communality = 1 - 1 / np.diag(np.linalg.inv(R))
+    except np.linalg.LinAlgError:
+        communality = np.abs(R - np.eye(len(R))).max(axis=1)
+    for iteration in range(1, max_iter + 1):
+        reduced = R.copy()
+        np.fill_diagonal(reduced, communality)
+        eigvals, eigvecs = np.linalg.eigh(reduced)
+        top = np.argsort(eigvals)[::-1][:n_factors]
+        loadings = eigvecs[:, top] * np.sqrt(np.clip(eigvals[top], 0, None))
+        updated = (loadings ** 2).sum(axis=1)
+        converged = np.abs(updated - communality).max() < tol
+        communality = updated
+        if converged:
+            break
+    # 因子の符号は負荷量の和が正になる向きに揃える
+    loadings *= np.where(loadings.sum(axis=0) < 0, -1, 1)
+    return loadings, communality, iteration, converged
+
+
+def item_statistics(state, cols=Q_COLS, n_factors=1):
+    """
+    項目のクロス積（item_crossproducts）から項目分析の統計量を求める
+    戻り値: SimpleNamespace(n, alpha, alpha_standardized, corr（項目間相関）, items（項目ごとの表）, eigenvalues,
+                           loadings, explained, iterations, converged)
+    """
+    n, S, C = state['n'], state['S'], state['C']
+    k = len(cols)
+    mean = S / n
+    cov = (C - n * np.outer(mean, mean)) / (n - 1)
+    var = np.diag(cov)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / np.sqrt(np.outer(var, var))
+        total_var = cov.sum()
+        alpha = k / (k - 1) * (1 - var.sum() / total_var)
+        mean_r = (corr.sum() - k) / (k * (k - 1))
+        alpha_standardized = k * mean_r / (1 + (k - 1) * mean_r)
+
+        # 項目iを除いた合計: 分散 = 全体 - 2Σ_j cov[i, j] + var[i]、項目との共分散 = Σ_j cov[i, j] - var[i]
+        row_cov = cov.sum(axis=1)
+        rest_var = total_var - 2 * row_cov + var
+        alpha_if_deleted = (k - 1) / (k - 2) * (1 - (var.sum() - var) / rest_var)
+        item_total = row_cov / np.sqrt(var * total_var)
+        item_rest = (row_cov - var) / np.sqrt(var * rest_var)
+
+    eigenvalues = np.sort(np.linalg.eigvalsh(corr))[::-1]
+    loadings, communality, iterations, converged = principal_axis_factoring(corr, n_factors)
+    items = pd.DataFrame({'mean': mean, 'sd': np.sqrt(var), 'item_total_r': item_total, 'item_rest_r': item_rest,
+                          'alpha_if_deleted': alpha_if_deleted, 'communality': communality}, index=cols)
+    for j in range(n_factors):
+        items[f'loading_F{j + 1}'] = loadings[:, j]
+    return SimpleNamespace(n=n, alpha=alpha, alpha_standardized=alpha_standardized,
+                           corr=pd.DataFrame(corr, index=cols, columns=cols), items=items, eigenvalues=eigenvalues,
+                           loadings=loadings, explained=(loadings ** 2).sum(axis=0) / k, iterations=iterations,
+                           converged=converged)
+
+
+def write_item_analysis(stats, n_rows, output_path=ITEM_ANALYSIS_PATH):
+    """
+    項目分析の結果をファイルに出力する
+    """
+    width = 70 + 10 * stats.loadings.shape[1]
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write("=" * width + "\n")
+        f.write("尺度の項目分析（Q1-Q11）\n")
+        f.write("=" * width + "\n\n")
+        f.write(f"サンプルサイズ: N={int(stats.n)}（全項目に回答した人、全体 {n_rows} 件）\n")
+        f.write(f"Cronbachのα: {stats.alpha:.4f}（標準化α: {stats.alpha_standardized:.4f}）\n")
+        f.write(f"相関行列の固有値（上位5）: {', '.join(f'{value:.3f}' for value in stats.eigenvalues[:5])}\n")
+        f.write(f"主因子法: {stats.loadings.shape[1]} 因子, 反復 {stats.iterations} 回"
+                f"{'' if stats.converged else '（未収束）'}, "
+                f"説明率 {', '.join(f'{value:.1%}' for value in stats.explained)}\n\n")
+        f.write("-" * width + "\n")
+        header = (f"{'項目':<6s} {'平均':>8s} {'SD':>8s} {'項目-合計r':>10s} {'項目-残りr':>10s} "
+                  f"{'削除時α':>10s} {'共通性':>8s}")
+        header += ''.join(f" {f'負荷量F{j + 1}':>9s}" for j in range(stats.loadings.shape[1]))
+        f.write(header + "\n")
+        f.write("-" * width + "\n")
+        for item, row in stats.items.iterrows():
+            line = (f"{item:<6s} {row['mean']:>8.3f} {row['sd']:>8.3f} {row['item_total_r']:>10.3f} "
+                    f"{row['item_rest_r']:>10.3f} {row['alpha_if_deleted']:>10.4f} {row['communality']:>8.3f}")
+            line += ''.join(f" {value:>9.3f}" for value in stats.loadings[stats.items.index.get_loc(item)])
+            f.write(line + "\n")
+        f.write("-" * width + "\n\n")
+        f.write("-" * width + "\n")
+        f.write("項目間相関行列\n")
+        f.write("-" * width + "\n")
+        f.write(stats.corr.round(3).to_string() + "\n\n")
+        f.write("【解釈ガイド】\n")
+        f.write("- α ≥ 0.7 程度なら合計スコアの内的一貫性は十分\n")
+        f.write("- 削除時αが全体のαより高い項目は、尺度の一貫性を下げている可能性がある\n")
+        f.write("- 項目-残りr（その項目を除いた合計との相関）が 0.3 未満の項目は要検討\n")
+
+    print(f"α={stats.alpha:.4f}, 標準化α={stats.alpha_standardized:.4f}（N={int(stats.n)}）")
+    print(f"\n✅ 項目分析の結果を保存: {output_path}")
+
+
+# --- 成果物の依存関係（インクリメンタルビルド） ---
+# 各成果物（結果ファイル2つ・図12枚）が依存するデータ列・パラメータ・コードを定義し、それらのハッシュを
+# マニフェストに記録する。再実行時はハッシュが一致し出力ファイルも残っている成果物を作り直さない。
+
+ARTIFACT_MANIFEST = '.artifacts.json'
+
+REPORT_ARTIFACTS = ['correlation', 'regression']
+# 回帰モデルが依存する列（虫嫌いスコアとダミー変数の元になる設問）
+REGRESSION_COLS = ['Insect_Dislike_Score'] + [f'{name}_Num' for name, question in SURVEY_SCHEMA.items()
+                                               if question['dummies']]
+
+
+def artifact_definitions(aggregated=False, n_resamples=0, seed=0, output_dir='.', group_by=None, specification=None,
+                         item_factors=None):
+    """
+    成果物名 → {'output_path', 'columns'（依存するデータ列）, 'needs'（'corr' / 'model'）, 'params', 'funcs'（依存するコード）}
+    aggregated: 散布図・箱ひげ図を度数表から描画するか（ストリーミングモード・集計描画モード）
+    group_byを指定すると層別分析の成果物（'stratified'、図G1・G2）も加える
+    specification（注目する係数）を指定すると仕様曲線の成果物（'specification'、図4）も加える
+    item_factors（主因子法の因子数）を指定すると項目分析の成果物（'items'）も加える
+    （度数表にはQ1-Q11が無いため、aggregated=Trueの場合はデータ列に依存させず、呼び出し側で毎回作り直す）
+    """
+    corr_funcs = [spearman_matrix, _segment_sum]
+    ols_funcs = [build_dummy_frame, _level_index, dummy_crossproducts, fit_ols_from_crossproducts, fit_ols_from_state]
+    resampling_funcs = [run_resampling, resampling_inference, build_resampling_problem, _resampling_batch,
+                        _spearman_from_tables, _random_tables, _ols_from_tables]
+    # 図はいずれも描画仕様を作る関数とrender_figures（描画プロセスの初期化・スタイルを含む）を経由する
+    render_funcs = [render_figures, _timed_render, _init_render_worker, render_context, _render_style]
+    figure_funcs = [build_figure_specs_from_counts if aggregated else build_figure_specs] + render_funcs
+    resampling = {'n_resamples': n_resamples, 'seed': seed}
+    # 再標本化は相関と回帰をまとめて行うため、再標本化する場合は回帰の結果も全分析列に依存する
+    regression_cols = ANALYSIS_COLS if n_resamples else REGRESSION_COLS
+
+    artifacts = {
+        'correlation': {'output_path': 'correlation_results.txt', 'columns': ANALYSIS_COLS, 'needs': {'corr'},
+                        'params': {'factors': FACTORS, **resampling},
+                        'funcs': corr_funcs + resampling_funcs + [correlation_results_from_matrix,
+                                                                  write_correlation_results]},
+        'regression': {'output_path': 'regression_results.txt', 'columns': regression_cols, 'needs': {'model'},
+                       'params': {'dummies': DUMMY_SPECS, **resampling},
+                       'funcs': ols_funcs + resampling_funcs + [write_regression_results]},
+    }
+    for fig in SCATTER_FIGURES:
+        artifacts[fig['name']] = {
+            'output_path': fig['output_path'], 'columns': [fig['col'], 'Insect_Dislike_Score'], 'needs': {'corr'},
+            'params': {'figure': fig, 'aggregated': aggregated},
+            'funcs': corr_funcs + ([render_scatter_from_counts, _weighted_line] if aggregated else [render_regplot])
+                     + [_add_correlation_annotation] + figure_funcs}
+    artifacts['図3'] = {
+        'output_path': '3_regression_coefficients.png', 'columns': REGRESSION_COLS, 'needs': {'model'},
+        'params': {'dummies': DUMMY_SPECS, 'order': COEFFICIENT_ORDER, 'labels': COEFFICIENT_LABELS},
+        'funcs': ols_funcs + [build_coefficient_table, render_regression_coefficients] + figure_funcs}
+    for fig in BOXPLOT_FIGURES:
+        question = SURVEY_SCHEMA[fig['question']]
+        artifacts[fig['name']] = {
+            'output_path': fig['output_path'], 'columns': [f"{fig['question']}_Num", 'Insect_Dislike_Score'],
+            'needs': set(),
+            'params': {'figure': fig, 'codes': question['codes'], 'labels': question['labels'], 'aggregated': aggregated},
+            'funcs': ([_boxplot_stats_from_counts, render_boxplot_from_stats] if aggregated else [render_boxplot])
+                     + [_level_index] + figure_funcs}
+    artifacts['図2'] = {
+        'output_path': '2_heatmap_correlation.png', 'columns': ANALYSIS_COLS, 'needs': {'corr'},
+        'params': {'labels': CORR_LABELS},
+        'funcs': corr_funcs + [heatmap_matrix, render_heatmap] + figure_funcs}
+    keys = _group_keys(group_by)
+    if keys:
+        # 層別分析は相関・回帰をまとめて1回で計算するため、表と図はいずれも全分析列に依存する
+        stratified_funcs = (corr_funcs + ols_funcs + [stratified_analysis, stratified_frequency_table, frequency_table,
+                                                      grouped_crossproducts, fit_group_ols, _summary_rows])
+        stratified_params = {'group_by': keys, 'factors': FACTORS, 'dummies': DUMMY_SPECS}
+        artifacts['stratified'] = {'output_path': STRATIFIED_RESULTS_PATH, 'columns': _stratified_cols(keys),
+                                   'needs': set(), 'params': stratified_params, 'funcs': stratified_funcs}
+        for fig in STRATIFIED_FIGURES:
+            artifacts[fig['name']] = {
+                'output_path': fig['output_path'], 'columns': _stratified_cols(keys), 'needs': set(),
+                'params': {**stratified_params, 'figure': fig, 'labels': [CORR_LABELS, COEFFICIENT_LABELS]},
+                'funcs': stratified_funcs + [build_stratified_figure_specs, _key_label, render_stratified_facets]
+                         + render_funcs}
+    if specification:
+        specification_funcs = [build_dummy_frame, _level_index, dummy_crossproducts, specification_crossproducts,
+                               specification_subsets, fit_ols_batch, specification_analysis]
+        specification_params = {'groups': SPECIFICATION_GROUPS}
+        artifacts['specification'] = {'output_path': SPECIFICATION_RESULTS_PATH, 'columns': SPECIFICATION_COLS,
+                                      'needs': set(), 'params': specification_params, 'funcs': specification_funcs}
+        artifacts[SPECIFICATION_FIGURE['name']] = {
+            'output_path': SPECIFICATION_FIGURE['output_path'], 'columns': SPECIFICATION_COLS, 'needs': set(),
+            'params': {**specification_params, 'focal': specification, 'labels': SPECIFICATION_GROUP_LABELS},
+            'funcs': specification_funcs + [build_specification_figure_specs, render_specification_curve]
+                     + render_funcs}
+    if item_factors:
+        artifacts['items'] = {
+            'output_path': ITEM_ANALYSIS_PATH, 'columns': [] if aggregated else Q_COLS, 'needs': set(),
+            'params': {'items': Q_COLS, 'n_factors': item_factors},
+            'funcs': [item_crossproducts, item_crossproducts_streaming, principal_axis_factoring, item_statistics,
+                      write_item_analysis]}
+    for artifact in artifacts.values():
+        artifact['output_path'] = os.path.join(output_dir, artifact['output_path'])
+    return artifacts
+
+
+def _data_digest(df, cols, memo):
+    """
+    colsの内容のハッシュ（度数表の場合はcolsの組み合わせごとの度数＝周辺度数表のハッシュ）
+    """
+    if not cols:
+        return [cols, []]
+    if 'Count' in df.columns:
+        table = df.groupby(cols, dropna=False, observed=True)['Count'].sum().reset_index()
+        return [cols, [_column_digest(table[col]) for col in table.columns]]
+    for col in cols:
+        if col not in memo:
+            memo[col] = _column_digest(df[col])
+    return [cols, [memo[col] for col in cols]]
+
+
+def _column_digest(values):
+    """
+    1列の内容のハッシュ（数値以外の列（回答の文字列・Categoricalなど）は要素ごとのハッシュ値から求める）
+    """
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        data = values.to_numpy(dtype=float, na_value=np.nan)
+    else:
+        data = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    return hashlib.blake2b(data.tobytes(), digest_size=16).hexdigest()
+
+
+def artifact_keys(df, artifacts):
+    """
+    成果物ごとに、依存するデータ列・パラメータ・コードのハッシュ（ビルドキー）を求める
+    """
+    memo = {}
+    keys = {}
+    for name, artifact in artifacts.items():
+        payload = json.dumps([_data_digest(df, artifact['columns'], memo), artifact['params'],
+                              [inspect.getsource(func) for func in artifact['funcs']]],
+                             ensure_ascii=False, sort_keys=True, default=str)
+        keys[name] = hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+    return keys
+
+
+def load_manifest(path=ARTIFACT_MANIFEST):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, path=ARTIFACT_MANIFEST):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def plan_artifacts(artifacts, keys, manifest, candidates, force=None):
+    """
+    candidatesのうち作り直す成果物を返す（ビルドキーが前回と異なる・出力ファイルが無い・forceで指定されたもの）
+    force: Trueなら全て、成果物名のリストならそれらを強制的に作り直す
+    """
+    stale = []
+    for name in candidates:
+        record = manifest.get(name, {})
+        forced = force is True or (force and name in force)
+        if forced or record.get('key') != keys[name] or not os.path.exists(artifacts[name]['output_path']):
+            stale.append(name)
+    skipped = [name for name in candidates if name not in stale]
+    if skipped:
+        print(f"⚡ 最新のためスキップ: {', '.join(skipped)}")
+    return stale
+
+
+def record_artifacts(manifest, artifacts, keys, built, path=ARTIFACT_MANIFEST):
+    """
+    作成した成果物のビルドキーをマニフェストに記録する
+    """
+    for name in built:
+        manifest[name] = {'key': keys[name], 'output_path': artifacts[name]['output_path'],
+                          'built_at': datetime.now().isoformat(timespec='seconds')}
+    save_manifest(manifest, path)
+
+
+def plan_build(df, aggregated, n_resamples, seed, reports, figures, force, run_log, output_dir='.', group_by=None,
+               specification=None, item_factors=None):
+    """
+    今回作り直す成果物を決める（reports/figuresで対象を絞り、その中で最新でないものとforce指定のもの）
+    戻り値: (成果物の定義, ビルドキー, マニフェスト, 作り直す成果物名のリスト)
+    """
+    with log_stage(run_log, 'plan'):
+        artifacts = artifact_definitions(aggregated, n_resamples, seed, output_dir, group_by, specification,
+                                         item_factors)
+        candidates = ((REPORT_ARTIFACTS if reports else [])
+                      + [name for name in FIGURE_NAMES if _selected(name, figures)])
+        if _group_keys(group_by):
+            candidates += ((['stratified'] if reports else [])
+                           + [name for name in STRATIFIED_FIGURE_NAMES if _selected(name, figures)])
+        if specification:
+            candidates += ((['specification'] if reports else [])
+                           + [name for name in [SPECIFICATION_FIGURE['name']] if _selected(name, figures)])
+        if item_factors and reports:
+            candidates.append('items')
+        keys = artifact_keys(df, {name: artifacts[name] for name in candidates})
+        manifest = load_manifest(os.path.join(output_dir, ARTIFACT_MANIFEST))
+        build = plan_artifacts(artifacts, keys, manifest, candidates, force)
+    return artifacts, keys, manifest, build
+
+
+def _needs(artifacts, build, what):
+    return any(what in artifacts[name]['needs'] for name in build)
+
+
+def run_stratified(df, group_by, artifacts, build, run_log):
+    """
+    層別分析の表か図を作り直す場合に層別分析を行い、表を書き出す（不要ならNoneを返す）
+    """
+    if not any(name in build for name in STRATIFIED_ARTIFACTS):
+        return None
+    keys = _group_keys(group_by)
+    print(f"\n📊 --- 層別分析（{' × '.join(keys)}） ---")
+    with log_stage(run_log, 'stratified', group_by=keys):
+        table = stratified_analysis(df, keys)
+    n_groups = len(table[keys].drop_duplicates())
+    if 'stratified' in build:
+        table.to_csv(artifacts['stratified']['output_path'], index=False, encoding='utf-8-sig')
+        print(f"✅ 層別分析の結果を保存: {artifacts['stratified']['output_path']}（{n_groups} グループ）")
+    return table
+
+
+def record_quality_check(check, run_log, output_dir):
+    """
+    品質チェックの後処理: ハッシュ表の保存、除外した行数の記録、報告の書き出し
+    """
+    if check.insert:
+        save_respondent_index(check.index)
+    log_rows(run_log, 'quality.reject', check.rows, check.rows - check.rejected)
+    write_quality_report(check, os.path.join(output_dir, QUALITY_REPORT_PATH))
+
+
+def run_item_analysis(state_builder, n_rows, item_factors, artifacts, build, run_log):
+    """
+    項目分析を作り直す場合に、項目のクロス積（state_builder()）から統計量を求めて書き出す
+    """
+    if 'items' not in build:
+        return
+    print("\n📊 --- 尺度の項目分析（Q1-Q11） ---")
+    with log_stage(run_log, 'items', n_factors=item_factors):
+        state = state_builder()
+        log_rows(run_log, 'items.dropna', n_rows, state['n'])
+        stats = item_statistics(state, Q_COLS, item_factors)
+    write_item_analysis(stats, n_rows, artifacts['items']['output_path'])
+
+
+def run_specification(df, artifacts, build, run_log):
+    """
+    仕様曲線の表か図を作り直す場合に全ての組み合わせの回帰を求め、表を書き出す（不要ならNoneを返す）
+    """
+    if not any(name in build for name in SPECIFICATION_ARTIFACTS):
+        return None
+    print("\n📊 --- 仕様曲線（説明変数の全組み合わせの回帰） ---")
+    with log_stage(run_log, 'specification', models=len(specification_subsets())):
+        table = specification_analysis(df)
+    if 'specification' in build:
+        table.to_csv(artifacts['specification']['output_path'], index=False, encoding='utf-8-sig')
+        print(f"✅ 仕様曲線の結果を保存: {artifacts['specification']['output_path']}"
+              f"（{table['specification'].nunique()} モデル）")
+    return table
+
+
+def analyze_streaming(file_path, chunksize=DEFAULT_CHUNKSIZE, render_workers=None, cache_dir=CACHE_DIR,
+                      n_resamples=0, seed=0, incremental=False, run_log_path=RUN_LOG_PATH,
+                      profile_stage=None, profile_mode='cprofile', reports=True, figures=None, force=None,
+                      output_dir='.', group_by=None, specification=None, item_factors=None, quality=False,
+                      quality_index=None, summary=False):
+    """
+    ストリーミングモード: CSVをチャンク単位で集計し、度数表（十分統計量）から相関・回帰・可視化を行う
+    group_byを指定すると度数表にグループ列も含め、同じ度数表から層別分析も行う
+    qualityを指定すると、品質チェックで除外する行をチャンクごとに取り除いてから度数表に集約する
+    summary=Trueなら集計表（SUMMARY_COLUMNS）を返す（analyze_and_visualize参照）
+    """
+    if quality and incremental:
+        print("❌ 品質チェックとインクリメンタル回帰は同時に指定できません")
+        return
+    print(f"🚀 分析を開始します（ストリーミング, chunksize={chunksize}）: {file_path}")
+    # グループ列はチャンクを読む前に、ヘッダ（アーカイブは保存している列）から作る前処理後の列と照合する
+    try:
+        missing = [key for key in _group_keys(group_by) if key not in survey_columns(file_path)]
+    except Exception as e:
+        print(f"❌ 読み込みエラー: {e}")
+        return
+    if missing:
+        print(f"❌ グループ列がありません: {', '.join(missing)}")
+        return
+    os.makedirs(output_dir, exist_ok=True)
+    run_log = new_run_log(file_path, run_log_path and os.path.join(output_dir, run_log_path),
+                          profile_stage, profile_mode)
+
+    # 1. データ読み込み（チャンクごとに前処理して度数表へ集約、品質チェックで除外する行は含めない）
+    check = None
+    try:
+        with log_stage(run_log, 'load', chunksize=chunksize, quality=bool(quality)):
+            if quality:
+                index = load_respondent_index(quality_index_path(file_path, cache_dir, quality_index))
+                check = new_quality_check(file_path, index)
+            df_freq = load_survey_frequencies(file_path, chunksize, cache_dir, group_by, check)
+    except Exception as e:
+        print(f"❌ 読み込みエラー: {e}")
+        return
+    if check is not None:
+        record_quality_check(check, run_log, output_dir)
+        if check.rejected == check.rows:
+            print("❌ 品質チェックで全ての行が除外されたため、分析を行いません")
+            return
+    weights = df_freq['Count'].values
+    n_rows = int(weights.sum())
+    print(f"ℹ️ 度数表: {len(df_freq)} 通りの回答パターン / {n_rows} 件")
+
+    # 作り直す成果物と、そのために必要な段階（相関行列・回帰モデル）を決める
+    # （項目分析は度数表から判定できないため毎回作り直す）
+    if item_factors and force is not True:
+        force = list(force or []) + ['items']
+    artifacts, keys, manifest, build = plan_build(df_freq, True, n_resamples, seed, reports, figures, force,
+                                                  run_log, output_dir, group_by, specification, item_factors)
+    if not build and not summary:
+        write_run_log(run_log)
+        print("\n✨ 全ての成果物が最新です。")
+        return
+
+    # (A) 相関分析（スピアマンの順位相関）
+    corr = None
+    if summary or _needs(artifacts, build, 'corr'):
+        print("\n📊 --- 各環境要因と虫嫌いスコアの相関分析 ---")
+        with log_stage(run_log, 'correlation', rows=n_rows, patterns=len(df_freq)):
+            n_total = int(df_freq.loc[df_freq['Insect_Dislike_Score'].notna(), 'Count'].sum())
+            log_rows(run_log, 'correlation.dropna', n_rows, n_total)
+            corr = spearman_matrix(df_freq, ANALYSIS_COLS, weights)
+    if 'correlation' in build or 'regression' in build:
+        with log_stage(run_log, 'resampling', n_resamples=n_resamples):
+            resampling = run_resampling(df_freq, n_resamples, seed)
+    if 'correlation' in build:
+        write_correlation_results(correlation_results_from_matrix(corr), n_total,
+                                  artifacts['correlation']['output_path'], resampling)
+
+    # (B) 重回帰分析（ダミー変数化）: 度数で重み付けしたクロス積からOLSを求める
+    model = None
+    if summary or _needs(artifacts, build, 'model'):
+        print("\n📊 --- 重回帰分析結果（ダミー変数化） ---")
+        with log_stage(run_log, 'regression', incremental=incremental):
+            if incremental:
+                state = update_regression_state(file_path, cache_dir or CACHE_DIR, chunksize)
+            else:
+                state = regression_crossproducts(df_freq)
+                log_rows(run_log, 'regression.dropna', n_rows, state['n'])
+            model = fit_ols_from_state(state)
+            n_obs = int(state['n'])
+        if 'regression' in build:
+            write_regression_results(model, REGRESSION_VARS, n_obs, artifacts['regression']['output_path'],
+                                     resampling)
+
+    # (C) 層別分析（グループ列を含む度数表から、全グループの相関・回帰を一括で計算）
+    stratified = run_stratified(df_freq, group_by, artifacts, build, run_log)
+
+    # (D) 仕様曲線（度数で重み付けした1つのクロス積から全ての組み合わせを解く）
+    specifications = run_specification(df_freq, artifacts, build, run_log)
+
+    # (E) 尺度の項目分析（Q1-Q11はチャンクごとにクロス積だけを累積）
+    # （品質チェックの除外は、登録済みのハッシュ表を参照するだけで同じ行が再現される）
+    item_quality = check and new_quality_check(file_path, check.index, insert=False)
+    run_item_analysis(lambda: item_crossproducts_streaming(file_path, chunksize, quality=item_quality), n_rows,
+                      item_factors, artifacts, build, run_log)
+
+    # --- 可視化パート ---
+    build_figures = [name for name in FIGURE_NAMES + STRATIFIED_FIGURE_NAMES + [SPECIFICATION_FIGURE['name']]
+                     if name in build]
+    if build_figures:
+        with log_stage(run_log, 'figure_specs'):
+            coef_df = build_coefficient_table(model, REGRESSION_VARS) if model is not None else None
+            specs = build_figure_specs_from_counts(df_freq, corr, coef_df, build_figures, output_dir)
+            if stratified is not None:
+                specs += build_stratified_figure_specs(stratified, group_by, build_figures, output_dir)
+            if specifications is not None:
+                specs += build_specification_figure_specs(specifications, specification, build_figures, output_dir)
+        render_figures(specs, render_workers, run_log)
+
+    record_artifacts(manifest, artifacts, keys, build, os.path.join(output_dir, ARTIFACT_MANIFEST))
+    write_run_log(run_log)
+    print("\n✨ 全ての処理が完了しました。")
+    if summary:
+        return pd.DataFrame(_summary_rows(corr, model, n_obs), columns=SUMMARY_COLUMNS)
+
+
+def analyze_and_visualize(file_path, chunksize=None, render_workers=None, cache_dir=CACHE_DIR,
+                          n_resamples=0, seed=0, incremental=False, run_log_path=RUN_LOG_PATH,
+                          profile_stage=None, profile_mode='cprofile', reports=True, figures=None, force=None,
+                          output_dir='.', group_by=None, aggregate_figures=None, specification=None,
+                          item_factors=None, quality=False, quality_index=None, summary=False):
     """
     アンケートデータを読み込み、統計分析（相関・回帰）を行い、結果をグラフ化する関数
+    chunksizeを指定するとストリーミングモード（analyze_streaming）で処理する
+    render_workers: 図を並列描画するプロセス数（None=CPU数、1=並列化しない）
+    cache_dir: 前処理キャッシュの保存先（None=キャッシュを使わない）
+    n_resamples: ブートストラップ・並べ替え検定の再標本数（0=行わない）、seed: その乱数シード
+    incremental: 回帰分析を保存済みのクロス積＋追記された行だけで更新する（update_regression_state）
+    run_log_path: 段階ごとの計測値を書き出す実行ログ（.json/.csv、None=記録しない）
+    profile_stage, profile_mode: 1段階だけcProfile/tracemallocで詳しく計測する（new_run_log参照）
+    reports: 結果ファイル（相関・回帰）を書き出すか
+    figures: 描画する図番号のリスト（None=全て、[]=描画しない）。描画しない場合はmatplotlib等を読み込まない
+    force: 最新でも作り直す成果物（True=全て、または成果物名のリスト: 'correlation', 'regression', '図S1', ...）
+    output_dir: 結果ファイル・図・実行ログ・マニフェストの保存先
+    group_by: 層別分析のグループ列（列名またはそのリスト、例: 'Gender', ['Residence_Area', 'Gender']）。
+              グループごとの相関・回帰の縦持ちの表（STRATIFIED_RESULTS_PATH）とファセット図（図G1・G2）を作る
+    aggregate_figures: 散布図（S1〜S5）・箱ひげ図（1-1〜1-5）を度数表から描画する（集計描画モード）。
+                       None=回答数がAGGREGATE_FIGURES_MIN_ROWS以上なら集計する（ストリーミングモードは常に集計）
+    specification: 仕様曲線で注目する係数（例: SPECIFICATION_FOCAL）。説明変数のグループの全ての組み合わせの回帰を
+                   求め、表（SPECIFICATION_RESULTS_PATH）と仕様曲線（図4）を作る（None=行わない）
+    item_factors: Q1-Q11の項目分析（項目間相関・α係数・項目削除時のα・項目-合計相関）と主因子法の因子数。
+                  結果は ITEM_ANALYSIS_PATH に書き出す（None=行わない）
+    quality: 読み込み直後に品質チェック（重複・ストレートライン・範囲外の回答）を行い、該当する行を全ての分析・図から除く。
+             結果は QUALITY_REPORT_PATH に書き出す（重複の判定には、以前に分析した入力の回答のハッシュ表を使う）
+    quality_index: 回答者のハッシュ表の保存先（既定: キャッシュのディレクトリ内の QUALITY_INDEX_PATH）
+    summary: Trueなら成果物が最新でも相関行列と回帰モデルを求め、その集計表（SUMMARY_COLUMNS、バッチ処理用）を返す
+    成果物ごとに依存するデータ列・パラメータ・コードのハッシュを記録し（ARTIFACT_MANIFEST）、変わったものだけを作り直す
     """
+    if chunksize:
+        return analyze_streaming(file_path, chunksize, render_workers, cache_dir, n_resamples, seed, incremental,
+                                 run_log_path, profile_stage, profile_mode, reports, figures, force, output_dir,
+                                 group_by, specification, item_factors, quality, quality_index, summary)
+    if quality and incremental:
+        print("❌ 品質チェックとインクリメンタル回帰は同時に指定できません")
+        return
+
     print(f"🚀 分析を開始します: {file_path}")
+    os.makedirs(output_dir, exist_ok=True)
+    run_log = new_run_log(file_path, run_log_path and os.path.join(output_dir, run_log_path),
+                          profile_stage, profile_mode)
 
     # 1. データ読み込み
+    # 2. 前処理：カラム名の整理とスコア計算
+    # 3. 数値化（分析用）
+    # （入力ファイルと前処理の定義が変わっていなければキャッシュから読み込む）
     try:
-        df = pd.read_csv(file_path, encoding='utf-8-sig')
+        with log_stage(run_log, 'load'):
+            df_clean = load_survey(file_path, cache_dir)
     except Exception as e:
         print(f"❌ 読み込みエラー: {e}")
         return
+    missing = [key for key in _group_keys(group_by) if key not in df_clean.columns]
+    if missing:
+        print(f"❌ グループ列がありません: {', '.join(missing)}")
+        return
 
-    # 2. 前処理：カラム名の整理とスコア計算
-    rename_dict = {
-        '性別を選択してください。': 'Gender',
-        '幼少期に最も長く住んでいた居住地域の種類を選択してください。': 'Residence_Area',
-        '幼少期、屋外で遊ぶ際、よく山や川、海、田んぼなど、自然に近接した空間で遊んでいましたか？': 'Nature_Contact',
-        '幼少期によく本を読んでいましたか？': 'Reading_Habit',
-        '幼少期によく虫に関する本（図鑑等も含む）を読んでいましたか？': 'Insect_Book_Reading',
-    }
-    # Q1-Q11の自動抽出
-    for col in df.columns:
-        match = re.match(r'(\d+)\.', col)
-        if match:
-            rename_dict[col] = f'Q{match.group(1)}'
-
-    df_clean = df.rename(columns=rename_dict)
+    # 品質チェック: 重複・ストレートライン・範囲外の回答の行を、以降の全ての分析・図から除く
+    if quality:
+        with log_stage(run_log, 'quality', rows=len(df_clean)):
+            index = load_respondent_index(quality_index_path(file_path, cache_dir, quality_index))
+            check = new_quality_check(file_path, index)
+            df_clean = apply_quality_check(df_clean, check)
+        record_quality_check(check, run_log, output_dir)
+        if df_clean.empty:
+            print("❌ 品質チェックで全ての行が除外されたため、分析を行いません")
+            return
 
-    # 虫嫌いスコアの算出 (Q1-Q11の合計)
-    q_cols = [f'Q{i}' for i in range(1, 12)]
-    for col in q_cols:
-        df_clean[col] = pd.to_numeric(df_clean[col], errors='coerce')
-    df_clean['Insect_Dislike_Score'] = df_clean[q_cols].sum(axis=1)
+    if aggregate_figures is None:
+        aggregate_figures = len(df_clean) >= AGGREGATE_FIGURES_MIN_ROWS
 
-    # 3. 数値化（分析用）
-    # 順序尺度を数値に変換
-    mapping_order = {'よく遊んでいた': 3, 'たまに遊んでいた': 2, 'ほとんど遊ばなかった': 1,
-                     'よく読んでいた': 3, 'たまに読んでいた': 2, 'ほとんど読まなかった': 1}
-    
-    df_clean['Nature_Contact_Num'] = df_clean['Nature_Contact'].map(mapping_order)
-    df_clean['Reading_Habit_Num'] = df_clean['Reading_Habit'].map(mapping_order)
-    df_clean['Insect_Book_Reading_Num'] = df_clean['Insect_Book_Reading'].map(mapping_order)
-    # 性別 (男性=0, 女性=1)
-    df_clean['Gender_Num'] = df_clean['Gender'].map({'男性': 0, '女性': 1})
-    # 居住地域 (都市化度: 農村=1 → 都心=4)
-    mapping_area = {'農村・漁村': 1, '地方中心市街地': 2, '郊外住宅地・団地': 3, '都心・都市部': 4}
-    df_clean['Residence_Area_Num'] = df_clean['Residence_Area'].map(mapping_area)
+    # 作り直す成果物と、そのために必要な段階（相関行列・回帰モデル）を決める
+    artifacts, keys, manifest, build = plan_build(df_clean, aggregate_figures, n_resamples, seed, reports, figures,
+                                                  force, run_log, output_dir, group_by, specification, item_factors)
+    if not build and not summary:
+        write_run_log(run_log)
+        print("\n✨ 全ての成果物が最新です。")
+        return
 
     # --- 分析パート ---
 
     # (A) 相関分析（スピアマンの順位相関）
-    from scipy.stats import spearmanr
-    print("\n📊 --- 各環境要因と虫嫌いスコアの相関分析 ---")
-    factors = {
-        '自然接触頻度': 'Nature_Contact_Num',
-        '読書習慣': 'Reading_Habit_Num',
-        '虫本読書頻度': 'Insect_Book_Reading_Num',
-        '性別(女性=1)': 'Gender_Num',
-        '居住地域(都市化度)': 'Residence_Area_Num'
-    }
-    
-    # 相関分析結果をファイルに出力
-    with open('correlation_results.txt', 'w', encoding='utf-8') as f:
-        f.write("=" * 60 + "\n")
-        f.write("各環境要因と虫嫌いスコアの相関分析結果\n")
-        f.write("=" * 60 + "\n\n")
-        f.write("分析方法: スピアマンの順位相関係数\n")
-        f.write(f"サンプルサイズ: N={len(df_clean.dropna(subset=['Insect_Dislike_Score']))}\n\n")
-        f.write("-" * 60 + "\n")
-        
-        for label, col in factors.items():
-            data_corr = df_clean[['Insect_Dislike_Score', col]].dropna()
-            if len(data_corr) > 0:
-                corr, p_value = spearmanr(data_corr['Insect_Dislike_Score'], data_corr[col])
-                sig = '***' if p_value < 0.001 else '**' if p_value < 0.01 else '*' if p_value < 0.05 else 'n.s.'
-                
-                result_line = f"{label:20s}: r={corr:6.3f}, p={p_value:.4f} {sig}\n"
-                print(result_line.strip())
-                f.write(result_line)
-        
-        f.write("-" * 60 + "\n\n")
-        f.write("【有意水準】\n")
-        f.write("  *** : p < 0.001 (非常に有意)\n")
-        f.write("  **  : p < 0.01  (有意)\n")
-        f.write("  *   : p < 0.05  (やや有意)\n")
-        f.write("  n.s.: p >= 0.05 (有意でない)\n\n")
-        f.write("【解釈】\n")
-        f.write("  負の相関(r < 0): その要因が強いほど虫嫌いが減る傾向\n")
-        f.write("  正の相関(r > 0): その要因が強いほど虫嫌いが増える傾向\n")
-        f.write("  |r| > 0.5: 強い相関\n")
-        f.write("  0.3 < |r| <= 0.5: 中程度の相関\n")
-        f.write("  0.1 < |r| <= 0.3: 弱い相関\n")
-        f.write("  |r| <= 0.1: ほぼ相関なし\n")
-    
-    print("\n有意水準: *** p<0.001, ** p<0.01, * p<0.05, n.s. 有意でない")
-    print("負の相関 → その要因が強いほど虫嫌いが減る")
-    print("正の相関 → その要因が強いほど虫嫌いが増える")
-    print("✅ 相関分析結果を保存: correlation_results.txt")
+    # 全ペアの相関行列を一度だけ計算し、結果ファイル・散布図・ヒートマップで共用する
+    corr = None
+    if summary or _needs(artifacts, build, 'corr'):
+        print("\n📊 --- 各環境要因と虫嫌いスコアの相関分析 ---")
+        with log_stage(run_log, 'correlation', rows=len(df_clean)):
+            corr = spearman_matrix(df_clean, ANALYSIS_COLS)
+
+    if 'correlation' in build or 'regression' in build:
+        # 再標本化による信頼区間・並べ替え検定（n_resamples > 0 の場合）
+        with log_stage(run_log, 'resampling', n_resamples=n_resamples):
+            resampling = run_resampling(frequency_table(df_clean), n_resamples, seed)
+
+    if 'correlation' in build:
+        # 相関分析結果をファイルに出力
+        n_total = int(df_clean['Insect_Dislike_Score'].notna().sum())
+        log_rows(run_log, 'correlation.dropna', len(df_clean), n_total)
+        write_correlation_results(correlation_results_from_matrix(corr), n_total,
+                                  artifacts['correlation']['output_path'], resampling)
 
     # (B) 重回帰分析（ダミー変数化）
     # 順序尺度を等間隔と仮定せず、カテゴリとして扱う
-    print("\n📊 --- 重回帰分析結果（ダミー変数化） ---")
-    
-    # ダミー変数の作成（参照カテゴリ: Rarely=1）
-    df_dummy = pd.DataFrame()
-    df_dummy['Insect_Dislike_Score'] = df_clean['Insect_Dislike_Score']
-    
-    # 自然接触頻度のダミー変数
-    df_dummy['Nature_Sometimes'] = (df_clean['Nature_Contact_Num'] == 2).astype(int)
-    df_dummy['Nature_Frequent'] = (df_clean['Nature_Contact_Num'] == 3).astype(int)
-    
-    # 読書習慣のダミー変数
-    df_dummy['Reading_Sometimes'] = (df_clean['Reading_Habit_Num'] == 2).astype(int)
-    df_dummy['Reading_Frequent'] = (df_clean['Reading_Habit_Num'] == 3).astype(int)
-    
-    # 虫本読書頻度のダミー変数
-    df_dummy['InsectBook_Sometimes'] = (df_clean['Insect_Book_Reading_Num'] == 2).astype(int)
-    df_dummy['InsectBook_Frequent'] = (df_clean['Insect_Book_Reading_Num'] == 3).astype(int)
-    
-    # 居住地域のダミー変数（参照: Rural=1）
-    df_dummy['Area_Regional'] = (df_clean['Residence_Area_Num'] == 2).astype(int)
-    df_dummy['Area_Suburban'] = (df_clean['Residence_Area_Num'] == 3).astype(int)
-    df_dummy['Area_Urban'] = (df_clean['Residence_Area_Num'] == 4).astype(int)
-    
-    # 欠損除去
-    df_reg = df_dummy.dropna()
-    y = df_reg['Insect_Dislike_Score']
-    X = df_reg.drop('Insect_Dislike_Score', axis=1)
-    
-    # 定数項を追加してOLS回帰
-    X_with_const = sm.add_constant(X)
-    model = sm.OLS(y, X_with_const).fit()
-    
-    # 結果をファイルに出力
-    with open('regression_results.txt', 'w', encoding='utf-8') as f:
-        f.write("=" * 70 + "\n")
-        f.write("重回帰分析結果（ダミー変数化）\n")
-        f.write("=" * 70 + "\n\n")
-        f.write(f"サンプルサイズ: N={len(df_reg)}\n")
-        f.write(f"決定係数 R²: {model.rsquared:.4f}\n")
-        f.write(f"調整済みR²: {model.rsquared_adj:.4f}\n")
-        f.write(f"F統計量: {model.fvalue:.4f}, p値: {model.f_pvalue:.4f}\n\n")
-        f.write("-" * 70 + "\n")
-        f.write("回帰係数（非標準化）\n")
-        f.write("-" * 70 + "\n")
-        f.write(f"{'変数名':<30s} {'係数':>10s} {'標準誤差':>10s} {'p値':>10s} {'有意性':>8s}\n")
-        f.write("-" * 70 + "\n")
-        
-        for var in X.columns:
-            coef = model.params[var]
-            se = model.bse[var]
-            pval = model.pvalues[var]
-            sig = '***' if pval < 0.001 else '**' if pval < 0.01 else '*' if pval < 0.05 else 'n.s.'
-            f.write(f"{var:<30s} {coef:>10.3f} {se:>10.3f} {pval:>10.4f} {sig:>8s}\n")
-            print(f"{var:<30s}: coef={coef:7.3f}, p={pval:.4f} {sig}")
-        
-        f.write("-" * 70 + "\n\n")
-        f.write("【解釈ガイド】\n")
-        f.write("- 参照カテゴリ: 自然接触=Rarely, 読書=Rarely, 虫本=Rarely, 地域=Rural\n")
-        f.write("- 係数が負 → 虫嫌いスコアが減少\n")
-        f.write("- 係数が正 → 虫嫌いスコアが増加\n")
-        f.write("- 例: InsectBook_Frequent = -15.0 の場合、\n")
-        f.write("  「虫本をよく読んだ人は、ほとんど読まなかった人より\n")
-        f.write("   虫嫌いスコアが15点低い（他の条件が同じ場合）」\n")
-    
-    print("\n✅ 回帰分析結果を保存: regression_results.txt")
-    
-    # 可視化用に標準化係数も計算
-    # 標準化係数 = 非標準化係数 × (SD_X / SD_Y)
-    y_std_val = y.std()
-    standardized_coefs = {}
-    for var in X.columns:
-        x_std_val = X[var].std()
-        if x_std_val > 0:  # ダミー変数の標準偏差が0でない場合
-            standardized_coefs[var] = model.params[var] * (x_std_val / y_std_val)
-        else:
-            standardized_coefs[var] = 0
-    
-    # 主要な係数のみを可視化用に抽出（Frequentカテゴリのみ）
-    viz_coefs = pd.Series({
-        'Nature Contact\n(Frequent)': standardized_coefs.get('Nature_Frequent', 0),
-        'Reading Habit\n(Frequent)': standardized_coefs.get('Reading_Frequent', 0),
-        'Insect Book\n(Frequent)': standardized_coefs.get('InsectBook_Frequent', 0),
-        'Urban Residence\n(Urban)': standardized_coefs.get('Area_Urban', 0)
-    })
+    model = None
+    if summary or _needs(artifacts, build, 'model'):
+        print("\n📊 --- 重回帰分析結果（ダミー変数化） ---")
 
+        with log_stage(run_log, 'regression', incremental=incremental):
+            if incremental:
+                # 前回の実行以降に追記された行だけをクロス積に加えて回帰を更新（ダミー変数フレームは作らない）
+                state = update_regression_state(file_path, cache_dir or CACHE_DIR)
+                model = fit_ols_from_state(state)
+                n_obs = int(state['n'])
+            else:
+                # ダミー変数の作成（参照カテゴリ: Rarely=1, Rural=1）
+                df_dummy = build_dummy_frame(df_clean)
+
+                # 欠損除去
+                df_reg = df_dummy.dropna()
+                log_rows(run_log, 'regression.dropna', len(df_dummy), len(df_reg))
+
+                # 定数項を追加してOLS回帰（クロス積から求めるため、statsmodelsの読み込みは不要）
+                model = fit_ols_from_state(dummy_crossproducts(df_reg))
+                n_obs = len(df_reg)
+
+        # 結果をファイルに出力
+        if 'regression' in build:
+            write_regression_results(model, REGRESSION_VARS, n_obs, artifacts['regression']['output_path'],
+                                     resampling)
+
+    # (C) 層別分析（グループ列ごとの相関・回帰）
+    # df_cleanを1回だけgroupbyした度数表から、全グループの相関行列とクロス積を求める
+    stratified = run_stratified(df_clean, group_by, artifacts, build, run_log)
+
+    # (D) 仕様曲線（全変数のクロス積を1回求め、全ての組み合わせをその部分行列から解く）
+    specifications = run_specification(df_clean, artifacts, build, run_log)
+
+    # (E) 尺度の項目分析（Q1-Q11のクロス積を1回求め、全ての統計量をそこから計算）
+    run_item_analysis(lambda: item_crossproducts(df_clean), len(df_clean), item_factors, artifacts, build, run_log)
 
     # --- 可視化パート ---
-    
-    # フォント設定（Times New Romanに固定）
-    plt.rcParams['font.family'] = 'Times New Roman'
-    print(f"ℹ️ フォント設定: Times New Roman")
-    
-    sns.set(style="whitegrid", font='Times New Roman')
+    build_figures = [name for name in FIGURE_NAMES + STRATIFIED_FIGURE_NAMES + [SPECIFICATION_FIGURE['name']]
+                     if name in build]
+    if build_figures:
+        print("ℹ️ フォント設定: Times New Roman")
 
-    # 図1-1: 自然接触頻度とスコアの箱ひげ図
-    df_plot = df_clean.copy()
-    df_plot['Nature_Contact'] = df_plot['Nature_Contact'].map({
-        'よく遊んでいた': 'Frequently',
-        'たまに遊んでいた': 'Occasionaly',
-        'ほとんど遊ばなかった': 'Rarely'
-    })
-    order_nature = ['Frequently', 'Occasionaly', 'Rarely']
-    plt.figure(figsize=(10, 6))
-    sns.boxplot(x='Nature_Contact', y='Insect_Dislike_Score', data=df_plot, order=order_nature, palette='viridis')
-    # plt.title('Nature Contact Frequency vs Insect Dislike Score', fontsize=14, fontname='Times New Roman')
-    plt.ylabel('Insect Dislike Score', fontsize=12, fontname='Times New Roman')
-    plt.xlabel('Outdoor Play Frequency in Childhood', fontsize=12, fontname='Times New Roman')
-    plt.xticks(fontname='Times New Roman')
-    plt.yticks(fontname='Times New Roman')
-    plt.tight_layout()
-    plt.savefig('1-1_boxplot_nature_vs_score.png')
-    print("✅ 図1-1 保存完了: 1-1_boxplot_nature_vs_score.png")
-
-    # 図1-2: 読書習慣とスコアの箱ひげ図
-    df_plot = df_clean.copy()
-    df_plot['Reading_Habit'] = df_plot['Reading_Habit'].map({
-        'よく読んでいた': 'Frequently',
-        'たまに読んでいた': 'Occasionaly',
-        'ほとんど読まなかった': 'Rarely'
-    })
-    order_reading = ['Frequently', 'Occasionaly', 'Rarely']
-    plt.figure(figsize=(10, 6))
-    sns.boxplot(x='Reading_Habit', y='Insect_Dislike_Score', data=df_plot, order=order_reading, palette='viridis')
-    # plt.title('Reading Habit in Childhood vs Insect Dislike Score', fontsize=14, fontname='Times New Roman')
-    plt.ylabel('Insect Dislike Score', fontsize=12, fontname='Times New Roman')
-    plt.xlabel('Reading Frequency', fontsize=12, fontname='Times New Roman')
-    plt.xticks(fontname='Times New Roman')
-    plt.yticks(fontname='Times New Roman')
-    plt.tight_layout()
-    plt.savefig('1-2_boxplot_reading_vs_score.png')
-    print("✅ 図1-2 保存完了: 1-2_boxplot_reading_vs_score.png")
-
-    # 図1-3: 虫本読書頻度とスコアの箱ひげ図
-    df_plot = df_clean.copy()
-    df_plot['Insect_Book_Reading'] = df_plot['Insect_Book_Reading'].map({
-        'よく読んでいた': 'Frequently',
-        'たまに読んでいた': 'Occasionaly',
-        'ほとんど読まなかった': 'Rarely'
-    })
-    order_insect_book = ['Frequently', 'Occasionaly', 'Rarely']
-    plt.figure(figsize=(10, 6))
-    sns.boxplot(x='Insect_Book_Reading', y='Insect_Dislike_Score', data=df_plot, order=order_insect_book, palette='viridis')
-    # plt.title('Insect Book Reading Frequency vs Insect Dislike Score', fontsize=14, fontname='Times New Roman')
-    plt.ylabel('Insect Dislike Score', fontsize=12, fontname='Times New Roman')
-    plt.xlabel('Insect-Related Book Reading Frequency', fontsize=12, fontname='Times New Roman')
-    plt.xticks(fontname='Times New Roman')
-    plt.yticks(fontname='Times New Roman')
-    plt.tight_layout()
-    plt.savefig('1-3_boxplot_insect_book_vs_score.png')
-    print("✅ 図1-3 保存完了: 1-3_boxplot_insect_book_vs_score.png")
-
-    # 図1-4: 性別とスコアの箱ひげ図
-    df_plot = df_clean.copy()
-    df_plot['Gender'] = df_plot['Gender'].map({
-        '男性': 'Male',
-        '女性': 'Female'
-    })
-    plt.figure(figsize=(10, 6))
-    sns.boxplot(x='Gender', y='Insect_Dislike_Score', data=df_plot, order=['Male', 'Female'], palette='viridis')
-    # plt.title('Gender vs Insect Dislike Score', fontsize=14, fontname='Times New Roman')
-    plt.ylabel('Insect Dislike Score', fontsize=12, fontname='Times New Roman')
-    plt.xlabel('Gender', fontsize=12, fontname='Times New Roman')
-    plt.xticks(fontname='Times New Roman')
-    plt.yticks(fontname='Times New Roman')
-    plt.tight_layout()
-    plt.savefig('1-4_boxplot_gender_vs_score.png')
-    print("✅ 図1-4 保存完了: 1-4_boxplot_gender_vs_score.png")
-
-    # 図1-5: 居住地域とスコアの箱ひげ図
-    df_plot = df_clean.copy()
-    df_plot['Residence_Area'] = df_plot['Residence_Area'].map({
-        '農村・漁村': 'Rural',
-        '地方中心市街地': 'Regional City',
-        '郊外住宅地・団地': 'Suburban',
-        '都心・都市部': 'Urban'
-    })
-    order_area = ['Rural', 'Regional City', 'Suburban', 'Urban']
-    plt.figure(figsize=(12, 6))
-    sns.boxplot(x='Residence_Area', y='Insect_Dislike_Score', data=df_plot, order=order_area, palette='viridis')
-    # plt.title('Childhood Residence Area vs Insect Dislike Score', fontsize=14, fontname='Times New Roman')
-    plt.ylabel('Insect Dislike Score', fontsize=12, fontname='Times New Roman')
-    plt.xlabel('Residence Area Type', fontsize=12, fontname='Times New Roman')
-    plt.xticks(rotation=15, fontname='Times New Roman')
-    plt.yticks(fontname='Times New Roman')
-    plt.tight_layout()
-    plt.savefig('1-5_boxplot_residence_vs_score.png')
-    print("✅ 図1-5 保存完了: 1-5_boxplot_residence_vs_score.png")
-
-    # 散布図: 各要因とスコアの関係（相関係数表示）
-    from scipy.stats import spearmanr
-    
-    # 図S1: 自然接触頻度 vs スコア
-    plt.figure(figsize=(10, 6))
-    data_plot = df_clean[['Nature_Contact_Num', 'Insect_Dislike_Score']].dropna()
-    corr, p_val = spearmanr(data_plot['Nature_Contact_Num'], data_plot['Insect_Dislike_Score'])
-    sns.regplot(x='Nature_Contact_Num', y='Insect_Dislike_Score', data=data_plot, 
-                scatter_kws={'alpha':0.6, 's':50}, line_kws={'color':'red'})
-    plt.text(0.05, 0.95, f'r = {corr:.3f}, p = {p_val:.4f}', 
-             transform=plt.gca().transAxes, fontsize=12, verticalalignment='top',
-             bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5),
-             fontname='Times New Roman')
-    plt.ylabel('Insect Dislike Score', fontsize=12, fontname='Times New Roman')
-    plt.xlabel('Nature Contact Frequency (1=Rarely, 3=Frequent)', fontsize=12, fontname='Times New Roman')
-    plt.xticks([1, 2, 3], ['Rarely', 'Sometimes', 'Frequent'], fontname='Times New Roman')
-    plt.yticks(fontname='Times New Roman')
-    plt.tight_layout()
-    plt.savefig('S1_scatter_nature_vs_score.png', dpi=300)
-    print("✅ 図S1 保存完了: S1_scatter_nature_vs_score.png")
-    
-    # 図S2: 読書習慣 vs スコア
-    plt.figure(figsize=(10, 6))
-    data_plot = df_clean[['Reading_Habit_Num', 'Insect_Dislike_Score']].dropna()
-    corr, p_val = spearmanr(data_plot['Reading_Habit_Num'], data_plot['Insect_Dislike_Score'])
-    sns.regplot(x='Reading_Habit_Num', y='Insect_Dislike_Score', data=data_plot, 
-                scatter_kws={'alpha':0.6, 's':50}, line_kws={'color':'red'})
-    plt.text(0.05, 0.95, f'r = {corr:.3f}, p = {p_val:.4f}', 
-             transform=plt.gca().transAxes, fontsize=12, verticalalignment='top',
-             bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5),
-             fontname='Times New Roman')
-    plt.ylabel('Insect Dislike Score', fontsize=12, fontname='Times New Roman')
-    plt.xlabel('Reading Habit Frequency (1=Rarely, 3=Frequent)', fontsize=12, fontname='Times New Roman')
-    plt.xticks([1, 2, 3], ['Rarely', 'Sometimes', 'Frequent'], fontname='Times New Roman')
-    plt.yticks(fontname='Times New Roman')
-    plt.tight_layout()
-    plt.savefig('S2_scatter_reading_vs_score.png', dpi=300)
-    print("✅ 図S2 保存完了: S2_scatter_reading_vs_score.png")
-    
-    # 図S3: 虫本読書頻度 vs スコア
-    plt.figure(figsize=(10, 6))
-    data_plot = df_clean[['Insect_Book_Reading_Num', 'Insect_Dislike_Score']].dropna()
-    corr, p_val = spearmanr(data_plot['Insect_Book_Reading_Num'], data_plot['Insect_Dislike_Score'])
-    sns.regplot(x='Insect_Book_Reading_Num', y='Insect_Dislike_Score', data=data_plot, 
-                scatter_kws={'alpha':0.6, 's':50}, line_kws={'color':'red'})
-    plt.text(0.05, 0.95, f'r = {corr:.3f}, p = {p_val:.4f}', 
-             transform=plt.gca().transAxes, fontsize=12, verticalalignment='top',
-             bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5),
-             fontname='Times New Roman')
-    plt.ylabel('Insect Dislike Score', fontsize=12, fontname='Times New Roman')
-    plt.xlabel('Insect Book Reading Frequency (1=Rarely, 3=Frequent)', fontsize=12, fontname='Times New Roman')
-    plt.xticks([1, 2, 3], ['Rarely', 'Sometimes', 'Frequent'], fontname='Times New Roman')
-    plt.yticks(fontname='Times New Roman')
-    plt.tight_layout()
-    plt.savefig('S3_scatter_insect_book_vs_score.png', dpi=300)
-    print("✅ 図S3 保存完了: S3_scatter_insect_book_vs_score.png")
-    
-    # 図S4: 性別 vs スコア
-    plt.figure(figsize=(10, 6))
-    data_plot = df_clean[['Gender_Num', 'Insect_Dislike_Score']].dropna()
-    corr, p_val = spearmanr(data_plot['Gender_Num'], data_plot['Insect_Dislike_Score'])
-    sns.regplot(x='Gender_Num', y='Insect_Dislike_Score', data=data_plot, 
-                scatter_kws={'alpha':0.6, 's':50}, line_kws={'color':'red'})
-    plt.text(0.05, 0.95, f'r = {corr:.3f}, p = {p_val:.4f}', 
-             transform=plt.gca().transAxes, fontsize=12, verticalalignment='top',
-             bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5),
-             fontname='Times New Roman')
-    plt.ylabel('Insect Dislike Score', fontsize=12, fontname='Times New Roman')
-    plt.xlabel('Gender (0=Male, 1=Female)', fontsize=12, fontname='Times New Roman')
-    plt.xticks([0, 1], ['Male', 'Female'], fontname='Times New Roman')
-    plt.yticks(fontname='Times New Roman')
-    plt.tight_layout()
-    plt.savefig('S4_scatter_gender_vs_score.png', dpi=300)
-    print("✅ 図S4 保存完了: S4_scatter_gender_vs_score.png")
-    
-    # 図S5: 居住地域 vs スコア
-    plt.figure(figsize=(10, 6))
-    data_plot = df_clean[['Residence_Area_Num', 'Insect_Dislike_Score']].dropna()
-    corr, p_val = spearmanr(data_plot['Residence_Area_Num'], data_plot['Insect_Dislike_Score'])
-    sns.regplot(x='Residence_Area_Num', y='Insect_Dislike_Score', data=data_plot, 
-                scatter_kws={'alpha':0.6, 's':50}, line_kws={'color':'red'})
-    plt.text(0.05, 0.95, f'r = {corr:.3f}, p = {p_val:.4f}', 
-             transform=plt.gca().transAxes, fontsize=12, verticalalignment='top',
-             bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5),
-             fontname='Times New Roman')
-    plt.ylabel('Insect Dislike Score', fontsize=12, fontname='Times New Roman')
-    plt.xlabel('Residence Area (1=Rural, 4=Urban)', fontsize=12, fontname='Times New Roman')
-    plt.xticks([1, 2, 3, 4], ['Rural', 'Regional', 'Suburban', 'Urban'], fontname='Times New Roman')
-    plt.yticks(fontname='Times New Roman')
-    plt.tight_layout()
-    plt.savefig('S5_scatter_residence_vs_score.png', dpi=300)
-    print("✅ 図S5 保存完了: S5_scatter_residence_vs_score.png")
-
-    # 図2: 相関行列のヒートマップ
-    plt.figure(figsize=(11, 9))
-    corr_cols = ['Insect_Dislike_Score', 'Nature_Contact_Num', 'Reading_Habit_Num', 'Insect_Book_Reading_Num', 'Gender_Num', 'Residence_Area_Num']
-    corr_labels = ['Insect Dislike', 'Nature Contact', 'Reading Habit', 'Insect Book', 'Gender (F=1)', 'Urban Residence']
-    corr_mat = df_clean[corr_cols].corr(method='spearman')
-    corr_mat.index = corr_labels
-    corr_mat.columns = corr_labels
-    sns.heatmap(corr_mat, annot=True, cmap='coolwarm', vmin=-1, vmax=1, fmt='.2f', square=True, 
-                cbar_kws={'label': 'Spearman Correlation'}, annot_kws={'fontname': 'Times New Roman'})
-    # plt.title('Correlation Matrix (Spearman Rank Correlation)', fontsize=14, fontname='Times New Roman')
-    plt.xticks(fontname='Times New Roman')
-    plt.yticks(fontname='Times New Roman')
-    plt.tight_layout()
-    plt.savefig('2_heatmap_correlation.png')
-    print("✅ 図2 保存完了: 2_heatmap_correlation.png")
-
-    # 図3: 回帰係数の棒グラフ（影響度の可視化）
-    plt.figure(figsize=(12, 8))
-    
-    # 変数の順序を定義（グループごとに整理）
-    var_order = [
-        'Nature_Sometimes', 'Nature_Frequent',
-        'Reading_Sometimes', 'Reading_Frequent',
-        'InsectBook_Sometimes', 'InsectBook_Frequent',
-        'Area_Regional', 'Area_Suburban', 'Area_Urban'
-    ]
-    
-    labels_jp = {
-        'Nature_Sometimes': 'Nature Contact\n(Sometimes)',
-        'Nature_Frequent': 'Nature Contact\n(Frequent)',
-        'Reading_Sometimes': 'Reading Habit\n(Sometimes)',
-        'Reading_Frequent': 'Reading Habit\n(Frequent)',
-        'InsectBook_Sometimes': 'Insect Book\n(Sometimes)',
-        'InsectBook_Frequent': 'Insect Book\n(Frequent)',
-        'Area_Regional': 'Residence\n(Regional City)',
-        'Area_Suburban': 'Residence\n(Suburban)',
-        'Area_Urban': 'Residence\n(Urban)'
-    }
-    
-    # 順序に従ってデータを整理
-    coef_data = []
-    for var in var_order:
-        if var in X.columns:
-            coef_data.append({
-                'variable': labels_jp.get(var, var),
-                'coefficient': model.params[var],
-                'pvalue': model.pvalues[var],
-                'significant': model.pvalues[var] < 0.05
-            })
-    
-    coef_df = pd.DataFrame(coef_data)
-    
-    # 色付け：有意なものと有意でないものを区別
-    colors = ['#440154' if sig else '#CCCCCC' for sig in coef_df['significant']]
-    
-    # 横棒グラフ（下から上へ表示するため、順序を反転）
-    y_positions = range(len(coef_df))
-    bars = plt.barh(y_positions, coef_df['coefficient'], color=colors)
-    plt.yticks(y_positions, coef_df['variable'], fontname='Times New Roman', fontsize=10)
-    plt.axvline(0, color='black', linewidth=1.2)
-    
-    # 有意性のマーカーを追加
-    for i, (idx, row) in enumerate(coef_df.iterrows()):
-        if row['pvalue'] < 0.001:
-            marker = '***'
-        elif row['pvalue'] < 0.01:
-            marker = '**'
-        elif row['pvalue'] < 0.05:
-            marker = '*'
-        else:
-            marker = ''
-        
-        if marker:
-            x_pos = row['coefficient'] + (1.5 if row['coefficient'] > 0 else -1.5)
-            plt.text(x_pos, i, marker, ha='center', va='center', 
-                    fontsize=12, fontweight='bold')
-    
-    plt.xlabel('Coefficient (negative = reduces insect dislike)', fontsize=12, fontname='Times New Roman')
-    plt.xticks(fontname='Times New Roman')
-    
-    # 凡例を追加
-    from matplotlib.patches import Patch
-    legend_elements = [
-        Patch(facecolor='#440154', label='Significant (p < 0.05)'),
-        Patch(facecolor='#CCCCCC', label='Not significant')
-    ]
-    plt.legend(handles=legend_elements, loc='lower right', prop={'family': 'Times New Roman'})
-    
-    plt.tight_layout()
-    plt.savefig('3_regression_coefficients.png', dpi=300)
-    print("✅ 図3 保存完了: 3_regression_coefficients.png")
+        # 各図に必要な列だけを切り出して描画（図1-1〜1-5, S1〜S5, 2, 3, G1, G2, 4）
+        with log_stage(run_log, 'figure_specs'):
+            coef_df = build_coefficient_table(model, REGRESSION_VARS) if model is not None else None
+            if aggregate_figures:
+                # 集計描画モード: 度数表を1回作り、描画には水準ごとの度数・統計量だけを渡す
+                specs = build_figure_specs_from_counts(frequency_table(df_clean), corr, coef_df, build_figures,
+                                                       output_dir)
+            else:
+                specs = build_figure_specs(df_clean, corr, coef_df, run_log, build_figures, output_dir)
+            if stratified is not None:
+                specs += build_stratified_figure_specs(stratified, group_by, build_figures, output_dir)
+            if specifications is not None:
+                specs += build_specification_figure_specs(specifications, specification, build_figures, output_dir)
+        render_figures(specs, render_workers, run_log)
 
+    record_artifacts(manifest, artifacts, keys, build, os.path.join(output_dir, ARTIFACT_MANIFEST))
+    write_run_log(run_log)
     print("\n✨ 全ての処理が完了しました。")
+    if summary:
+        return pd.DataFrame(_summary_rows(corr, model, n_obs), columns=SUMMARY_COLUMNS)
+
+# --- バッチ処理（複数ファイル） ---
+# 調査の回・学校・地域ごとのCSVをプロセスプールで並列に分析し、入力ごとに別の出力先へ書き出す。
+# 全入力の相関係数・回帰係数は1つの集計表（縦持ち）にまとめる。
+
+BATCH_OUTPUT_DIR = 'batch_results'
+
+
+def expand_inputs(sources):
+    """
+    ディレクトリ・globパターン・ファイルパスのリストを、重複のないCSVファイルのリストに展開する
+    （列指向アーカイブのディレクトリは展開せず、1つの入力として扱う）
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+    paths = []
+    for source in sources:
+        if os.path.isdir(source) and not is_archive(source):
+            matches = sorted(glob.glob(os.path.join(glob.escape(source), '*.csv')))
+        else:
+            matches = sorted(glob.glob(source)) or ([source] if os.path.exists(source) else [])
+        paths.extend(path for path in matches if path not in paths)
+    return paths
+
+
+def batch_output_dirs(paths, output_root=BATCH_OUTPUT_DIR):
+    """
+    入力ごとの出力先（output_root/ファイル名の語幹）を決める（語幹が重複する場合は親ディレクトリ名を付ける）
+    """
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    dirs = []
+    for path, stem in zip(paths, stems):
+        if stems.count(stem) > 1:
+            parent = os.path.basename(os.path.dirname(os.path.abspath(path)))
+            stem = f"{parent}_{stem}"
+        name, i = stem, 2
+        while os.path.join(output_root, name) in dirs:
+            name, i = f"{stem}_{i}", i + 1
+        dirs.append(os.path.join(output_root, name))
+    return dirs
+
+
+# 集計表（縦持ち）の列: 分析の種類、変数名、表示ラベル、推定値（相関係数・回帰係数・R²）、標準誤差、p値、件数
+SUMMARY_COLUMNS = ['analysis', 'variable', 'label', 'estimate', 'se', 'p', 'n']
+
+
+def _summary_rows(corr, model, n_reg):
+    """
+    相関行列（spearman_matrix）と回帰モデルから集計表の行を作る（modelがNone・係数の無い変数は欠損）
+    """
+    rows = [{'analysis': 'correlation', 'variable': col, 'label': label,
+             'estimate': corr.r.loc['Insect_Dislike_Score', col], 'se': np.nan,
+             'p': corr.p.loc['Insect_Dislike_Score', col], 'n': corr.n.loc['Insect_Dislike_Score', col]}
+            for label, col in FACTORS.items()]
+    empty = pd.Series(dtype=float)
+    params, bse, pvalues = (model.params, model.bse, model.pvalues) if model is not None else (empty, empty, empty)
+    rows += [{'analysis': 'regression', 'variable': var, 'label': var, 'estimate': params.get(var, np.nan),
+              'se': bse.get(var, np.nan), 'p': pvalues.get(var, np.nan), 'n': n_reg}
+             for var in REGRESSION_VARS]
+    rows.append({'analysis': 'regression', 'variable': 'R2', 'label': 'R²',
+                 'estimate': model.rsquared if model is not None else np.nan, 'se': np.nan,
+                 'p': model.f_pvalue if model is not None else np.nan, 'n': n_reg})
+    return rows
+
+
+def summarize_survey(df):
+    """
+    相関係数（各要因と虫嫌いスコア）と回帰係数を縦持ちの表にする（度数表の場合はCountで重み付け）
+    """
+    weights = df['Count'].to_numpy(dtype=float) if 'Count' in df.columns else None
+    corr = spearman_matrix(df, ANALYSIS_COLS, weights)
+    state = regression_crossproducts(df)
+    return pd.DataFrame(_summary_rows(corr, fit_ols_from_state(state), state['n']), columns=SUMMARY_COLUMNS)
+
+
+def _analyze_batch_item(file_path, output_dir, options):
+    """
+    バッチの1入力分: 出力先を分けて分析し、集計表の行を返す（プロセスプールの各プロセスで実行）
+    """
+    options = dict(options)
+    # キャッシュ（前処理・インクリメンタル回帰の状態）も入力ごとに分け、プロセス間で競合しないようにする
+    cache_dir = options.pop('cache_dir', CACHE_DIR)
+    cache_dir = cache_dir and os.path.join(output_dir, cache_dir)
+    # 集計表は分析で求めた相関行列・回帰モデルから作る（読み込み・品質チェック・統計の計算は1回だけ）
+    summary = analyze_and_visualize(file_path, cache_dir=cache_dir, output_dir=output_dir, summary=True, **options)
+    if summary is None:
+        raise RuntimeError(f"分析に失敗しました: {file_path}")
+    summary.insert(0, 'input', file_path)
+    return summary
+
+
+def analyze_batch(sources, output_root=BATCH_OUTPUT_DIR, workers=None, **options):
+    """
+    複数のCSV（ディレクトリ・globパターン・パスのリスト）をプロセスプールで並列に分析する
+    入力ごとに output_root/<ファイル名>/ へ結果を書き出し、全入力の集計表を output_root/batch_summary.csv に保存する
+    workers: 並列に分析するプロセス数（None=CPU数）、options: analyze_and_visualizeの引数（図は各プロセス内で順に描画）
+    qualityを指定すると、全ての入力で output_root/QUALITY_INDEX_PATH（またはquality_index）のハッシュ表を共有し、順に分析する
+    """
+    paths = expand_inputs(sources)
+    if not paths:
+        print(f"ファイルが見つかりません: {sources}")
+        return None
+    output_dirs = batch_output_dirs(paths, output_root)
+    options = dict(options, render_workers=1)
+    if workers is None:
+        workers = min(len(paths), os.cpu_count() or 1)
+    if options.get('quality'):
+        # 回をまたぐ重複を検出するため、既定では全ての入力で output_root 内の1つのハッシュ表を共有する
+        if not options.get('quality_index'):
+            options['quality_index'] = os.path.join(output_root, QUALITY_INDEX_PATH)
+        # 共有するハッシュ表に入力の順に登録するため、並列化しない
+        workers = 1
+    print(f"🚀 バッチ分析を開始します: {len(paths)} ファイル（{workers} プロセス）")
+
+    summaries, failed = {}, []
+    if workers <= 1:
+        for path, output_dir in zip(paths, output_dirs):
+            try:
+                summaries[path] = _analyze_batch_item(path, output_dir, options)
+            except Exception as e:
+                print(f"❌ {path}: {e}")
+                failed.append(path)
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_analyze_batch_item, path, output_dir, options): path
+                       for path, output_dir in zip(paths, output_dirs)}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    summaries[path] = future.result()
+                    print(f"✅ {path} 完了")
+                except Exception as e:
+                    print(f"❌ {path}: {e}")
+                    failed.append(path)
+
+    if not summaries:
+        return None
+    summary = pd.concat([summaries[path] for path in paths if path in summaries], ignore_index=True)
+    summary.insert(1, 'output_dir', summary['input'].map(dict(zip(paths, output_dirs))))
+    os.makedirs(output_root, exist_ok=True)
+    summary_path = os.path.join(output_root, 'batch_summary.csv')
+    summary.to_csv(summary_path, index=False, encoding='utf-8-sig')
+    print(f"\n✅ 集計表を保存: {summary_path}（{len(summaries)} ファイル、失敗 {len(failed)} ファイル）")
+    return summary
+
 
 # --- 実行 ---
+def _figure_name(name):
+    """
+    コマンドラインの図番号（'1-1', 'S5', '図3' など）を'図'付きの図番号に揃える
+    """
+    name = name.strip()
+    return name if name.startswith('図') else f'図{name}'
+
+
+def main(argv=None):
+    """
+    コマンドラインから分析を実行する（--mode stats なら結果ファイルのみで描画ライブラリを読み込まない）
+    入力が複数・ディレクトリ・globパターンの場合は、バッチ処理（analyze_batch）で並列に分析する
+    --append-archive を指定した場合は、入力を列指向アーカイブに追記するだけで分析は行わない
+    """
+    import argparse
+    figure_names = FIGURE_NAMES + STRATIFIED_FIGURE_NAMES + [SPECIFICATION_FIGURE['name']]
+    parser = argparse.ArgumentParser(description='アンケートデータの相関・回帰分析と図の作成')
+    parser.add_argument('inputs', nargs='*', default=['data.csv'],
+                        help='入力CSVまたは列指向アーカイブ（既定: data.csv）。複数のファイル・ディレクトリ・globパターンでバッチ処理')
+    parser.add_argument('--output-dir', default=None,
+                        help=f'出力先（既定: カレントディレクトリ、バッチ処理では {BATCH_OUTPUT_DIR}）')
+    parser.add_argument('--jobs', type=int, default=None, help='バッチ処理で並列に分析するファイル数（既定: CPU数）')
+    parser.add_argument('--mode', choices=['all', 'stats', 'plots'], default='all',
+                        help='all: 結果ファイルと図、stats: 結果ファイルのみ、plots: 図のみ')
+    parser.add_argument('--figures', help=f"描画する図番号（カンマ区切り、例: 1-1,S5,3）: {','.join(figure_names)}")
+    parser.add_argument('--chunksize', type=int, default=None, help='指定するとストリーミングモードで処理する')
+    parser.add_argument('--aggregate-figures', choices=['auto', 'on', 'off'], default='auto',
+                        help=f'散布図・箱ひげ図を度数表から描画する（auto: {AGGREGATE_FIGURES_MIN_ROWS} 件以上で集計）')
+    parser.add_argument('--workers', type=int, default=None, help='図を並列描画するプロセス数（1=並列化しない）')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='前処理キャッシュの保存先')
+    parser.add_argument('--no-cache', action='store_true', help='前処理キャッシュを使わない')
+    parser.add_argument('--resamples', type=int, default=0, help='ブートストラップ・並べ替え検定の再標本数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--incremental', action='store_true',
+                        help='回帰分析だけを、保存済みのクロス積と追記された行から更新する（他の分析・図は行わない）')
+    parser.add_argument('--run-log', default=RUN_LOG_PATH, help='実行ログ（.json/.csv）')
+    parser.add_argument('--no-run-log', action='store_true', help='実行ログを書き出さない')
+    parser.add_argument('--profile-stage', default=None, help="詳しく計測する段階（例: correlation, 'figure:図S1'）")
+    parser.add_argument('--profile-mode', choices=['cprofile', 'tracemalloc'], default='cprofile')
+    parser.add_argument('--group-by', default=None,
+                        help='層別分析のグループ列（カンマ区切りで組み合わせ、例: Gender / Residence_Area,Gender）')
+    parser.add_argument('--specification', nargs='?', const=SPECIFICATION_FOCAL, default=None,
+                        choices=SPECIFICATION_VARS, metavar='VARIABLE',
+                        help=f'説明変数の全組み合わせの回帰（仕様曲線）を行い、その係数を図4に示す（既定: {SPECIFICATION_FOCAL}）')
+    parser.add_argument('--items', nargs='?', type=int, const=1, default=None, metavar='N_FACTORS',
+                        help='Q1-Q11の項目分析（α係数など）と主因子法を行う（値は因子数、既定: 1）')
+    parser.add_argument('--quality', action='store_true',
+                        help='重複・ストレートライン・範囲外の回答の行を除外し、品質チェックの結果を書き出す')
+    parser.add_argument('--quality-index', default=None,
+                        help=f'回答者のハッシュ表の保存先（既定: キャッシュのディレクトリ内、バッチ処理では出力先の {QUALITY_INDEX_PATH}）')
+    parser.add_argument('--append-archive', default=None, metavar='ARCHIVE',
+                        help='入力CSVを1回分ずつ列指向アーカイブに追記して終了する（分析はアーカイブを入力に指定）')
+    parser.add_argument('--force', nargs='?', const='all', default=None,
+                        help='最新でも作り直す成果物（カンマ区切り、例: regression,1-5,S5。値なしで全て）')
+    args = parser.parse_args(argv)
+
+    if args.quality and args.incremental:
+        parser.error('--quality と --incremental は同時に指定できません')
+    if args.incremental and (args.mode == 'plots' or args.figures or args.group_by or args.specification
+                             or args.items or args.resamples):
+        parser.error('--incremental は回帰分析だけを更新するため、図・層別分析・仕様曲線・項目分析・再標本化とは'
+                     '同時に指定できません')
+    figures = None
+    if args.mode == 'stats':
+        if args.figures:
+            parser.error('--mode stats と --figures は同時に指定できません')
+        figures = []
+    elif args.figures:
+        figures = [_figure_name(name) for name in args.figures.split(',') if name.strip()]
+        unknown = [name for name in figures if name not in figure_names]
+        if unknown:
+            parser.error(f"未知の図番号です: {', '.join(unknown)}（指定できる図: {', '.join(figure_names)}）")
+
+    force = None
+    if args.force == 'all':
+        force = True
+    elif args.force:
+        reports = REPORT_ARTIFACTS + ['stratified', 'specification', 'items']
+        force = [name.strip() if name.strip() in reports else _figure_name(name)
+                 for name in args.force.split(',') if name.strip()]
+        unknown = [name for name in force if name not in reports + figure_names]
+        if unknown:
+            parser.error(f"未知の成果物です: {', '.join(unknown)}")
+
+    options = dict(chunksize=args.chunksize, cache_dir=None if args.no_cache else args.cache_dir,
+                   n_resamples=args.resamples, seed=args.seed, incremental=args.incremental,
+                   run_log_path=None if args.no_run_log else args.run_log, profile_stage=args.profile_stage,
+                   profile_mode=args.profile_mode, reports=args.mode != 'plots', figures=figures, force=force,
+                   group_by=[key.strip() for key in args.group_by.split(',') if key.strip()] if args.group_by else None,
+                   aggregate_figures={'auto': None, 'on': True, 'off': False}[args.aggregate_figures],
+                   specification=args.specification, item_factors=args.items, quality=args.quality,
+                   quality_index=args.quality_index)
+    if args.append_archive:
+        paths = expand_inputs(args.inputs)
+        if not paths:
+            print(f"ファイルが見つかりません: {args.inputs}")
+            return 1
+        for path in paths:
+            try:
+                append_wave(args.append_archive, path, args.chunksize or DEFAULT_CHUNKSIZE)
+            except ValueError as e:
+                print(f"❌ {path}: {e}")
+                return 1
+        return 0
+    batch = len(args.inputs) > 1 or any((os.path.isdir(path) and not is_archive(path)) or glob.has_magic(path)
+                                        for path in args.inputs)
+    if batch and args.incremental:
+        parser.error('--incremental は1つの入力にのみ指定できます')
+    if batch:
+        summary = analyze_batch(args.inputs, args.output_dir or BATCH_OUTPUT_DIR, args.jobs, **options)
+        return 0 if summary is not None else 1
+
+    file_path = args.inputs[0]
+    if not os.path.exists(file_path):
+        print(f"ファイルが見つかりません: {file_path}")
+        return 1
+    if args.incremental:
+        # 保存済みのクロス積に、前回のバイトオフセット以降に追記された行だけを加える（全行の読み込みは行わない）
+        output_dir = args.output_dir or '.'
+        os.makedirs(output_dir, exist_ok=True)
+        update_regression(file_path, args.cache_dir or CACHE_DIR, args.chunksize or DEFAULT_CHUNKSIZE,
+                          os.path.join(output_dir, 'regression_results.txt'))
+        return 0
+    analyze_and_visualize(file_path, render_workers=args.workers, output_dir=args.output_dir or '.', **options)
+    return 0
+
+
 if __name__ == "__main__":
-    # ファイル名を指定して実行
-    target_file = "data.csv"
-    if os.path.exists(target_file):
-        analyze_and_visualize(target_file)
-    else:
-        print(f"ファイルが見つかりません: {target_file}")
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,288 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from types import SimpleNamespace
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import script
+
+# --- 定数定義 ---
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# 結果キャッシュに保持する件数（データのバージョン・エンドポイント・パラメータの組み合わせごとに1件）
+DEFAULT_CACHE_SIZE = 128
+
+FIGURE_NAMES = script.FIGURE_NAMES + script.STRATIFIED_FIGURE_NAMES
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                500: 'Internal Server Error'}
+
+
+class ServiceError(Exception):
+    """
+    リクエストの誤り（HTTPのステータスコード付き）
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LRUCache:
+    """
+    結果のLRUキャッシュ（キー → 計算中または計算済みのasyncio.Future）
+    計算中のFutureも保持するため、同じキーの同時リクエストは1回の計算を共有する（失敗した結果は保持しない）
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def get_or_compute(self, key, factory):
+        future = self._items.get(key)
+        if future is not None and not (future.done() and (future.cancelled() or future.exception())):
+            self._items.move_to_end(key)
+            self.hits += 1
+            return future
+        self.misses += 1
+        future = asyncio.ensure_future(factory())
+        self._items[key] = future
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        return future
+
+    def info(self):
+        return {'size': len(self._items), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+def _stat_key(file_path):
+    """
+    入力ファイルの変更を検出するためのキー（サイズと更新時刻）
+    """
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _table_rows(table):
+    """
+    DataFrameをJSON用の行のリストにする（欠損はnull）
+    """
+    return json.loads(table.to_json(orient='records', force_ascii=False))
+
+
+class AnalysisService:
+    """
+    前処理済みのデータ（df_clean と度数表）をメモリに保持し、相関・回帰・図をHTTPで返すサービス
+    入力ファイルが更新されるとリクエスト時に読み込み直し、結果キャッシュのキーにはデータのバージョン（内容ハッシュ）を含める。
+    統計の計算はスレッドプール、図の描画はプロセスプール（Aggバックエンド）で行い、イベントループを止めない。
+    """
+
+    def __init__(self, file_path, cache_dir=script.CACHE_DIR, cache_size=DEFAULT_CACHE_SIZE, workers=None,
+                 render_workers=None):
+        self.file_path = file_path
+        self.cache_dir = cache_dir
+        self.cache = LRUCache(cache_size)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.render_executor = ProcessPoolExecutor(max_workers=render_workers or os.cpu_count() or 1,
+                                                   initializer=script._init_render_worker)
+        self.dataset = None
+        self._reload_lock = asyncio.Lock()
+
+    # --- データ ---
+
+    def _load(self, stat):
+        start = time.perf_counter()
+        df_clean = script.load_survey(self.file_path, self.cache_dir)
+        dataset = SimpleNamespace(stat=stat, version=script._file_digest(self.file_path), df_clean=df_clean,
+                                  df_freq=script.frequency_table(df_clean), rows=len(df_clean))
+        print(f"🔄 データを読み込みました: {self.file_path}（{dataset.rows} 件, version={dataset.version[:12]}, "
+              f"{time.perf_counter() - start:.2f} 秒）")
+        return dataset
+
+    async def current_dataset(self):
+        """
+        保持しているデータを返す（入力ファイルが更新されていればスレッドプールで読み込み直す）
+        """
+        stat = _stat_key(self.file_path)
+        if self.dataset is None or self.dataset.stat != stat:
+            async with self._reload_lock:
+                if self.dataset is None or self.dataset.stat != stat:
+                    loop = asyncio.get_running_loop()
+                    self.dataset = await loop.run_in_executor(self.executor, self._load, stat)
+        return self.dataset
+
+    def _cached(self, dataset, kind, params, func, *args):
+        """
+        (データのバージョン, 種類, パラメータ) をキーに、func(*args) をスレッドプールで計算した結果をキャッシュする
+        """
+        async def compute():
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        return self.cache.get_or_compute((dataset.version, kind, params), compute)
+
+    # --- 計算 ---
+
+    def _group_keys(self, dataset, query):
+        keys = tuple(key.strip() for value in query.get('group_by', []) for key in value.split(',') if key.strip())
+        missing = [key for key in keys if key not in dataset.df_clean.columns]
+        if missing:
+            raise ServiceError(400, f"グループ列がありません: {', '.join(missing)}")
+        return keys
+
+    @staticmethod
+    def _summary(dataset, keys):
+        if keys:
+            return script.stratified_analysis(dataset.df_clean, list(keys))
+        return script.summarize_survey(dataset.df_freq)
+
+    @staticmethod
+    def _statistics(dataset):
+        df_freq = dataset.df_freq
+        corr = script.spearman_matrix(df_freq, script.ANALYSIS_COLS, df_freq['Count'].to_numpy(dtype=float))
+        model = script.fit_ols_from_state(script.regression_crossproducts(df_freq))
+        return corr, script.build_coefficient_table(model, script.REGRESSION_VARS)
+
+    async def summary(self, dataset, keys):
+        return await self._cached(dataset, 'summary', keys, self._summary, dataset, keys)
+
+    async def figure(self, dataset, name, keys):
+        """
+        図1枚をPNGのバイト列として返す（度数表から描画するため、描画プロセスへ渡すデータは回答数によらない）
+        """
+        if name in script.STRATIFIED_FIGURE_NAMES:
+            if not keys:
+                raise ServiceError(400, f"{name} には group_by の指定が必要です")
+            table = await self.summary(dataset, keys)
+            specs_for = lambda out_dir: script.build_stratified_figure_specs(table, list(keys), [name], out_dir)
+        else:
+            keys = ()
+            corr, coef_df = await self._cached(dataset, 'statistics', (), self._statistics, dataset)
+            specs_for = lambda out_dir: script.build_figure_specs_from_counts(dataset.df_freq, corr, coef_df, [name],
+                                                                              out_dir)
+
+        async def render():
+            loop = asyncio.get_running_loop()
+            with tempfile.TemporaryDirectory() as out_dir:
+                [(_, func, kwargs)] = await loop.run_in_executor(self.executor, specs_for, out_dir)
+                await loop.run_in_executor(self.render_executor, script._timed_render, func, kwargs)
+                with open(kwargs['output_path'], 'rb') as f:
+                    return f.read()
+        return await self.cache.get_or_compute((dataset.version, 'figure', name, keys), render)
+
+    # --- HTTP ---
+
+    async def dispatch(self, method, target):
+        """
+        リクエストを処理し (ステータス, Content-Type, 本文) を返す
+        """
+        if method != 'GET':
+            raise ServiceError(405, f"GETのみ対応しています: {method}")
+        url = urlsplit(target)
+        path = unquote(url.path).rstrip('/') or '/'
+        query = parse_qs(url.query)
+        if path == '/figures':
+            return self._json({'figures': FIGURE_NAMES})
+        if path not in ('/health', '/summary', '/correlation', '/regression') and not path.startswith('/figures/'):
+            raise ServiceError(404, f"未知のエンドポイントです: {path}")
+
+        dataset = await self.current_dataset()
+        if path == '/health':
+            return self._json({'status': 'ok', 'file': self.file_path, 'version': dataset.version,
+                               'rows': dataset.rows, 'cache': self.cache.info()})
+        keys = self._group_keys(dataset, query)
+        if path.startswith('/figures/'):
+            name = script._figure_name(path[len('/figures/'):])
+            if name not in FIGURE_NAMES:
+                raise ServiceError(404, f"未知の図番号です: {name}")
+            return 200, 'image/png', await self.figure(dataset, name, keys)
+
+        table = await self.summary(dataset, keys)
+        if path != '/summary':
+            table = table[table['analysis'] == path[1:]]
+        return self._json({'version': dataset.version, 'group_by': list(keys), 'rows': _table_rows(table)})
+
+    @staticmethod
+    def _json(payload, status=200):
+        return status, 'application/json; charset=utf-8', json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+    async def handle(self, reader, writer):
+        """
+        1接続につき1リクエストを処理する（HTTP/1.1の最小限の実装、Connection: close）
+        """
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            if len(request_line) < 2:
+                raise ServiceError(400, 'リクエスト行が不正です')
+            status, content_type, body = await self.dispatch(request_line[0], request_line[1])
+        except ServiceError as e:
+            status, content_type, body = self._json({'error': str(e)}, e.status)
+        except Exception as e:
+            print(f"❌ リクエストの処理に失敗しました: {e}")
+            status, content_type, body = self._json({'error': str(e)}, 500)
+        header = (f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\nContent-Type: {content_type}\r\n"
+                  f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+        try:
+            writer.write(header.encode('latin-1') + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.render_executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def serve(file_path, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None, **options):
+    """
+    データを読み込んでからサービスを開始する（unix_socketを指定するとTCPの代わりにUnixソケットで待ち受ける）
+    """
+    service = AnalysisService(file_path, **options)
+    await service.current_dataset()
+    if unix_socket:
+        server = await asyncio.start_unix_server(service.handle, path=unix_socket)
+        print(f"🚀 サービスを開始しました: unix:{unix_socket}")
+    else:
+        server = await asyncio.start_server(service.handle, host, port)
+        print(f"🚀 サービスを開始しました: http://{host}:{port}/")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+# --- 実行 ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='前処理済みのデータをメモリに保持し、相関・回帰・図を返すローカルサービス',
+        epilog='エンドポイント: /health, /summary, /correlation, /regression, /figures, /figures/<図番号> '
+               '（?group_by=Gender で層別分析）')
+    parser.add_argument('input', nargs='?', default='data.csv', help='入力CSV（既定: data.csv）')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', default=None, help='TCPの代わりに待ち受けるUnixソケットのパス')
+    parser.add_argument('--cache-dir', default=script.CACHE_DIR, help='前処理キャッシュの保存先')
+    parser.add_argument('--no-cache', action='store_true', help='前処理キャッシュを使わない')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE, help='結果キャッシュの件数')
+    parser.add_argument('--workers', type=int, default=None, help='統計を計算するスレッド数')
+    parser.add_argument('--render-workers', type=int, default=None, help='図を描画するプロセス数（既定: CPU数）')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"ファイルが見つかりません: {args.input}")
+        raise SystemExit(1)
+    try:
+        asyncio.run(serve(args.input, args.host, args.port, args.unix,
+                          cache_dir=None if args.no_cache else args.cache_dir, cache_size=args.cache_size,
+                          workers=args.workers, render_workers=args.render_workers))
+    except KeyboardInterrupt:
+        print("\n✨ サービスを終了しました。")